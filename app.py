@@ -14,9 +14,13 @@ from pathlib import Path
 
 # Importar scrapers
 from scrapers.jurisprudencia.scraper import JudicialScraperV2
+from scrapers.tesauro.facets import get_facet_service
 from scrapers.tesauro.scraper import TesauroScraper
 from utils.form_helpers import build_search_params
 from scrapers.biblioteca_ccb import BibliotecaCCBScraper
+from common.async_downloader import ENGINES as DOWNLOAD_ENGINES
+from common.download_stats import DownloadStats
+from common.results_writer import read_progress
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -131,6 +135,9 @@ def jurisprudencia_start_scraping():
         download_pdfs = request.form.get('download_pdfs', 'true').lower() == 'true'
         max_results = request.form.get('max_results', None)
         max_workers = int(request.form.get('max_workers', '3'))
+        partitions = int(request.form.get('partitions', '1'))
+        id_history = request.form.get('id_history') or None
+        sync = request.form.get('sync', 'false').lower() == 'true'
 
         if max_results:
             max_results = int(max_results)
@@ -160,7 +167,10 @@ def jurisprudencia_start_scraping():
                     download_pdfs=download_pdfs,
                     max_results=max_results,
                     max_workers=max_workers,
-                    cancel_event=cancel_event
+                    cancel_event=cancel_event,
+                    partitions=partitions,
+                    id_history=id_history,
+                    sync=sync
                 )
 
                 if results is None:
@@ -195,7 +205,10 @@ def jurisprudencia_start_scraping():
                 'fechas': f"{search_params.get('searchForm:fechaIniCal')} - {search_params.get('searchForm:fechaFinCal')}",
                 'download_pdfs': download_pdfs,
                 'max_results': max_results,
-                'max_workers': max_workers
+                'max_workers': max_workers,
+                'partitions': partitions,
+                'id_history': id_history,
+                'sync': sync
             }
         }
 
@@ -209,6 +222,82 @@ def jurisprudencia_start_scraping():
         }), 500
 
 
+@app.route('/jurisprudencia/resume_scraping/<timestamp>', methods=['POST'])
+def jurisprudencia_resume_scraping(timestamp):
+    """Reanudar un proceso de jurisprudencia interrumpido desde su checkpoint"""
+    try:
+        key = f'jurisprudencia_{timestamp}'
+        checkpoint_path = Path(f"logs/{timestamp}") / 'checkpoint.json'
+
+        if key in active_scrapers:
+            return jsonify({
+                'status': 'error',
+                'message': 'El proceso sigue activo'
+            }), 409
+
+        if not checkpoint_path.exists():
+            return jsonify({
+                'status': 'not_found',
+                'message': 'No hay checkpoint para este proceso'
+            }), 404
+
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+
+        if checkpoint.get('estado') == 'completado':
+            return jsonify({
+                'status': 'error',
+                'message': 'El proceso ya se completó'
+            }), 400
+
+        scraper = JudicialScraperV2(timestamp=timestamp)
+        cancel_event = threading.Event()
+        cancel_events[key] = cancel_event
+        active_scrapers[key] = scraper
+
+        def run_scraper():
+            try:
+                logger.info(f"Reanudando scraping de jurisprudencia {timestamp}...")
+                results = scraper.resume_from_checkpoint(cancel_event=cancel_event)
+
+                if results is None:
+                    logger.info(f"Reanudación de jurisprudencia {timestamp} cancelada o fallida")
+                else:
+                    logger.info(f"Reanudación de jurisprudencia completada. Resultados: {len(results)}")
+
+            except Exception as e:
+                logger.error(f"Error reanudando scraping de jurisprudencia: {str(e)}")
+                import traceback
+                logger.error(traceback.format_exc())
+            finally:
+                cancel_events.pop(key, None)
+                active_scrapers.pop(key, None)
+
+        thread = threading.Thread(target=run_scraper)
+        thread.daemon = True
+        thread.start()
+
+        return jsonify({
+            'status': 'started',
+            'message': 'Proceso de scraping de jurisprudencia reanudado',
+            'timestamp': timestamp,
+            'log_dir': str(scraper.log_dir),
+            'pdf_dir': str(scraper.pdf_dir),
+            'checkpoint': {
+                'paginas': checkpoint.get('paginas', {}),
+                'registros': (read_progress(scraper.log_dir) or {}).get('registros', 0),
+                'fecha_actualizacion': checkpoint.get('fecha_actualizacion')
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Error reanudando scraping de jurisprudencia {timestamp}: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error al reanudar el proceso: {str(e)}'
+        }), 500
+
+
 @app.route('/jurisprudencia/cancel_scraping/<timestamp>', methods=['POST'])
 def jurisprudencia_cancel_scraping(timestamp):
     """Cancelar proceso de scraping de jurisprudencia activo"""
@@ -253,6 +342,24 @@ def jurisprudencia_cancel_scraping(timestamp):
         }), 500
 
 
+def get_download_stats_summary(key, log_dir, final_report):
+    """Latencias y throughput de descarga: en vivo si el proceso sigue activo"""
+    scraper = active_scrapers.get(key)
+    if scraper is not None and hasattr(scraper, 'download_stats'):
+        return scraper.download_stats.get_summary()
+
+    if final_report and 'estadisticas_descarga' in final_report:
+        return final_report['estadisticas_descarga']
+
+    # Proceso interrumpido: reconstruir desde el log de eventos
+    if (log_dir / 'download_stats.json').exists() or (log_dir / 'download_stats.events.jsonl').exists():
+        stats = DownloadStats(log_dir)
+        summary = stats.get_summary()
+        stats.close()
+        return summary
+    return None
+
+
 @app.route('/jurisprudencia/scraping_status/<timestamp>')
 def jurisprudencia_scraping_status(timestamp):
     """Endpoint para consultar el estado de un proceso de scraping de jurisprudencia"""
@@ -281,10 +388,14 @@ def jurisprudencia_scraping_status(timestamp):
             'status': 'success',
             'manifest': manifest,
             'final_report': final_report,
+            'download_stats': get_download_stats_summary(f'jurisprudencia_{timestamp}', log_dir, final_report),
+            'progress': read_progress(log_dir),
             'files': {
                 'log_exists': (log_dir / 'descarga.log').exists(),
                 'results_json_exists': (log_dir / 'resultados_completos.json').exists(),
-                'results_csv_exists': list(log_dir.glob('jurisprudencia_*.csv')) != []
+                'results_jsonl_exists': (log_dir / 'resultados.jsonl').exists(),
+                'results_csv_exists': list(log_dir.glob('jurisprudencia_*.csv')) != [],
+                'checkpoint_exists': (log_dir / 'checkpoint.json').exists()
             }
         })
 
@@ -345,15 +456,15 @@ def tesauro_preview():
         # Limpiar filtros vacíos
         filters = {k: v for k, v in filters.items() if v}
 
-        # Crear scraper y buscar solo 5 resultados como preview
-        scraper = TesauroScraper()
-        results = scraper.search_documents(filters, max_results=5)
+        # Conteo exacto con los 5 primeros documentos, sin crear un scraper
+        conteo = get_facet_service().count(filters, sample_size=5)
+        results = conteo['documentos']
 
         return jsonify({
             'status': 'success',
-            'total_found': len(results),
+            'total_found': conteo['total'],
             'preview': results,
-            'message': f'Se encontraron {len(results)} documentos (mostrando primeros 5)'
+            'message': f'Se encontraron {conteo["total"]} documentos (mostrando primeros {len(results)})'
         })
 
     except Exception as e:
@@ -364,6 +475,16 @@ def tesauro_preview():
         }), 500
 
 
+@app.route('/tesauro/filter_options')
+def tesauro_filter_options():
+    """Tipos de contenido con su número de documentos (facetas cacheadas)"""
+    service = get_facet_service()
+    options = service.get_filter_options()
+    options['conteos_formulario'] = service.get_ui_counts(wait=True)
+    options['cache'] = service.get_stats()
+    return jsonify(options)
+
+
 @app.route('/tesauro/start_scraping', methods=['POST'])
 def tesauro_start_scraping():
     """Endpoint que inicia el proceso de scraping del tesauro"""
@@ -384,6 +505,8 @@ def tesauro_start_scraping():
         # Obtener otros parámetros
         max_results = request.form.get('max_results', '').strip()
         max_workers = request.form.get('max_workers', '3').strip()
+        sync = request.form.get('sync', 'false').lower() == 'true'
+        download_engine = request.form.get('download_engine', 'threads')
 
         # Convertir max_results a int o None
         if max_results:
@@ -391,8 +514,12 @@ def tesauro_start_scraping():
         else:
             max_results = None
 
-        # Convertir max_workers a int
+        # Convertir max_workers a int; con threads se mantiene el tope de 10
         max_workers = int(max_workers) if max_workers else 3
+        if download_engine not in DOWNLOAD_ENGINES:
+            download_engine = 'threads'
+        if download_engine == 'threads':
+            max_workers = min(max_workers, 10)
 
         # Crear instancia del scraper
         scraper = TesauroScraper()
@@ -412,15 +539,19 @@ def tesauro_start_scraping():
                 logger.info(f"Descargar PDFs: {download_pdfs}")
                 logger.info(f"Max resultados: {max_results}")
                 logger.info(f"Max workers: {max_workers}")
+                logger.info(f"Motor de descargas: {download_engine}")
+                logger.info(f"Sincronización: {sync}")
 
-                results = scraper.search_and_download(
+                total = scraper.search_and_download(
                     filters=filters,
                     download_pdfs=download_pdfs,
                     max_results=max_results,
-                    max_workers=max_workers
+                    max_workers=max_workers,
+                    sync=sync,
+                    download_engine=download_engine
                 )
 
-                logger.info(f"Scraping del tesauro completado. Resultados: {len(results) if results else 0}")
+                logger.info(f"Scraping del tesauro completado. Resultados: {total}")
 
             except Exception as e:
                 logger.error(f"Error en scraping del tesauro: {str(e)}")
@@ -449,7 +580,9 @@ def tesauro_start_scraping():
                 'filtros': filters,
                 'download_pdfs': download_pdfs,
                 'max_results': max_results,
-                'max_workers': max_workers
+                'max_workers': max_workers,
+                'sync': sync,
+                'download_engine': download_engine
             }
         }
 
@@ -533,6 +666,8 @@ def tesauro_status(timestamp):
             'status': 'success',
             'files': files,
             'final_report': final_report,
+            'download_stats': get_download_stats_summary(f'tesauro_{timestamp}', log_dir, final_report),
+            'progress': read_progress(log_dir),
             'log_tail': log_tail
         })
 
@@ -620,6 +755,7 @@ def consejo_estado_start_scraping():
         download_pdfs = True
         max_results = request.form.get('max_results', '').strip()
         max_workers = 3
+        sync = request.form.get('sync', 'false').lower() == 'true'
 
         # Convertir a int si es necesario
         max_results = int(max_results) if max_results else None
@@ -631,6 +767,7 @@ def consejo_estado_start_scraping():
         logger.info(f"  - download_pdfs: {download_pdfs}")
         logger.info(f"  - max_results: {max_results}")
         logger.info(f"  - max_workers: {max_workers}")
+        logger.info(f"  - sync: {sync}")
 
         # Importar el scraper
         from scrapers.consejo_estado import ConsejoEstadoScraper
@@ -655,7 +792,8 @@ def consejo_estado_start_scraping():
                     download_pdfs=download_pdfs,
                     max_results=max_results,
                     max_workers=max_workers,
-                    cancel_event=cancel_event
+                    cancel_event=cancel_event,
+                    sync=sync
                 )
 
                 logger.info(f"Scraping del Consejo de Estado completado. "
@@ -688,7 +826,8 @@ def consejo_estado_start_scraping():
                 'filtros': filters,
                 'download_pdfs': download_pdfs,
                 'max_results': max_results,
-                'max_workers': max_workers
+                'max_workers': max_workers,
+                'sync': sync
             }
         }
 
@@ -1139,6 +1278,10 @@ def biblioteca_ccb_search():
             }), 501
 
         limit = data.get('limit', None)
+        sync = bool(data.get('sync', False))
+        download_engine = data.get('download_engine', 'threads')
+        if download_engine not in DOWNLOAD_ENGINES:
+            download_engine = 'threads'
 
         app.logger.info(f"Biblioteca CCB: Tipo: {browse_type}, Filtro: {date_filter or author_filter}, Límite: {limit}")
 
@@ -1163,7 +1306,9 @@ def biblioteca_ccb_search():
                     subject_filter=subject_filter if filtro == 'materia' else None,
                     title_filter=title_filter if filtro == 'titulo' else None,
                     browse_type=browse_type,
-                    limit=limit
+                    limit=limit,
+                    sync=sync,
+                    download_engine=download_engine
                 )
                 biblioteca_ccb_status['result'] = result
                 app.logger.info(f"Biblioteca CCB: Scraper completado: {result}")
@@ -1382,6 +1527,7 @@ def dian_start_scraping():
         # Obtener año y mes
         year = request.form.get('year', '').strip()
         month = request.form.get('month', '').strip()
+        sync = request.form.get('sync', 'false').lower() == 'true'
 
         if not year:
             return jsonify({'status': 'error', 'message': 'El año es requerido'}), 400
@@ -1429,6 +1575,7 @@ def dian_start_scraping():
             'year': year,
             'months': months,
             'scraper_type': 'legacy' if year <= 2009 else 'modern',
+            'sync': sync,
             'log_dir': str(log_dir),
             'base_folder': str(base_folder),
             'progress': {
@@ -1485,6 +1632,8 @@ def dian_start_scraping():
 
                     # Crear instancia del scraper legacy
                     scraper = DIANLegacyImprovedScraper(progress_callback=progress_callback)
+                    if sync:
+                        logger_dian.info("Sincronización no disponible en el sistema legacy: se recorre todo")
 
                     # Actualizar progreso inicial
                     progress_callback({
@@ -1548,14 +1697,17 @@ def dian_start_scraping():
                     # Crear scraper moderno con callback de progreso
                     scraper = DIANScraperImproved(progress_callback=progress_callback)
 
+                    # Sincronización: saltar los meses ya cubiertos por la marca de agua
+                    months_to_scrape = scraper.sync_months(year, months) if sync else months
+
                     # Actualizar progreso inicial
                     progress_callback({
                         'current_action': f'Procesando año {year} (sistema moderno)...',
-                        'expected': len(months) * 10
+                        'expected': len(months_to_scrape) * 10
                     })
 
                     # Procesar cada mes con el scraper moderno
-                    for m in months:
+                    for m in months_to_scrape:
                         try:
                             progress_callback({
                                 'current_action': f'Procesando {year}/{m:02d} (moderno)...'
@@ -1583,6 +1735,8 @@ def dian_start_scraping():
                                 'current_action': f'Error en {year}/{m:02d}: {str(e)}'
                             })
 
+                    scraper.save_watermark()
+
                     # Obtener estadísticas finales del scraper moderno
                     final_stats = scraper.stats
 
@@ -1614,6 +1768,11 @@ def dian_start_scraping():
                     'success_rate': round(success_rate, 2),
                     'total_size_mb': round(total_size / (1024 * 1024), 2) if total_size > 0 else 0,
                     'status': 'completed',
+                    'http_pool': scraper.http.get_pool_stats(),
+                    'rate_limits': scraper.http.get_rate_stats(),
+                    'deduplication': scraper.blob_store.get_stats() if year > 2009 else None,
+                    'http_cache': scraper.http_cache.get_stats(),
+                    'sync': scraper.get_sync_stats(len(months)) if year > 2009 else None,
                     'end_time': datetime.now().isoformat(),
                     'duration_seconds': (datetime.now() - datetime.fromisoformat(process_state['start_time'])).total_seconds()
                 }
@@ -1926,7 +2085,9 @@ def jurisprudencia_filters():
 @app.route('/tesauro')
 def tesauro_filters():
     """Página de filtros del tesauro"""
-    return render_template('tesauro/filters.html')
+    # Documentos por tipo desde las facetas cacheadas, sin esperar al índice: si
+    # aún no hay conteos la página los pide luego a /tesauro/filter_options
+    return render_template('tesauro/filters.html', conteos_tipo=get_facet_service().get_ui_counts())
 @app.route('/consejo_estado')
 def consejo_estado_filters():
     """Página de filtros del Consejo de Estado"""
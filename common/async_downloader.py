@@ -0,0 +1,321 @@
+# common/async_downloader.py
+"""
+Motor de descargas asyncio (aiohttp)
+Ejecuta un event loop en un hilo propio para poder mantener cientos de
+descargas abiertas sin un hilo del sistema por cada una. Las corutinas se
+envían desde código síncrono y devuelven `concurrent.futures.Future`, así que
+`as_completed` y `future.result()` siguen funcionando igual que con threads.
+
+Las peticiones pasan por el mismo limitador por dominio que el HTTPClient y
+la escritura a disco (y el SHA-256 del almacén) se hace en el executor del
+loop, nunca dentro de él.
+"""
+import asyncio
+import contextlib
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from common.http_client import PoolStats
+from common.rate_limiter import AdaptiveRateLimiter, get_rate_limiter, parse_retry_after
+from common.stream_writer import (
+    CHUNK_SIZE, MIN_PDF_SIZE, PDF_HEADER, InvalidFileError, StreamingFileWriter
+)
+
+# Motores de descarga que aceptan los trabajos
+ENGINES = ('threads', 'asyncio')
+
+# Conexiones simultáneas por host si no se indica otra cosa
+DEFAULT_PER_HOST_LIMIT = 10
+
+# Bytes acumulados antes de pasar una escritura al executor
+WRITE_BUFFER = 1024 * 1024
+
+
+class HTTPStatusError(Exception):
+    """Respuesta con código de error (equivalente a requests.HTTPError)"""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class AsyncDownloadEngine:
+    """
+    Event loop en segundo plano con una ClientSession de aiohttp
+
+    `max_concurrency` limita las conexiones totales y `per_host_limit` las
+    conexiones contra un mismo host, de modo que se puede abrir mucho en
+    paralelo contra S3 sin saturar servidores más modestos.
+    """
+
+    def __init__(self, headers: Optional[dict] = None, max_concurrency: int = 100,
+                 per_host_limit: int = DEFAULT_PER_HOST_LIMIT, timeout: float = 60,
+                 max_pending: Optional[int] = None, rate_limiter: Optional[AdaptiveRateLimiter] = None):
+        """
+        Args:
+            headers: Headers por defecto de la sesión
+            max_concurrency: Conexiones simultáneas totales
+            per_host_limit: Conexiones simultáneas por host
+            timeout: Segundos máximos sin recibir datos (igual que en requests)
+            max_pending: Corutinas sin terminar antes de bloquear `submit`.
+                Por defecto 2 por conexión
+            rate_limiter: Limitador por dominio (por defecto el compartido)
+        """
+        if aiohttp is None:
+            raise ImportError("aiohttp no está instalado; usar engine='threads' o instalar aiohttp")
+
+        self.headers = dict(headers or {})
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.stats = PoolStats()
+
+        # Cola acotada de `submit` (mismas estadísticas que BoundedExecutor)
+        self.max_pending = max_pending or max_concurrency * 2
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+        self.loop = None
+        self.session = None
+        self._thread = None
+
+    def start(self):
+        """Arrancar el event loop y crear la sesión"""
+        if self.loop is not None:
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name='async-downloads', daemon=True)
+        self._thread.start()
+        self.run(self._create_session()).result()
+
+    async def _create_session(self):
+        # Contar conexiones nuevas y reutilizadas igual que el pool de requests
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                         limit_per_host=self.per_host_limit)
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=self.timeout),
+            trace_configs=[trace_config]
+        )
+
+    async def _on_connection_created(self, session, context, params):
+        self.stats.record_request()
+        self.stats.record_connect()
+
+    async def _on_connection_reused(self, session, context, params):
+        self.stats.record_request()
+
+    def run(self, coro) -> Future:
+        """Enviar una corutina al loop desde cualquier hilo"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def submit(self, fn: Callable, *args, cancel_event: Optional[threading.Event] = None,
+               **kwargs) -> Optional[Future]:
+        """
+        Enviar `fn(*args, **kwargs)` (función async) esperando si la cola está llena
+
+        Mismo contrato que `BoundedExecutor.submit`, para que el productor
+        (paginación) no se adelante a las descargas.
+
+        Returns:
+            Future de la corutina, o None si `cancel_event` se activó mientras esperaba
+        """
+        if not self.slots.acquire(blocking=False):
+            start = time.monotonic()
+            while not self.slots.acquire(timeout=0.5):
+                if cancel_event is not None and cancel_event.is_set():
+                    with self.lock:
+                        self.stalls += 1
+                        self.stall_time += time.monotonic() - start
+                    return None
+            with self.lock:
+                self.stalls += 1
+                self.stall_time += time.monotonic() - start
+
+        with self.lock:
+            self.pending += 1
+            self.submitted += 1
+            self.depth_total += self.pending
+            self.max_depth = max(self.max_depth, self.pending)
+
+        try:
+            future = self.run(fn(*args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        with self.lock:
+            self.completed += 1
+        self._release()
+
+    def _release(self):
+        with self.lock:
+            self.pending -= 1
+            if not self.pending:
+                self.idle.notify_all()
+        self.slots.release()
+
+    def join(self):
+        """Esperar a que terminen todas las corutinas enviadas con `submit`"""
+        with self.idle:
+            while self.pending:
+                self.idle.wait()
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+        """
+        GET que espera su turno en el bucket del host, como PooledHTTPAdapter.send
+
+        El resultado (código, latencia, Retry-After) ajusta la tasa compartida.
+        """
+        bucket = self.rate_limiter.bucket_for(url)
+        if bucket is not None:
+            wait = bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        start = time.monotonic()
+        try:
+            response = await self.session.get(url, params=params, headers=headers)
+        except Exception:
+            if bucket is not None:
+                bucket.observe(None, time.monotonic() - start)
+            raise
+
+        if bucket is not None:
+            bucket.observe(response.status, time.monotonic() - start,
+                           parse_retry_after(response.headers.get('Retry-After')))
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def fetch_to_file(self, url: str, filepath: Path, params: Optional[dict] = None,
+                            headers: Optional[dict] = None,
+                            expected_header: Optional[bytes] = PDF_HEADER,
+                            min_size: int = MIN_PDF_SIZE, blob_store=None,
+                            key: Optional[str] = None) -> int:
+        """
+        Descargar `url` a `filepath` en streaming
+
+        Raises:
+            HTTPStatusError: Si la respuesta es 4xx/5xx
+
+        Returns:
+            Tamaño del archivo guardado en bytes
+        """
+        async with self.get(url, params=params, headers=headers) as response:
+            if response.status >= 400:
+                raise HTTPStatusError(response.status)
+            return await stream_async_response_to_file(response, filepath, expected_header, min_size,
+                                                       blob_store=blob_store, key=key)
+
+    def get_pool_stats(self) -> Dict[str, any]:
+        """Obtener contadores de hits/misses de conexiones"""
+        stats = self.stats.snapshot()
+        stats['pool_size'] = self.per_host_limit
+        return stats
+
+    def get_stats(self) -> Dict[str, any]:
+        """Profundidad de la cola de `submit`, con las claves de BoundedExecutor.get_stats"""
+        with self.lock:
+            return {
+                'capacidad_cola': self.max_pending,
+                'workers': self.max_concurrency,
+                'tareas_enviadas': self.submitted,
+                'tareas_completadas': self.completed,
+                'pendientes_actuales': self.pending,
+                'profundidad_maxima': self.max_depth,
+                'profundidad_media': round(self.depth_total / self.submitted, 2) if self.submitted else 0,
+                'bloqueos_productor': self.stalls,
+                'tiempo_bloqueado_segundos': round(self.stall_time, 2)
+            }
+
+    def close(self):
+        """Cerrar la sesión y detener el loop"""
+        if self.loop is None:
+            return
+
+        if self.session is not None:
+            self.run(self.session.close()).result()
+            self.session = None
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Como BoundedExecutor: al salir se espera a las descargas en curso
+        self.join()
+        self.close()
+        return False
+
+
+async def stream_async_response_to_file(response, filepath: Path,
+                                        expected_header: Optional[bytes] = PDF_HEADER,
+                                        min_size: int = MIN_PDF_SIZE,
+                                        chunk_size: int = CHUNK_SIZE,
+                                        blob_store=None, key: Optional[str] = None) -> int:
+    """
+    Equivalente de `stream_response_to_file` para respuestas de aiohttp
+
+    Los bloques se acumulan hasta WRITE_BUFFER y se escriben (y se añaden al
+    SHA-256 del almacén) en el executor del loop; el loop solo lee de red.
+
+    Returns:
+        Tamaño del archivo guardado en bytes
+    """
+    if response.content_length is not None and response.content_length < min_size:
+        raise InvalidFileError("Archivo no válido o muy pequeño")
+
+    if blob_store is not None:
+        writer = blob_store.writer(filepath, key, expected_header, min_size)
+    else:
+        writer = StreamingFileWriter(filepath, expected_header, min_size)
+
+    loop = asyncio.get_running_loop()
+    with writer:
+        buffer = []
+        buffered = 0
+        async for chunk in response.content.iter_chunked(chunk_size):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= WRITE_BUFFER:
+                await loop.run_in_executor(None, writer.write, b''.join(buffer))
+                buffer, buffered = [], 0
+        if buffer:
+            await loop.run_in_executor(None, writer.write, b''.join(buffer))
+        return await loop.run_in_executor(None, writer.commit)
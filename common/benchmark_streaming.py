@@ -0,0 +1,98 @@
+# common/benchmark_streaming.py
+"""
+Benchmark de escritura de PDFs: concatenación en memoria vs. streaming a disco
+
+Simula una respuesta HTTP que entrega bloques de 8 KB y mide tiempo y pico de
+memoria (tracemalloc) por descarga. El método antiguo (`content += chunk`)
+crece con el tamaño del archivo; el streaming se mantiene constante.
+
+Uso:
+    python -m common.benchmark_streaming
+    python -m common.benchmark_streaming --sizes 1 20 80 --legacy-max 16
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from common.stream_writer import stream_response_to_file
+
+LEGACY_CHUNK = 8192
+
+
+class FakeResponse:
+    """Respuesta mínima compatible con `iter_content` de requests"""
+
+    def __init__(self, size_bytes: int):
+        self.size_bytes = size_bytes
+        self.headers = {'Content-Length': str(size_bytes)}
+        self._block = b'0' * (1024 * 1024)
+
+    def iter_content(self, chunk_size: int = LEGACY_CHUNK):
+        yield b'%PDF-1.7\n'
+        remaining = self.size_bytes - 9
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            yield self._block[:n]
+            remaining -= n
+
+
+def legacy_download(response, filepath: Path) -> int:
+    """Reproducción del método anterior: acumular todo y escribir al final"""
+    content = b''
+    for chunk in response.iter_content(chunk_size=LEGACY_CHUNK):
+        if chunk:
+            content += chunk
+
+    if len(content) < 1000 or not content.startswith(b'%PDF'):
+        raise Exception("Archivo no válido o muy pequeño")
+
+    with open(filepath, 'wb') as f:
+        f.write(content)
+    return len(content)
+
+
+def measure(func, size_bytes: int, workdir: Path) -> dict:
+    """Ejecutar una descarga simulada midiendo tiempo y pico de memoria"""
+    response = FakeResponse(size_bytes)
+    filepath = workdir / f"bench_{func.__name__}_{size_bytes}.pdf"
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = func(response, filepath)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    filepath.unlink()
+    return {'written': written, 'seconds': elapsed, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 16, 80],
+                        help='Tamaños de archivo a simular (MB)')
+    parser.add_argument('--legacy-max', type=int, default=16,
+                        help='Tamaño máximo (MB) para el método antiguo, que es cuadrático')
+    args = parser.parse_args()
+
+    print(f"{'MB':>5} | {'método':<10} | {'tiempo (s)':>10} | {'pico memoria (MB)':>18}")
+    print("-" * 54)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for size_mb in args.sizes:
+            size_bytes = size_mb * 1024 * 1024
+            methods = [('streaming', stream_response_to_file)]
+            if size_mb <= args.legacy_max:
+                methods.insert(0, ('concat', legacy_download))
+
+            for name, func in methods:
+                result = measure(func, size_bytes, workdir)
+                print(f"{size_mb:>5} | {name:<10} | {result['seconds']:>10.3f} | "
+                      f"{result['peak_bytes'] / (1024 * 1024):>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
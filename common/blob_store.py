@@ -0,0 +1,210 @@
+# common/blob_store.py
+"""
+Almacén de descargas direccionado por contenido (SHA-256)
+Cada archivo se guarda una sola vez en `descargas_blobs/sha256/ab/abcdef...`
+y las carpetas de cada fuente (descargas_pdf, descargas_tesauro, ...) solo
+contienen hardlinks con el nombre legible. El hash se calcula mientras se
+descarga, y un índice de claves de origen (id de documento, ruta S3, URL)
+permite detectar una descarga repetida antes de pedir el contenido.
+
+Los scrapers usan la instancia compartida (`get_blob_store`): dos trabajos
+simultáneos ven al momento las entradas que registra el otro. Los contadores
+del reporte son, por tanto, de todo el proceso.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from common.stream_writer import CHUNK_SIZE, MIN_PDF_SIZE, PDF_HEADER, StreamingFileWriter
+
+BLOB_DIR = Path("descargas_blobs")
+
+
+class BlobWriter(StreamingFileWriter):
+    """
+    StreamingFileWriter que escribe en el almacén y calcula el SHA-256
+
+    Al confirmar, si el contenido ya existía se descarta la copia nueva y
+    solo se crea el enlace con el nombre legible.
+    """
+
+    def __init__(self, store: 'BlobStore', filepath: Path, key: Optional[str] = None,
+                 expected_header: Optional[bytes] = PDF_HEADER, min_size: int = MIN_PDF_SIZE,
+                 resumable: bool = False):
+        super().__init__(filepath, expected_header, min_size)
+        self.store = store
+        self.key = key
+        if resumable and key:
+            # Nombre estable para poder retomar el .part en otra llamada
+            part_name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        else:
+            part_name = uuid.uuid4().hex
+        self.part_path = store.tmp_dir / f"{part_name}.part"
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes):
+        super().write(chunk)
+        if chunk:
+            self._hash.update(chunk)
+
+    def open_partial(self) -> int:
+        offset = super().open_partial()
+        # Rehacer el hash con lo que ya estaba en disco
+        self._hash = hashlib.sha256()
+        if offset:
+            with open(self.part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    self._hash.update(chunk)
+        return offset
+
+    def reset(self):
+        super().reset()
+        self._hash = hashlib.sha256()
+
+    def _finalize(self) -> int:
+        return self.store.add(self.part_path, self._hash.hexdigest(), self.bytes_written,
+                              self.filepath, self.key)
+
+
+class BlobStore:
+    """Blobs por SHA-256 más índice append-only de claves de origen"""
+
+    def __init__(self, root: Path = BLOB_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / 'sha256'
+        self.tmp_dir = self.root / 'tmp'
+        self.index_path = self.root / 'index.jsonl'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.index: Dict[str, dict] = {}
+        self._load_index()
+
+        # Contadores de esta ejecución
+        self.new_blobs = 0
+        self.content_duplicates = 0
+        self.index_hits = 0
+        self.bytes_saved = 0
+        self.bytes_not_downloaded = 0
+        self.copies = 0
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea truncada por un corte
+                self.index[entry['clave']] = entry
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def writer(self, filepath: Path, key: Optional[str] = None,
+               expected_header: Optional[bytes] = PDF_HEADER, min_size: int = MIN_PDF_SIZE,
+               resumable: bool = False) -> BlobWriter:
+        """Crear un writer que deduplica al confirmar"""
+        return BlobWriter(self, filepath, key, expected_header, min_size, resumable)
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Entrada del índice para `key` si su blob sigue en disco"""
+        with self.lock:
+            entry = self.index.get(key)
+        if entry and self.blob_path(entry['sha256']).exists():
+            return entry
+        return None
+
+    def restore(self, entry: dict, filepath: Path) -> int:
+        """
+        Enlazar un blob ya conocido con su nombre legible sin descargarlo
+
+        Returns:
+            Tamaño del archivo en bytes
+        """
+        self._link(self.blob_path(entry['sha256']), Path(filepath))
+        with self.lock:
+            self.index_hits += 1
+            self.bytes_saved += entry['tamaño']
+            self.bytes_not_downloaded += entry['tamaño']
+        return entry['tamaño']
+
+    def add(self, part_path: Path, sha256: str, size: int, filepath: Path,
+            key: Optional[str] = None) -> int:
+        """Mover un archivo temporal al almacén (o descartarlo si ya existe) y enlazarlo"""
+        blob = self.blob_path(sha256)
+
+        if blob.exists():
+            part_path.unlink()
+            with self.lock:
+                self.content_duplicates += 1
+                self.bytes_saved += size
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            os.replace(part_path, blob)
+            with self.lock:
+                self.new_blobs += 1
+
+        self._link(blob, Path(filepath))
+        if key:
+            self._record(key, sha256, size, Path(filepath).name)
+        return size
+
+    def _record(self, key: str, sha256: str, size: int, filename: str):
+        entry = {'clave': key, 'sha256': sha256, 'tamaño': size, 'archivo': filename}
+        with self.lock:
+            if self.index.get(key) == entry:
+                return
+            self.index[key] = entry
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def _link(self, blob: Path, filepath: Path):
+        """Crear `filepath` como hardlink al blob (copia si el sistema no lo permite)"""
+        if filepath.exists() and filepath.samefile(blob):
+            return
+
+        tmp_link = filepath.with_name(filepath.name + '.link')
+        try:
+            os.link(blob, tmp_link)
+        except OSError:
+            # Otro volumen o sistema de archivos sin hardlinks
+            shutil.copyfile(blob, tmp_link)
+            with self.lock:
+                self.copies += 1
+        os.replace(tmp_link, filepath)
+
+    def get_stats(self) -> Dict[str, any]:
+        """Contadores de deduplicación para los reportes finales"""
+        with self.lock:
+            return {
+                'blobs_nuevos': self.new_blobs,
+                'duplicados_por_contenido': self.content_duplicates,
+                'omitidos_por_indice': self.index_hits,
+                'bytes_ahorrados': self.bytes_saved,
+                'mb_ahorrados': round(self.bytes_saved / (1024 * 1024), 2),
+                'bytes_descarga_evitados': self.bytes_not_downloaded,
+                'copias_sin_hardlink': self.copies
+            }
+
+
+_stores: Dict[Path, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(root: Path = BLOB_DIR) -> BlobStore:
+    """Almacén compartido por todos los scrapers del proceso (uno por carpeta raíz)"""
+    path = Path(root).resolve()
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = BlobStore(root)
+        return store
@@ -0,0 +1,109 @@
+# common/bounded_executor.py
+"""
+ThreadPoolExecutor con cola acotada
+`submit` se bloquea cuando ya hay `max_pending` tareas sin terminar, de modo
+que el productor (navegación, paginación) no se adelanta a los consumidores
+(descargas) y la memoria se mantiene plana. Registra la profundidad de la
+cola y el tiempo que el productor pasa bloqueado.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class BoundedExecutor:
+    """Pool de workers con backpressure sobre el productor"""
+
+    def __init__(self, max_workers: int, max_pending: Optional[int] = None,
+                 thread_name_prefix: str = ''):
+        """
+        Args:
+            max_workers: Workers en paralelo
+            max_pending: Tareas sin terminar (en cola + en ejecución) antes de
+                bloquear `submit`. Por defecto 4 por worker
+            thread_name_prefix: Prefijo de los hilos
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 4
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix=thread_name_prefix)
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+    def submit(self, fn: Callable, *args, cancel_event: Optional[threading.Event] = None,
+               **kwargs) -> Optional[Future]:
+        """
+        Encolar una tarea, esperando si la cola está llena
+
+        Returns:
+            Future de la tarea, o None si `cancel_event` se activó mientras esperaba
+        """
+        if not self.slots.acquire(blocking=False):
+            start = time.monotonic()
+            while not self.slots.acquire(timeout=0.5):
+                if cancel_event is not None and cancel_event.is_set():
+                    with self.lock:
+                        self.stalls += 1
+                        self.stall_time += time.monotonic() - start
+                    return None
+            with self.lock:
+                self.stalls += 1
+                self.stall_time += time.monotonic() - start
+
+        with self.lock:
+            self.pending += 1
+            self.submitted += 1
+            self.depth_total += self.pending
+            self.max_depth = max(self.max_depth, self.pending)
+
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        with self.lock:
+            self.completed += 1
+        self._release()
+
+    def _release(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def get_stats(self) -> Dict[str, any]:
+        """Profundidad de la cola y bloqueos del productor para los reportes"""
+        with self.lock:
+            return {
+                'capacidad_cola': self.max_pending,
+                'workers': self.max_workers,
+                'tareas_enviadas': self.submitted,
+                'tareas_completadas': self.completed,
+                'pendientes_actuales': self.pending,
+                'profundidad_maxima': self.max_depth,
+                'profundidad_media': round(self.depth_total / self.submitted, 2) if self.submitted else 0,
+                'bloqueos_productor': self.stalls,
+                'tiempo_bloqueado_segundos': round(self.stall_time, 2)
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+        return False
@@ -2,7 +2,6 @@
 """
 Gestor de descargas con control de concurrencia y manejo de errores
 """
-import requests
 from pathlib import Path
 import logging
 import time
@@ -12,16 +11,27 @@ from typing import List, Dict, Optional, Callable, Tuple
 from urllib.parse import unquote
 import re
 
+from common.blob_store import BlobStore, get_blob_store
+from common.http_client import HTTPClient
+from common.stream_writer import stream_response_to_file
+
 
 class DownloadManager:
     """Gestiona las descargas de PDFs con concurrencia controlada"""
 
-    def __init__(self, pdf_dir: Path, base_headers: dict, pdf_url: str):
+    def __init__(self, pdf_dir: Path, base_headers: dict, pdf_url: str,
+                 http_client: Optional[HTTPClient] = None, blob_store: Optional[BlobStore] = None):
         self.pdf_dir = pdf_dir
         self.base_headers = base_headers
         self.pdf_url = pdf_url
         self.logger = logging.getLogger(__name__)
 
+        # Cliente HTTP con pool compartido entre workers
+        self.http = http_client or HTTPClient(headers=base_headers)
+
+        # Almacén deduplicado por contenido
+        self.blob_store = blob_store or get_blob_store()
+
         # Configuración de descargas
         self.max_workers = 3
         self.download_timeout = 60
@@ -46,6 +56,7 @@ class DownloadManager:
     def initialize(self, max_workers: int = 3):
         """Inicializar el pool de descargas"""
         self.max_workers = max_workers
+        self.http.ensure_pool_size(max_workers)
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.logger.info(f"📥 Pool de descargas iniciado con {max_workers} workers")
 
@@ -92,9 +103,11 @@ class DownloadManager:
         doc_id = record['id']
 
         try:
-            # Actualizar estado
-            with self.results_lock:
-                self.active_downloads[doc_id]['status'] = 'downloading'
+            self._mark_downloading(doc_id)
+
+            if self._restore_from_store(record):
+                self._mark_completed(doc_id)
+                return True, f"Deduplicado: {record['nombre_archivo']}"
 
             # Intentar descarga con reintentos
             for attempt in range(self.max_retries):
@@ -102,13 +115,7 @@ class DownloadManager:
                     success, message = self._attempt_download(record)
 
                     if success:
-                        with self.results_lock:
-                            self.completed_downloads += 1
-                            del self.active_downloads[doc_id]
-
-                        if self.progress_callback:
-                            self.progress_callback(self.completed_downloads, self.failed_downloads)
-
+                        self._mark_completed(doc_id)
                         return True, message
 
                 except Exception as e:
@@ -122,44 +129,82 @@ class DownloadManager:
             raise Exception(f"Agotados {self.max_retries} intentos")
 
         except Exception as e:
-            error_msg = str(e)
-            self.logger.error(f"❌ Error descargando {doc_id}: {error_msg}")
+            return self._mark_failed(record, str(e))
 
-            with self.results_lock:
-                self.failed_downloads += 1
-                record['error'] = error_msg
-                record['estado_descarga'] = 'error'
-                del self.active_downloads[doc_id]
+    def _mark_downloading(self, doc_id: str):
+        with self.results_lock:
+            self.active_downloads[doc_id]['status'] = 'downloading'
 
-            if self.progress_callback:
-                self.progress_callback(self.completed_downloads, self.failed_downloads)
+    def _mark_completed(self, doc_id: str):
+        with self.results_lock:
+            self.completed_downloads += 1
+            del self.active_downloads[doc_id]
 
-            return False, error_msg
+        if self.progress_callback:
+            self.progress_callback(self.completed_downloads, self.failed_downloads)
 
-    def _attempt_download(self, record: Dict) -> Tuple[bool, str]:
-        """Intentar descargar un archivo PDF"""
+    def _mark_failed(self, record: Dict, error_msg: str) -> Tuple[bool, str]:
         doc_id = record['id']
+        self.logger.error(f"❌ Error descargando {doc_id}: {error_msg}")
 
-        # Crear sesión temporal para esta descarga
-        session = requests.Session()
-        session.headers.update(self.base_headers)
+        with self.results_lock:
+            self.failed_downloads += 1
+            record['error'] = error_msg
+            record['estado_descarga'] = 'error'
+            del self.active_downloads[doc_id]
+
+        if self.progress_callback:
+            self.progress_callback(self.completed_downloads, self.failed_downloads)
+
+        return False, error_msg
+
+    def _blob_key(self, record: Dict) -> str:
+        """Clave de origen del documento en el índice del almacén"""
+        if record.get('url_descarga'):
+            return record['id']
+        return f"csj:{record['id']}"
+
+    def _restore_from_store(self, record: Dict) -> bool:
+        """Enlazar el documento desde el almacén si ya se descargó antes"""
+        entry = self.blob_store.lookup(self._blob_key(record))
+        if not entry:
+            return False
 
-        try:
-            # Parámetros de descarga
-            pdf_params = {
-                'corp': 'csj',
-                'ext': 'pdf',
-                'file': doc_id
-            }
+        file_size = self.blob_store.restore(entry, self.pdf_dir / entry['archivo'])
+        self._record_downloaded(record, entry['archivo'], file_size)
+        return True
+
+    def _request_target(self, record: Dict) -> Tuple[str, Optional[Dict]]:
+        """
+        URL y parámetros de descarga de un registro
 
-            # Realizar petición
-            response = session.get(
-                self.pdf_url,
-                params=pdf_params,
-                timeout=self.download_timeout,
-                stream=True
-            )
+        Los registros con `url_descarga` (URLs firmadas de S3, bitstreams de
+        la CCB) se descargan tal cual; el resto usa el endpoint de PDFs.
+        """
+        if record.get('url_descarga'):
+            return record['url_descarga'], None
 
+        return self.pdf_url, {
+            'corp': 'csj',
+            'ext': 'pdf',
+            'file': record['id']
+        }
+
+    def _attempt_download(self, record: Dict) -> Tuple[bool, str]:
+        """Intentar descargar un archivo PDF"""
+        doc_id = record['id']
+
+        # Sesión del worker: reutiliza las conexiones abiertas del pool
+        session = self.http.thread_session()
+        url, params = self._request_target(record)
+
+        # Realizar petición
+        with session.get(
+            url,
+            params=params,
+            timeout=self.download_timeout,
+            stream=True
+        ) as response:
             if response.status_code != 200:
                 raise Exception(f"HTTP {response.status_code}")
 
@@ -167,33 +212,23 @@ class DownloadManager:
             content_disposition = response.headers.get('Content-Disposition')
             filename = self._extract_filename(content_disposition, doc_id)
 
-            # Descargar contenido
-            content = b''
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    content += chunk
-
-            # Validar PDF
-            if len(content) < 1000 or not content.startswith(b'%PDF'):
-                raise Exception("Archivo no válido o muy pequeño")
-
-            # Guardar archivo
+            # Descargar en streaming validando cabecera y tamaño
             filepath = self.pdf_dir / filename
-            with open(filepath, 'wb') as f:
-                f.write(content)
+            file_size = stream_response_to_file(response, filepath, blob_store=self.blob_store,
+                                                key=self._blob_key(record))
 
-            # Actualizar registro
-            with self.results_lock:
-                record['nombre_archivo'] = filename
-                record['estado_descarga'] = 'completado'
-                record['tamaño_archivo'] = len(content)
-                record['fecha_descarga'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        return self._record_downloaded(record, filename, file_size)
 
-            self.logger.info(f"✅ Descargado: {filename} ({len(content):,} bytes)")
-            return True, f"Descargado: {filename}"
+    def _record_downloaded(self, record: Dict, filename: str, file_size: int) -> Tuple[bool, str]:
+        """Actualizar registro tras una descarga correcta"""
+        with self.results_lock:
+            record['nombre_archivo'] = filename
+            record['estado_descarga'] = 'completado'
+            record['tamaño_archivo'] = file_size
+            record['fecha_descarga'] = time.strftime('%Y-%m-%d %H:%M:%S')
 
-        finally:
-            session.close()
+        self.logger.info(f"✅ Descargado: {filename} ({file_size:,} bytes)")
+        return True, f"Descargado: {filename}"
 
     def _extract_filename(self, disposition: Optional[str], doc_id: str) -> str:
         """Extraer nombre de archivo de Content-Disposition"""
@@ -270,13 +305,16 @@ class DownloadManager:
             'total': self.completed_downloads + self.failed_downloads,
             'success_rate': (self.completed_downloads / (self.completed_downloads + self.failed_downloads) * 100)
             if (self.completed_downloads + self.failed_downloads) > 0 else 0,
-            'elapsed_time': elapsed
+            'elapsed_time': elapsed,
+            'http_pool': self.http.get_pool_stats(),
+            'deduplication': self.blob_store.get_stats()
         }
 
         self.logger.info(
             f"✅ Descargas finalizadas: {stats['completed']} exitosas, "
             f"{stats['failed']} fallidas ({stats['success_rate']:.1f}% éxito)"
         )
+        self.logger.info(f"🔌 Handshakes ahorrados por el pool: {stats['http_pool']['handshakes_saved']}")
 
         return stats
 
@@ -298,7 +336,9 @@ class DownloadManager:
             'active': active_count,
             'queued': queued_count,
             'downloading': downloading_count,
-            'pending_futures': len(self.futures)
+            'pending_futures': len(self.futures),
+            'http_pool': self.http.get_pool_stats(),
+            'deduplication': self.blob_store.get_stats()
         }
 
     def set_progress_callback(self, callback: Callable[[int, int], None]):
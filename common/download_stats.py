@@ -1,50 +1,189 @@
 # scrapers/download_stats.py
 """
 Módulo para generar estadísticas y reportes de las descargas
+
+Cada descarga se añade como una línea a `download_stats.events.jsonl` y se
+aplica a un agregado en memoria; `download_stats.json` solo se reescribe al
+compactar (cada cierto número de eventos o segundos). Al cargar se parte de la
+última compactación y se reaplican los eventos posteriores, así que un corte
+a mitad de ejecución no pierde estadísticas.
+
+Las latencias se guardan en histogramas logarítmicos por fuente y tipo de
+contenido (memoria fija) y el throughput en ventanas deslizantes.
 """
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any
 import csv
 
+from common.metrics import LogHistogram, RollingRate
+
+# Compactar el log de eventos cada N eventos o cada N segundos
+COMPACT_EVERY_EVENTS = 200
+COMPACT_EVERY_SECONDS = 30
+
 
 class DownloadStats:
     """Clase para manejar estadísticas de descarga"""
 
-    def __init__(self, log_dir: Path):
+    def __init__(self, log_dir: Path, source: str = 'tesauro', type_field: str = 'tipo_contenido'):
         """
         Inicializar el manejador de estadísticas
 
         Args:
             log_dir: Directorio donde se guardan los logs
+            source: Fuente de las descargas (agrupa los histogramas)
+            type_field: Campo del registro con el tipo de contenido
         """
         self.log_dir = log_dir
+        self.source = source
+        self.type_field = type_field
+        self.rates = RollingRate()
         self.stats_file = log_dir / "download_stats.json"
+        self.events_file = log_dir / "download_stats.events.jsonl"
+        self.lock = threading.RLock()
+
+        self._events_handle = None
+        self._pending_events = 0
+        self._last_compaction = time.monotonic()
         self.stats = self.load_stats()
 
+        # Consolidar lo recuperado para no seguir escribiendo tras una línea cortada
+        if self.events_file.exists() and self.events_file.stat().st_size:
+            self.save_stats()
+
+    def _empty_stats(self) -> Dict[str, Any]:
+        return {
+            'total_downloads': 0,
+            'successful_downloads': 0,
+            'failed_downloads': 0,
+            'total_size_bytes': 0,
+            'downloads_by_type': {},
+            'errors_by_type': {},
+            'download_time_total': 0.0,
+            'download_time_count': 0,
+            'latency_histograms': {},
+            'last_seq': 0,
+            'last_update': None
+        }
+
     def load_stats(self) -> Dict[str, Any]:
-        """Cargar estadísticas existentes o crear nuevas"""
+        """Cargar la última compactación y reaplicar los eventos posteriores"""
+        stats = self._empty_stats()
         if self.stats_file.exists():
             with open(self.stats_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                stats.update(json.load(f))
+
+        stats['latency_histograms'] = {
+            source: {tipo: LogHistogram.from_dict(data) for tipo, data in by_type.items()}
+            for source, by_type in stats['latency_histograms'].items()
+        }
+
+        # Formato antiguo: lista completa de tiempos de descarga
+        legacy_times = stats.pop('download_times', None)
+        if legacy_times:
+            stats['download_time_total'] += sum(legacy_times)
+            stats['download_time_count'] += len(legacy_times)
+            legacy_histogram = LogHistogram()
+            for download_time in legacy_times:
+                legacy_histogram.add(download_time)
+            stats['latency_histograms'].setdefault(self.source, {})['Sin tipo'] = legacy_histogram
+
+        if self.events_file.exists():
+            with open(self.events_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Última línea incompleta por un corte
+                    if event['seq'] > stats['last_seq']:
+                        self._apply_event(stats, event)
+                        self._pending_events += 1
+
+        return stats
+
+    def save_stats(self):
+        """Compactar: escribir el agregado completo y vaciar el log de eventos"""
+        with self.lock:
+            self.stats['last_update'] = datetime.now().isoformat()
+
+            snapshot = dict(self.stats)
+            snapshot['latency_histograms'] = {
+                source: {tipo: histogram.to_dict() for tipo, histogram in by_type.items()}
+                for source, by_type in self.stats['latency_histograms'].items()
+            }
+
+            tmp_file = self.stats_file.with_name(self.stats_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.stats_file)
+
+            # El agregado ya incluye hasta last_seq; si el truncado no llega a
+            # ocurrir, la reproducción ignora esos eventos por su número
+            if self._events_handle:
+                self._events_handle.close()
+                self._events_handle = None
+            open(self.events_file, 'w').close()
+
+            self._pending_events = 0
+            self._last_compaction = time.monotonic()
+
+    def close(self):
+        """Compactar los eventos pendientes al terminar la ejecución"""
+        with self.lock:
+            if self._pending_events:
+                self.save_stats()
+            if self._events_handle:
+                self._events_handle.close()
+                self._events_handle = None
+
+    def _append_event(self, event: Dict[str, Any]):
+        if self._events_handle is None:
+            self._events_handle = open(self.events_file, 'a', encoding='utf-8')
+        self._events_handle.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self._events_handle.flush()
+        self._pending_events += 1
+
+    def _apply_event(self, stats: Dict[str, Any], event: Dict[str, Any]):
+        """Aplicar un evento de descarga al agregado"""
+        stats['last_seq'] = event['seq']
+        stats['total_downloads'] += 1
+
+        if event['success']:
+            stats['successful_downloads'] += 1
+            if event.get('size'):
+                stats['total_size_bytes'] += event['size']
+            if event.get('time'):
+                stats['download_time_total'] += event['time']
+                stats['download_time_count'] += 1
+
+                by_type = stats['latency_histograms'].setdefault(event.get('source', self.source), {})
+                by_type.setdefault(event['tipo'], LogHistogram()).add(event['time'])
+
+            self.rates.add(event['ts'], event.get('size'))
         else:
-            return {
-                'total_downloads': 0,
-                'successful_downloads': 0,
-                'failed_downloads': 0,
-                'total_size_bytes': 0,
-                'downloads_by_type': {},
-                'errors_by_type': {},
-                'download_times': [],
-                'last_update': None
+            stats['failed_downloads'] += 1
+            error_type = event['error_type']
+            stats['errors_by_type'][error_type] = stats['errors_by_type'].get(error_type, 0) + 1
+
+        # Actualizar por tipo de contenido
+        tipo = event['tipo']
+        if tipo not in stats['downloads_by_type']:
+            stats['downloads_by_type'][tipo] = {
+                'total': 0,
+                'successful': 0,
+                'failed': 0
             }
 
-    def save_stats(self):
-        """Guardar estadísticas actualizadas"""
-        self.stats['last_update'] = datetime.now().isoformat()
-        with open(self.stats_file, 'w', encoding='utf-8') as f:
-            json.dump(self.stats, f, ensure_ascii=False, indent=2)
+        stats['downloads_by_type'][tipo]['total'] += 1
+        if event['success']:
+            stats['downloads_by_type'][tipo]['successful'] += 1
+        else:
+            stats['downloads_by_type'][tipo]['failed'] += 1
 
     def update_download(self, record: Dict[str, Any], success: bool,
                         download_time: float = None, file_size: int = None):
@@ -57,39 +196,26 @@ class DownloadStats:
             download_time: Tiempo de descarga en segundos
             file_size: Tamaño del archivo en bytes
         """
-        self.stats['total_downloads'] += 1
-
-        if success:
-            self.stats['successful_downloads'] += 1
-            if file_size:
-                self.stats['total_size_bytes'] += file_size
-            if download_time:
-                self.stats['download_times'].append(download_time)
-        else:
-            self.stats['failed_downloads'] += 1
-
+        event = {
+            'success': success,
+            'source': self.source,
+            'tipo': record.get(self.type_field) or 'Sin tipo',
+            'size': file_size,
+            'time': download_time,
+            'ts': time.time()
+        }
+        if not success:
             # Registrar tipo de error
-            error = record.get('error', 'Error desconocido')
-            error_type = self._classify_error(error)
-            self.stats['errors_by_type'][error_type] = \
-                self.stats['errors_by_type'].get(error_type, 0) + 1
-
-        # Actualizar por tipo de contenido
-        tipo = record.get('tipo_contenido', 'Sin tipo')
-        if tipo not in self.stats['downloads_by_type']:
-            self.stats['downloads_by_type'][tipo] = {
-                'total': 0,
-                'successful': 0,
-                'failed': 0
-            }
+            event['error_type'] = self._classify_error(record.get('error', 'Error desconocido'))
 
-        self.stats['downloads_by_type'][tipo]['total'] += 1
-        if success:
-            self.stats['downloads_by_type'][tipo]['successful'] += 1
-        else:
-            self.stats['downloads_by_type'][tipo]['failed'] += 1
+        with self.lock:
+            event['seq'] = self.stats['last_seq'] + 1
+            self._append_event(event)
+            self._apply_event(self.stats, event)
 
-        self.save_stats()
+            if (self._pending_events >= COMPACT_EVERY_EVENTS or
+                    time.monotonic() - self._last_compaction >= COMPACT_EVERY_SECONDS):
+                self.save_stats()
 
     def _classify_error(self, error: str) -> str:
         """Clasificar el tipo de error"""
@@ -110,29 +236,35 @@ class DownloadStats:
 
     def get_summary(self) -> Dict[str, Any]:
         """Obtener resumen de estadísticas"""
-        total = self.stats['total_downloads']
-        successful = self.stats['successful_downloads']
+        with self.lock:
+            total = self.stats['total_downloads']
+            successful = self.stats['successful_downloads']
 
-        if total > 0:
-            success_rate = (successful / total) * 100
-        else:
-            success_rate = 0
+            if total > 0:
+                success_rate = (successful / total) * 100
+            else:
+                success_rate = 0
 
-        avg_download_time = 0
-        if self.stats['download_times']:
-            avg_download_time = sum(self.stats['download_times']) / len(self.stats['download_times'])
+            avg_download_time = 0
+            if self.stats['download_time_count']:
+                avg_download_time = self.stats['download_time_total'] / self.stats['download_time_count']
 
-        return {
-            'total_downloads': total,
-            'successful_downloads': successful,
-            'failed_downloads': self.stats['failed_downloads'],
-            'success_rate': f"{success_rate:.2f}%",
-            'total_size_mb': self.stats['total_size_bytes'] / (1024 * 1024),
-            'average_download_time_seconds': avg_download_time,
-            'downloads_by_type': self.stats['downloads_by_type'],
-            'errors_by_type': self.stats['errors_by_type'],
-            'last_update': self.stats['last_update']
-        }
+            return {
+                'total_downloads': total,
+                'successful_downloads': successful,
+                'failed_downloads': self.stats['failed_downloads'],
+                'success_rate': f"{success_rate:.2f}%",
+                'total_size_mb': self.stats['total_size_bytes'] / (1024 * 1024),
+                'average_download_time_seconds': avg_download_time,
+                'downloads_by_type': {k: dict(v) for k, v in self.stats['downloads_by_type'].items()},
+                'errors_by_type': dict(self.stats['errors_by_type']),
+                'latency_by_source': {
+                    source: {tipo: histogram.summary() for tipo, histogram in by_type.items()}
+                    for source, by_type in self.stats['latency_histograms'].items()
+                },
+                'throughput': self.rates.summary(),
+                'last_update': self.stats['last_update']
+            }
 
     def generate_csv_report(self, results: List[Dict[str, Any]]):
         """
@@ -184,6 +316,16 @@ class DownloadStats:
         if summary['average_download_time_seconds'] > 0:
             print(f"Tiempo promedio:     {summary['average_download_time_seconds']:.2f} segundos")
 
+        throughput = summary['throughput']
+        print(f"Últimos 5 min:       {throughput['docs_per_min_5m']} docs/min, "
+              f"{throughput['bytes_per_sec_5m'] / 1024:.1f} KB/s")
+
+        for source, by_type in summary['latency_by_source'].items():
+            print(f"\nLatencias {source} (s):")
+            for tipo, latency in by_type.items():
+                print(f"  {tipo}: p50={latency['p50']} p90={latency['p90']} "
+                      f"p99={latency['p99']} max={latency['max']} (n={latency['count']})")
+
         if summary['downloads_by_type']:
             print("\nPor tipo de contenido:")
             for tipo, stats in summary['downloads_by_type'].items():
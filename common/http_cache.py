@@ -0,0 +1,258 @@
+# common/http_cache.py
+"""
+Caché en disco de respuestas HTTP para páginas de listado
+Guarda el cuerpo y los headers de validación (ETag / Last-Modified) de cada
+URL, expulsa por LRU cuando se supera el tamaño máximo y revalida con
+peticiones condicionales cuando una entrada caduca. La vigencia de cada
+entrada la decide la política de la fuente (ver `period_ttl`).
+
+Los scrapers usan la instancia compartida (`get_http_cache`): un solo índice
+LRU por carpeta hace cumplir `max_bytes` aunque haya trabajos simultáneos, y
+lo que expulsa uno deja de verlo el otro. Los contadores del reporte son, por
+tanto, de todo el proceso.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = Path("cache_http")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Vigencias (segundos). IMMUTABLE = no caduca nunca
+IMMUTABLE = float('inf')
+RECENT_TTL = 60 * 60
+IMMUTABLE_AFTER_DAYS = 60
+
+# Headers que se conservan con el cuerpo
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def period_ttl(period_end: date, recent_ttl: float = RECENT_TTL,
+               immutable_after_days: int = IMMUTABLE_AFTER_DAYS) -> float:
+    """
+    Política por periodo: los listados de periodos cerrados hace más de
+    `immutable_after_days` días no cambian; los recientes caducan pronto.
+    """
+    if isinstance(period_end, datetime):
+        period_end = period_end.date()
+    if date.today() - period_end > timedelta(days=immutable_after_days):
+        return IMMUTABLE
+    return recent_ttl
+
+
+class HTTPCache:
+    """Caché LRU en disco con revalidación condicional"""
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+
+        self.lock = threading.Lock()
+        # clave -> tamaño en bytes, ordenado de menos a más reciente
+        self.lru: 'OrderedDict[str, int]' = OrderedDict()
+        self.total_bytes = 0
+        self._load()
+
+        # Contadores de esta ejecución
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+
+    def _load(self):
+        """Reconstruir el índice LRU a partir de los archivos (mtime = último uso)"""
+        entries = []
+        for body in self.root.glob('*/*.body'):
+            stat = body.stat()
+            entries.append((stat.st_mtime, body.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self.lru[key] = size
+            self.total_bytes += size
+
+    def _paths(self, key: str):
+        folder = self.root / key[:2]
+        return folder / f"{key}.body", folder / f"{key}.json"
+
+    def _read(self, key: str):
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None, None
+        return meta, body
+
+    def _write_meta(self, key: str, meta: dict):
+        _, meta_path = self._paths(key)
+        tmp = meta_path.with_suffix('.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, meta_path)
+
+    def _store(self, key: str, url: str, response: requests.Response, ttl: float):
+        body_path, _ = self._paths(key)
+        body_path.parent.mkdir(exist_ok=True)
+
+        body = response.content
+        tmp = body_path.with_suffix('.body.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, body_path)
+
+        meta = {
+            'url': url,
+            'headers': {h: response.headers[h] for h in STORED_HEADERS if h in response.headers},
+            'encoding': response.encoding,
+            'fecha_guardado': time.time(),
+        }
+        meta['expira'] = self._expiry(ttl)
+        self._write_meta(key, meta)
+
+        with self.lock:
+            self.total_bytes += len(body) - self.lru.pop(key, 0)
+            self.lru[key] = len(body)
+        self._evict()
+
+    def _expiry(self, ttl: float) -> Optional[float]:
+        return None if ttl == IMMUTABLE else time.time() + ttl
+
+    def _touch(self, key: str):
+        body_path, _ = self._paths(key)
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        with self.lock:
+            if key in self.lru:
+                self.lru.move_to_end(key)
+
+    def _evict(self):
+        """Expulsar las entradas menos usadas hasta respetar el tamaño máximo"""
+        while True:
+            with self.lock:
+                if self.total_bytes <= self.max_bytes or len(self.lru) <= 1:
+                    return
+                key, size = self.lru.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+
+            for path in self._paths(key):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _build_response(self, url: str, meta: dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = body
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response.encoding = meta.get('encoding')
+        response.from_cache = True
+        return response
+
+    def get(self, session: requests.Session, url: str, ttl: Optional[float] = RECENT_TTL,
+            params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """
+        GET con caché
+
+        Args:
+            session: Sesión con la que pedir la página si hace falta
+            url: URL a obtener
+            ttl: Segundos de vigencia, IMMUTABLE, o None para no usar la caché
+            params: Parámetros de query
+            **kwargs: Argumentos extra para `session.get` (timeout, headers...)
+
+        Returns:
+            Respuesta real o reconstruida desde disco (`from_cache = True`)
+        """
+        if ttl is None:
+            return session.get(url, params=params, **kwargs)
+
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        key = hashlib.sha256(full_url.encode('utf-8')).hexdigest()
+
+        with self.lock:
+            known = key in self.lru
+        meta, body = self._read(key) if known else (None, None)
+
+        # Entrada vigente: servir sin red
+        if meta is not None and (meta['expira'] is None or meta['expira'] > time.time()):
+            self._touch(key)
+            with self.lock:
+                self.hits += 1
+                self.bytes_served += len(body)
+            return self._build_response(full_url, meta, body)
+
+        # Entrada caducada con validadores: petición condicional
+        headers = dict(kwargs.pop('headers', None) or {})
+        if meta is not None:
+            stored = meta.get('headers', {})
+            if 'ETag' in stored:
+                headers['If-None-Match'] = stored['ETag']
+            if 'Last-Modified' in stored:
+                headers['If-Modified-Since'] = stored['Last-Modified']
+
+        response = session.get(full_url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            meta['expira'] = self._expiry(ttl)
+            self._write_meta(key, meta)
+            self._touch(key)
+            with self.lock:
+                self.revalidated += 1
+                self.bytes_served += len(body)
+            return self._build_response(full_url, meta, body)
+
+        with self.lock:
+            self.misses += 1
+
+        if response.status_code == 200:
+            self._store(key, full_url, response, ttl)
+        return response
+
+    def get_stats(self) -> Dict[str, any]:
+        """Tasa de aciertos de la caché para los reportes finales"""
+        with self.lock:
+            total = self.hits + self.revalidated + self.misses
+            return {
+                'peticiones': total,
+                'aciertos': self.hits,
+                'revalidados_304': self.revalidated,
+                'fallos': self.misses,
+                'tasa_aciertos': round((self.hits + self.revalidated) / total * 100, 2) if total else 0,
+                'bytes_servidos_desde_cache': self.bytes_served,
+                'expulsiones_lru': self.evictions,
+                'tamaño_cache_mb': round(self.total_bytes / (1024 * 1024), 2)
+            }
+
+
+_caches: Dict[Path, HTTPCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_http_cache(root: Path = CACHE_DIR) -> HTTPCache:
+    """Caché compartida por todos los scrapers del proceso (una por carpeta raíz)"""
+    path = Path(root).resolve()
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = HTTPCache(root)
+        return cache
@@ -0,0 +1,189 @@
+# common/http_client.py
+"""
+Cliente HTTP compartido por todos los scrapers
+Mantiene un pool de conexiones keep-alive por host, cuenta cuántas peticiones
+reutilizaron una conexión abierta (handshakes TCP/TLS ahorrados) y aplica el
+limitador de peticiones adaptativo por dominio, compartido por todo el proceso
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from common.rate_limiter import AdaptiveRateLimiter, get_rate_limiter, parse_retry_after
+
+# Conexiones por host cuando no se conoce el número de workers
+DEFAULT_POOL_SIZE = 10
+
+
+class PoolStats:
+    """Contadores thread-safe de uso del pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def record_connect(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> Dict[str, any]:
+        """Obtener hits/misses del pool"""
+        with self.lock:
+            requests_count = self.requests
+            misses = self.connections_opened
+
+        hits = max(requests_count - misses, 0)
+        return {
+            'requests': requests_count,
+            'pool_hits': hits,
+            'pool_misses': misses,
+            'hit_rate': round(hits / requests_count * 100, 2) if requests_count else 0,
+            'handshakes_saved': hits
+        }
+
+
+def _counting_pool_class(base_pool, base_connection, stats: PoolStats):
+    """Crear clases de pool/conexión que reportan a `stats`"""
+
+    class CountingConnection(base_connection):
+        def connect(self):
+            stats.record_connect()
+            return super().connect()
+
+    class CountingPool(base_pool):
+        ConnectionCls = CountingConnection
+
+        def _get_conn(self, timeout=None):
+            stats.record_request()
+            return super()._get_conn(timeout)
+
+    return CountingPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter cuyo PoolManager cuenta conexiones nuevas y reutilizadas
+
+    Si recibe un limitador, cada petición espera su turno en el bucket del
+    host y el resultado (código, latencia, Retry-After) ajusta la tasa.
+    """
+
+    def __init__(self, stats: PoolStats, rate_limiter: Optional[AdaptiveRateLimiter] = None, **kwargs):
+        self.stats = stats
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        bucket = self.rate_limiter.bucket_for(request.url) if self.rate_limiter else None
+        if bucket is None:
+            return super().send(request, **kwargs)
+
+        bucket.acquire()
+        start = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            bucket.observe(None, time.monotonic() - start)
+            raise
+
+        bucket.observe(
+            response.status_code,
+            time.monotonic() - start,
+            parse_retry_after(response.headers.get('Retry-After'))
+        )
+        return response
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, HTTPConnection, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, HTTPSConnection, self.stats),
+        }
+
+
+class HTTPClient:
+    """
+    Cliente HTTP con pool de conexiones compartido
+
+    Todas las sesiones creadas por el cliente montan el mismo adaptador, así
+    que comparten conexiones keep-alive aunque cada una tenga sus propias
+    cookies. Usar `session` para el flujo principal y `thread_session()` en
+    los workers cuando las cookies no deben mezclarse entre hilos.
+    """
+
+    def __init__(self, headers: Optional[dict] = None, pool_size: int = DEFAULT_POOL_SIZE,
+                 max_retries=0, rate_limits: Optional[Dict[str, dict]] = None):
+        """
+        Args:
+            headers: Headers por defecto de todas las sesiones
+            pool_size: Conexiones máximas por host (normalmente workers + 1)
+            max_retries: Entero o urllib3 Retry para el adaptador
+            rate_limits: Tasas por dominio que se fusionan en el limitador
+                compartido (se suman a/reemplazan DOMAIN_RATES)
+        """
+        self.headers = dict(headers or {})
+        self.pool_size = pool_size
+        self.stats = PoolStats()
+        self.rate_limiter = get_rate_limiter(rate_limits)
+        self.adapter = PooledHTTPAdapter(
+            self.stats,
+            rate_limiter=self.rate_limiter,
+            pool_maxsize=pool_size,
+            max_retries=max_retries
+        )
+        self._local = threading.local()
+        self.session = self.new_session()
+
+    def new_session(self) -> requests.Session:
+        """Crear una sesión con cookies propias que usa el pool compartido"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def thread_session(self) -> requests.Session:
+        """Sesión exclusiva del hilo actual (cookies aisladas, pool compartido)"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.new_session()
+            self._local.session = session
+        return session
+
+    def ensure_pool_size(self, pool_size: int):
+        """Ampliar el pool por host para que alcance al número de workers"""
+        if pool_size <= self.pool_size:
+            return
+
+        self.pool_size = pool_size
+        # Cerrar las conexiones del PoolManager anterior antes de sustituirlo
+        self.adapter.poolmanager.clear()
+        self.adapter.init_poolmanager(
+            self.adapter._pool_connections,
+            pool_size,
+            block=self.adapter._pool_block
+        )
+
+    def get_pool_stats(self) -> Dict[str, any]:
+        """Obtener contadores de hits/misses del pool"""
+        stats = self.stats.snapshot()
+        stats['pool_size'] = self.pool_size
+        return stats
+
+    def get_rate_stats(self) -> Dict[str, Dict[str, any]]:
+        """Obtener tasas y esperas del limitador por host (de todo el proceso)"""
+        return self.rate_limiter.get_stats()
+
+    def close(self):
+        """Cerrar todas las conexiones del pool"""
+        self.adapter.close()
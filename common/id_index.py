@@ -0,0 +1,223 @@
+# common/id_index.py
+"""
+Índice de IDs ya procesados
+Un conjunto exacto con los IDs de la ejecución actual (compartido entre
+páginas y particiones) más, opcionalmente, un historial en disco de
+ejecuciones anteriores:
+- 'bloom': filtro de Bloom en un archivo binario. Consulta O(1) y memoria
+  fija (~1.8 MB por millón de IDs con 0.1% de falsos positivos)
+- 'sorted': archivo de IDs ordenados, uno por línea, consultado con búsqueda
+  binaria sobre mmap sin cargarlo en memoria. Exacto, O(log n)
+Los IDs nuevos solo se incorporan al historial al llamar a `save()`.
+"""
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+ID_HISTORY_DIR = Path("indice_ids")
+HISTORY_BACKENDS = ('bloom', 'sorted')
+
+BLOOM_MAGIC = b'IDBLOOM1'
+BLOOM_HEADER = struct.Struct('<8sQQQ')  # magic, bits, hashes, elementos
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Filtro de Bloom persistente con doble hashing sobre blake2b"""
+
+    def __init__(self, path: Path, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.path = Path(path)
+        if self.path.exists():
+            with open(self.path, 'rb') as f:
+                magic, self.num_bits, self.num_hashes, self.count = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+                if magic != BLOOM_MAGIC:
+                    raise ValueError(f"{self.path} no es un filtro de Bloom válido")
+                self.bits = bytearray(f.read())
+        else:
+            self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+            self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+            self.count = 0
+            self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item: str):
+        for p in self._positions(item):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        pass
+
+
+class SortedIdFile:
+    """Archivo de IDs ordenados con búsqueda binaria sobre mmap"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._map = None
+        self._open()
+
+        # Contar líneas por bloques para no cargar el archivo entero
+        self.count = 0
+        if self._map is not None:
+            for offset in range(0, len(self._map), 1 << 20):
+                self.count += self._map[offset:offset + (1 << 20)].count(b'\n')
+
+    def _open(self):
+        self.close()
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, item: str) -> bool:
+        if self._map is None:
+            return False
+
+        key = item.encode('utf-8')
+        data = self._map
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b'\n', 0, mid) + 1
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            line = data[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def update(self, items: Iterable[str]):
+        """Fusionar IDs nuevos con el archivo existente (en streaming)"""
+        new_ids = sorted({item.encode('utf-8') for item in items if item not in self})
+        if not new_ids:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        existing = iter(self._map.readline, b'') if self._map is not None else iter(())
+        if self._map is not None:
+            self._map.seek(0)
+
+        with open(tmp, 'wb') as f:
+            for line in heapq.merge((old.rstrip(b'\n') for old in existing), new_ids):
+                f.write(line + b'\n')
+
+        self.count += len(new_ids)
+        self.close()
+        os.replace(tmp, self.path)
+        self._open()
+
+    def save(self):
+        pass  # `update` ya escribe el archivo
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+
+class IdIndex:
+    """IDs vistos en esta ejecución más el historial opcional en disco"""
+
+    def __init__(self, history: Optional[str] = None, name: str = 'ids',
+                 directory: Path = ID_HISTORY_DIR, capacity: int = DEFAULT_CAPACITY):
+        """
+        Args:
+            history: None (solo esta ejecución), 'bloom' o 'sorted'
+            name: Nombre base del archivo de historial (p.ej. 'csj')
+            directory: Carpeta de los historiales
+            capacity: IDs previstos para dimensionar un filtro de Bloom nuevo
+        """
+        if history not in (None,) + HISTORY_BACKENDS:
+            raise ValueError(f"Historial de IDs desconocido: {history}")
+
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.unsaved = []
+        self.run_duplicates = 0
+        self.history_duplicates = 0
+        self.history_name = history
+
+        self.history = None
+        if history == 'bloom':
+            self.history = BloomFilter(Path(directory) / f'{name}.bloom', capacity)
+        elif history == 'sorted':
+            self.history = SortedIdFile(Path(directory) / f'{name}.ids')
+
+    def add_if_new(self, item: str) -> bool:
+        """Registrar un ID; False si ya se vio en esta ejecución o en el historial"""
+        with self.lock:
+            if item in self.seen:
+                self.run_duplicates += 1
+                return False
+            if self.history is not None and item in self.history:
+                self.history_duplicates += 1
+                return False
+            self.seen.add(item)
+            self.unsaved.append(item)
+            return True
+
+    def __contains__(self, item: str) -> bool:
+        with self.lock:
+            return item in self.seen or (self.history is not None and item in self.history)
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def save(self):
+        """Incorporar los IDs de esta ejecución al historial"""
+        if self.history is None:
+            return
+        with self.lock:
+            self.history.update(self.unsaved)
+            self.history.save()
+            self.unsaved = []
+
+    def close(self):
+        if self.history is not None:
+            self.history.close()
+
+    def get_stats(self) -> Dict[str, any]:
+        with self.lock:
+            return {
+                'historial': self.history_name,
+                'ids_ejecucion': len(self.seen),
+                'ids_historial': self.history.count if self.history is not None else 0,
+                'duplicados_ejecucion': self.run_duplicates,
+                'duplicados_historial': self.history_duplicates
+            }
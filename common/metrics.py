@@ -0,0 +1,130 @@
+# common/metrics.py
+"""
+Métricas de memoria fija para las estadísticas de descarga
+- LogHistogram: histograma con buckets logarítmicos (error relativo ~5%)
+  del que se obtienen p50/p90/p99/max sin guardar cada muestra
+- RollingRate: bytes/seg y documentos/min sobre ventanas deslizantes usando
+  un buffer circular de un slot por segundo
+"""
+import math
+import time
+from typing import Dict, Optional
+
+# Rango de latencias cubierto: 1 ms a ~1 hora con buckets que crecen un 10%
+HISTOGRAM_MIN = 0.001
+HISTOGRAM_GROWTH = 1.1
+HISTOGRAM_BUCKETS = 160
+
+# Ventanas de throughput (segundos)
+RATE_WINDOWS = (60, 300)
+
+
+class LogHistogram:
+    """Histograma de latencias con buckets de crecimiento geométrico"""
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(value: float) -> int:
+        if value <= HISTOGRAM_MIN:
+            return 0
+        index = math.ceil(math.log(value / HISTOGRAM_MIN, HISTOGRAM_GROWTH))
+        return min(index, HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def _upper_bound(index: int) -> float:
+        return HISTOGRAM_MIN * HISTOGRAM_GROWTH ** index
+
+    def add(self, value: float):
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Límite superior del bucket que contiene el percentil `q` (0-100)"""
+        if not self.count:
+            return None
+
+        target = math.ceil(self.count * q / 100)
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, any]:
+        def fmt(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            'count': self.count,
+            'mean': fmt(self.total / self.count) if self.count else None,
+            'p50': fmt(self.percentile(50)),
+            'p90': fmt(self.percentile(90)),
+            'p99': fmt(self.percentile(99)),
+            'max': fmt(self.max) if self.count else None
+        }
+
+    def to_dict(self) -> Dict[str, any]:
+        """Forma compacta para JSON: solo los buckets con muestras"""
+        return {
+            'buckets': {str(i): c for i, c in enumerate(self.counts) if c},
+            'count': self.count,
+            'total': self.total,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> 'LogHistogram':
+        histogram = cls()
+        for index, bucket_count in data.get('buckets', {}).items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total', 0.0)
+        histogram.max = data.get('max', 0.0)
+        return histogram
+
+
+class RollingRate:
+    """Bytes y documentos por segundo en un buffer circular de `max(RATE_WINDOWS)` slots"""
+
+    def __init__(self, windows=RATE_WINDOWS):
+        self.windows = windows
+        self.size = max(windows)
+        self.seconds = [0] * self.size
+        self.bytes = [0] * self.size
+        self.docs = [0] * self.size
+
+    def add(self, timestamp: float, size_bytes: int = 0, docs: int = 1):
+        second = int(timestamp)
+        if second <= int(time.time()) - self.size:
+            return  # Fuera de todas las ventanas
+
+        slot = second % self.size
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.bytes[slot] = 0
+            self.docs[slot] = 0
+        self.bytes[slot] += size_bytes or 0
+        self.docs[slot] += docs
+
+    def summary(self) -> Dict[str, float]:
+        now = int(time.time())
+        result = {}
+        for window in self.windows:
+            total_bytes = 0
+            total_docs = 0
+            for slot in range(self.size):
+                if now - window < self.seconds[slot] <= now:
+                    total_bytes += self.bytes[slot]
+                    total_docs += self.docs[slot]
+            label = f"{window // 60}m"
+            result[f'bytes_per_sec_{label}'] = round(total_bytes / window, 1)
+            result[f'docs_per_min_{label}'] = round(total_docs * 60 / window, 2)
+        return result
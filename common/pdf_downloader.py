@@ -1,30 +1,58 @@
 # scrapers/pdf_downloader.py
 """
 Módulo especializado para la descarga de PDFs del Tesauro Jurídico
-Maneja la generación de URLs firmadas y descarga de archivos
+Maneja la generación de URLs firmadas y descarga de archivos. Las URLs se
+pueden firmar por adelantado en un pool propio (`start_prefetch`) y se guardan
+en una caché con vigencia menor que su expiración, de modo que la latencia
+del API Gateway se solapa con las transferencias y los reintentos no vuelven
+a firmar.
+
+`download_pdf_async` es la variante para el motor asyncio: la transferencia
+corre en el event loop de AsyncDownloadEngine y lo bloqueante (firma, enlace
+desde el almacén) en su executor.
 """
+import asyncio
 import requests
-from urllib.parse import quote
+from urllib.parse import quote, urlparse, parse_qs
 from pathlib import Path
 import logging
+import threading
 import time
-from typing import Optional, Tuple, Dict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Optional, Tuple, Dict, Iterable
+
+from common.async_downloader import AsyncDownloadEngine, HTTPStatusError, aiohttp
+from common.blob_store import BlobStore, get_blob_store
+from common.http_client import HTTPClient
+from common.stream_writer import (
+    PDF_HEADER, IncompleteDownloadError, InvalidFileError, download_resumable
+)
+
+# Firma anticipada de URLs
+SIGN_WORKERS = 4                # Peticiones simultáneas al API Gateway
+SIGN_AHEAD = 50                 # URLs firmadas pendientes de usar como máximo
+DEFAULT_SIGNED_URL_TTL = 240    # Vigencia en caché si la URL no indica su expiración
+SIGNED_URL_MARGIN = 60          # Segundos de margen antes de la expiración real
+MAX_CACHED_URLS = 1000
 
 
 class PDFDownloader:
     """Clase para manejar descargas de PDFs del Tesauro"""
 
-    def __init__(self, session: requests.Session = None, pdf_dir: Path = None):
+    def __init__(self, session: requests.Session = None, pdf_dir: Path = None,
+                 blob_store: BlobStore = None):
         """
         Inicializar el descargador
 
         Args:
             session: Sesión de requests para reutilizar
             pdf_dir: Directorio donde guardar los PDFs
+            blob_store: Almacén deduplicado donde guardar el contenido
         """
-        self.session = session or requests.Session()
+        self.session = session or HTTPClient().session
         self.pdf_dir = pdf_dir or Path("descargas_tesauro")
         self.pdf_dir.mkdir(exist_ok=True)
+        self.blob_store = blob_store or get_blob_store()
         self.logger = logging.getLogger(__name__)
 
         # Endpoint para obtener URLs firmadas
@@ -45,7 +73,189 @@ class PDFDownloader:
             'Referer': 'https://tesauro.supersociedades.gov.co/'
         }
 
+        # Caché de URLs firmadas: s3_path -> (url, instante de caducidad)
+        self.sign_lock = threading.Lock()
+        self.signed_urls: Dict[str, Tuple[str, float]] = {}
+        self.prefetched = {}
+        self.downloading: Dict[str, int] = {}   # s3_path -> descargas en curso
+        self.sign_executor = None
+        self.prefetch_slots = None
+        self.prefetch_stop = threading.Event()
+
+        # Contadores de firma
+        self.sign_requests = 0
+        self.sign_cache_hits = 0
+        self.prefetch_used = 0
+        self.sign_wait = 0.0
+
+    def _signed_url_ttl(self, signed_url: str) -> float:
+        """Vigencia de una URL prefirmada de S3 menos un margen de seguridad"""
+        query = parse_qs(urlparse(signed_url).query)
+        try:
+            if 'X-Amz-Expires' in query:
+                ttl = float(query['X-Amz-Expires'][0])
+            elif 'Expires' in query:
+                ttl = float(query['Expires'][0]) - time.time()
+            else:
+                return DEFAULT_SIGNED_URL_TTL
+        except ValueError:
+            return DEFAULT_SIGNED_URL_TTL
+        return max(ttl - SIGNED_URL_MARGIN, 0)
+
+    def _cache_signed_url(self, s3_path: str, signed_url: str):
+        expires_at = time.monotonic() + self._signed_url_ttl(signed_url)
+        with self.sign_lock:
+            if len(self.signed_urls) >= MAX_CACHED_URLS:
+                now = time.monotonic()
+                self.signed_urls = {k: v for k, v in self.signed_urls.items() if v[1] > now}
+            self.signed_urls[s3_path] = (signed_url, expires_at)
+
+    def invalidate_signed_url(self, s3_path: str):
+        """Olvidar la URL firmada de `s3_path` (p. ej. tras un 403 por expiración)"""
+        with self.sign_lock:
+            self.signed_urls.pop(s3_path, None)
+
     def get_signed_url(self, s3_path: str) -> Optional[str]:
+        """
+        URL firmada para `s3_path`: desde la caché, desde la firma anticipada
+        o pidiéndola en el momento
+
+        Args:
+            s3_path: Ruta S3 del archivo (formato: s3://bucket/path/file.pdf)
+
+        Returns:
+            URL firmada o None si hay error
+        """
+        with self.sign_lock:
+            cached = self.signed_urls.get(s3_path)
+            future = self.prefetched.pop(s3_path, None)
+            if cached and cached[1] > time.monotonic():
+                self.sign_cache_hits += 1
+                if future is None:
+                    return cached[0]
+
+        if future is not None:
+            # Liberar el hueco aunque la URL ya estuviera en caché
+            start = time.monotonic()
+            signed_url = self._consume_prefetch(future)
+            with self.sign_lock:
+                self.sign_wait += time.monotonic() - start
+                if signed_url:
+                    self.prefetch_used += 1
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+            if signed_url:
+                return signed_url
+
+        signed_url = self._request_signed_url(s3_path)
+        if signed_url:
+            self._cache_signed_url(s3_path, signed_url)
+        return signed_url
+
+    def start_prefetch(self, s3_paths: Iterable[str] = (), max_workers: int = SIGN_WORKERS,
+                       sign_ahead: int = SIGN_AHEAD):
+        """
+        Firmar URLs por adelantado en un pool propio
+
+        Las firmas se piden en el orden de `s3_paths` (el mismo en que se
+        encolan las descargas) y nunca hay más de `sign_ahead` sin usar, para
+        que no caduquen antes de que un worker las consuma. Se pueden añadir
+        más rutas después con `prefetch`.
+        """
+        self.stop_prefetch()
+        self.prefetch_stop = threading.Event()
+        self.prefetch_slots = threading.Semaphore(sign_ahead)
+        self.sign_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix='tesauro-firma')
+        self.prefetch(s3_paths)
+
+    def prefetch(self, s3_paths: Iterable[str]):
+        """Encolar más rutas para firmar (p.ej. las de cada página de resultados)"""
+        if self.sign_executor is None:
+            return
+
+        for s3_path in s3_paths:
+            # Los que ya están en el almacén no necesitan URL
+            if not s3_path or self.blob_store.lookup(s3_path):
+                continue
+            with self.sign_lock:
+                # Una ruta repetida cuya descarga sigue en curso acabará en el almacén
+                if s3_path not in self.prefetched and s3_path not in self.downloading:
+                    self.prefetched[s3_path] = self.sign_executor.submit(self._prefetch_one, s3_path)
+
+    def _prefetch_one(self, s3_path: str) -> Optional[str]:
+        # Sin hueco tomado se termina con CancelledError: quien consuma el
+        # futuro no tiene nada que liberar
+        while not self.prefetch_slots.acquire(timeout=0.5):
+            if self.prefetch_stop.is_set():
+                raise CancelledError()
+        if self.prefetch_stop.is_set():
+            self.prefetch_slots.release()
+            raise CancelledError()
+
+        signed_url = self._request_signed_url(s3_path)
+        if signed_url:
+            self._cache_signed_url(s3_path, signed_url)
+        return signed_url
+
+    def _consume_prefetch(self, future) -> Optional[str]:
+        """Esperar una firma anticipada y devolver su hueco en `prefetch_slots`"""
+        try:
+            signed_url = future.result()
+        except CancelledError:
+            return None  # Cancelada antes de tomar hueco
+        except Exception:
+            signed_url = None
+        self.prefetch_slots.release()
+        return signed_url
+
+    def discard_prefetch(self, s3_path: str):
+        """
+        Soltar la firma anticipada de `s3_path` que ya no se va a usar
+
+        Sin esto, una descarga que termina sin pedir la URL (contenido ya en
+        el almacén, error previo) dejaría su hueco ocupado para siempre y, tras
+        SIGN_AHEAD casos, la firma anticipada y las descargas se bloquearían.
+        """
+        with self.sign_lock:
+            future = self.prefetched.pop(s3_path, None)
+        if future is None or future.cancel():
+            return
+        # En curso o terminada: devolver el hueco cuando acabe, sin esperarla
+        future.add_done_callback(self._consume_prefetch)
+
+    def _begin_download(self, s3_path: str):
+        with self.sign_lock:
+            self.downloading[s3_path] = self.downloading.get(s3_path, 0) + 1
+
+    def _end_download(self, s3_path: str):
+        with self.sign_lock:
+            pending = self.downloading.pop(s3_path, 1) - 1
+            if pending:
+                self.downloading[s3_path] = pending
+        self.discard_prefetch(s3_path)
+
+    def stop_prefetch(self):
+        """Cancelar las firmas anticipadas pendientes"""
+        if self.sign_executor is None:
+            return
+        self.prefetch_stop.set()
+        self.sign_executor.shutdown(wait=False, cancel_futures=True)
+        self.sign_executor = None
+        with self.sign_lock:
+            self.prefetched.clear()
+
+    def get_signing_stats(self) -> Dict[str, any]:
+        """Contadores de la etapa de firma para el reporte final"""
+        with self.sign_lock:
+            return {
+                'firmas_solicitadas': self.sign_requests,
+                'aciertos_cache': self.sign_cache_hits,
+                'firmas_anticipadas_usadas': self.prefetch_used,
+                'espera_firma_segundos': round(self.sign_wait, 2)
+            }
+
+    def _request_signed_url(self, s3_path: str) -> Optional[str]:
         """
         Obtener URL firmada para descargar un archivo desde S3
 
@@ -61,6 +271,8 @@ class PDFDownloader:
             full_url = f"{self.sign_url_endpoint}{encoded_s3_path}"
 
             self.logger.debug(f"Solicitando URL firmada para: {s3_path}")
+            with self.sign_lock:
+                self.sign_requests += 1
 
             # Hacer la petición
             response = self.session.get(
@@ -219,73 +431,182 @@ class PDFDownloader:
             's3_path': s3_path
         }
 
+        self._begin_download(s3_path)
         try:
-            # Paso 1: Obtener URL firmada
+            # Paso 1: Determinar nombre del archivo
+            filename = self._target_filename(s3_path, custom_filename, numero_radicado, fecha_sentencia)
+
+            result['filename'] = filename
+            filepath = self.pdf_dir / filename
+            result['filepath'] = str(filepath)
+
+            # Si ya se descargó antes, enlazar desde el almacén sin pedir URL firmada
+            entry = self.blob_store.lookup(s3_path)
+            if entry:
+                result['size'] = self.blob_store.restore(entry, filepath)
+                result['success'] = True
+                result['deduplicated'] = True
+                self.logger.info(f"♻️ Ya en el almacén: {filename} ({result['size']:,} bytes)")
+                return result
+
+            # Paso 2: Obtener URL firmada
             signed_url = self.get_signed_url(s3_path)
 
             if not signed_url:
                 result['error'] = "No se pudo obtener URL firmada"
                 return result
 
-            # Paso 2: Determinar nombre del archivo
-            if custom_filename:
-                filename = custom_filename
-            elif numero_radicado and fecha_sentencia:
-                filename = self.generate_filename(numero_radicado, fecha_sentencia, s3_path)
-            else:
-                filename = self.extract_filename_from_s3_path(s3_path)
+            # Paso 3: Descargar el archivo (reanudando un .part previo si existe)
+            self.logger.info(f"Descargando: {filename}")
+
+            try:
+                total_size = download_resumable(
+                    self.session, signed_url, filepath,
+                    headers=self.download_headers, timeout=60, min_size=len(PDF_HEADER),
+                    blob_store=self.blob_store, key=s3_path
+                )
+            except InvalidFileError:
+                result['error'] = "El archivo descargado no es un PDF válido"
+                self.logger.error(result['error'])
+                return result
+            except IncompleteDownloadError as e:
+                result['error'] = f"Descarga incompleta: {str(e)}"
+                self.logger.error(result['error'])
+                return result
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code == 403:
+                    # Firma caducada: el siguiente intento pedirá una nueva
+                    self.invalidate_signed_url(s3_path)
+                result['error'] = f"Error HTTP {e.response.status_code} al descargar"
+                self.logger.error(result['error'])
+                return result
+
+            result['size'] = total_size
+            result['success'] = True
+            self.logger.info(f"✅ Descargado exitosamente: {filename} ({total_size:,} bytes)")
+
+        except requests.exceptions.Timeout:
+            result['error'] = "Timeout durante la descarga"
+            self.logger.error(result['error'])
+        except requests.exceptions.RequestException as e:
+            result['error'] = f"Error de red: {str(e)}"
+            self.logger.error(result['error'])
+        except Exception as e:
+            result['error'] = f"Error inesperado: {str(e)}"
+            self.logger.error(result['error'])
+        finally:
+            self._end_download(s3_path)
 
+        return result
+
+    def _target_filename(self, s3_path: str, custom_filename: str = None,
+                         numero_radicado: str = None, fecha_sentencia: str = None) -> str:
+        """Nombre con el que guardar el PDF"""
+        if custom_filename:
+            return custom_filename
+        if numero_radicado and fecha_sentencia:
+            return self.generate_filename(numero_radicado, fecha_sentencia, s3_path)
+        return self.extract_filename_from_s3_path(s3_path)
+
+    async def download_pdf_async(self, engine: AsyncDownloadEngine, s3_path: str,
+                                 numero_radicado: str = None,
+                                 fecha_sentencia: str = None) -> Dict[str, any]:
+        """
+        Versión de `download_pdf` para el motor asyncio (mismo diccionario de resultado)
+
+        No reanuda .part previos con Range: cada intento descarga completo.
+        """
+        result = {
+            'success': False,
+            'filename': None,
+            'filepath': None,
+            'size': 0,
+            'error': None,
+            's3_path': s3_path
+        }
+        loop = asyncio.get_running_loop()
+
+        self._begin_download(s3_path)
+        try:
+            filename = self._target_filename(s3_path, None, numero_radicado, fecha_sentencia)
             result['filename'] = filename
             filepath = self.pdf_dir / filename
             result['filepath'] = str(filepath)
 
-            # Paso 3: Descargar el archivo
-            self.logger.info(f"Descargando: {filename}")
-
-            response = self.session.get(
-                signed_url,
-                headers=self.download_headers,
-                timeout=60,
-                stream=True
-            )
+            entry = self.blob_store.lookup(s3_path)
+            if entry:
+                result['size'] = await loop.run_in_executor(None, self.blob_store.restore, entry, filepath)
+                result['success'] = True
+                result['deduplicated'] = True
+                self.logger.info(f"♻️ Ya en el almacén: {filename} ({result['size']:,} bytes)")
+                return result
 
-            if response.status_code == 200:
-                # Guardar el archivo
-                total_size = 0
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            total_size += len(chunk)
-
-                result['size'] = total_size
-
-                # Validar que es un PDF
-                if self.validate_pdf(filepath):
-                    result['success'] = True
-                    self.logger.info(f"✅ Descargado exitosamente: {filename} ({total_size:,} bytes)")
-                else:
-                    # Si no es un PDF válido, eliminar el archivo
-                    filepath.unlink()
-                    result['error'] = "El archivo descargado no es un PDF válido"
-                    self.logger.error(result['error'])
+            # La firma puede esperar al pool de firma anticipada
+            signed_url = await loop.run_in_executor(None, self.get_signed_url, s3_path)
+            if not signed_url:
+                result['error'] = "No se pudo obtener URL firmada"
+                return result
 
-            else:
-                result['error'] = f"Error HTTP {response.status_code} al descargar"
+            self.logger.info(f"Descargando: {filename}")
+            try:
+                total_size = await engine.fetch_to_file(
+                    signed_url, filepath, headers=self.download_headers,
+                    min_size=len(PDF_HEADER), blob_store=self.blob_store, key=s3_path
+                )
+            except InvalidFileError:
+                result['error'] = "El archivo descargado no es un PDF válido"
                 self.logger.error(result['error'])
+                return result
+            except HTTPStatusError as e:
+                if e.status == 403:
+                    # Firma caducada: el siguiente intento pedirá una nueva
+                    self.invalidate_signed_url(s3_path)
+                result['error'] = f"Error HTTP {e.status} al descargar"
+                self.logger.error(result['error'])
+                return result
 
-        except requests.exceptions.Timeout:
+            result['size'] = total_size
+            result['success'] = True
+            self.logger.info(f"✅ Descargado exitosamente: {filename} ({total_size:,} bytes)")
+
+        except asyncio.TimeoutError:
             result['error'] = "Timeout durante la descarga"
             self.logger.error(result['error'])
-        except requests.exceptions.RequestException as e:
+        except aiohttp.ClientError as e:
             result['error'] = f"Error de red: {str(e)}"
             self.logger.error(result['error'])
         except Exception as e:
             result['error'] = f"Error inesperado: {str(e)}"
             self.logger.error(result['error'])
+        finally:
+            self._end_download(s3_path)
 
         return result
 
+    async def download_with_retry_async(self, engine: AsyncDownloadEngine, s3_path: str,
+                                        max_retries: int = 3, retry_delay: float = 2.0,
+                                        numero_radicado: str = None,
+                                        fecha_sentencia: str = None) -> Dict[str, any]:
+        """Versión asyncio de `download_with_retry`"""
+        last_result = None
+
+        for attempt in range(max_retries):
+            if attempt > 0:
+                self.logger.info(f"Reintento {attempt}/{max_retries - 1}")
+                await asyncio.sleep(retry_delay)
+
+            result = await self.download_pdf_async(engine, s3_path, numero_radicado=numero_radicado,
+                                                   fecha_sentencia=fecha_sentencia)
+            last_result = result
+
+            if result['success']:
+                return result
+
+            if result['error'] and "no es un PDF válido" in result['error']:
+                break
+
+        return last_result
+
     def download_with_retry(self, s3_path: str, max_retries: int = 3,
                             retry_delay: float = 2.0, numero_radicado: str = None,
                             fecha_sentencia: str = None) -> Dict[str, any]:
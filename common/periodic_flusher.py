@@ -0,0 +1,107 @@
+# common/periodic_flusher.py
+"""
+Persistencia diferida de archivos de estado
+Los workers solo avisan de que hay cambios (`notify`); un hilo en segundo
+plano llama a la función de guardado como mucho cada `interval` segundos, o
+antes si se acumulan `max_pending` cambios. Así un archivo que se reescribe
+entero (p.ej. un manifiesto) cuesta una escritura por intervalo y no una por
+documento, y los workers no esperan al disco.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+
+class PeriodicFlusher:
+    """Guardado agrupado en un hilo propio"""
+
+    def __init__(self, flush: Callable[[], None], interval: float = 5.0, max_pending: int = 100,
+                 name: str = 'flusher'):
+        """
+        Args:
+            flush: Función que persiste el estado completo
+            interval: Segundos máximos entre un cambio y su guardado
+            max_pending: Cambios acumulados que fuerzan un guardado inmediato
+            name: Nombre del hilo
+        """
+        self.flush_fn = flush
+        self.interval = interval
+        self.max_pending = max_pending
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+        self.condition = threading.Condition()
+        self.pending = 0
+        self.first_pending = 0.0
+        self.closed = False
+        self.thread = None
+
+        self.flushes = 0
+        self.changes = 0
+        self.flush_time = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def notify(self, count: int = 1):
+        """Registrar cambios pendientes de guardar"""
+        with self.condition:
+            if not self.pending:
+                self.first_pending = time.monotonic()
+            self.pending += count
+            self.changes += count
+            if self.pending >= self.max_pending:
+                self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed:
+                    if self.pending >= self.max_pending:
+                        break
+                    if self.pending:
+                        remaining = self.first_pending + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                    else:
+                        self.condition.wait()
+                if self.closed:
+                    return
+                self.pending = 0
+
+            self._flush()
+
+    def _flush(self):
+        start = time.monotonic()
+        try:
+            self.flush_fn()
+        except Exception as e:
+            self.logger.error(f"Error en guardado diferido ({self.name}): {e}")
+        self.flushes += 1
+        self.flush_time += time.monotonic() - start
+
+    def close(self):
+        """Detener el hilo y guardar lo que quede pendiente"""
+        with self.condition:
+            self.closed = True
+            pending = self.pending
+            self.pending = 0
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        if pending:
+            self._flush()
+
+    def get_stats(self) -> Dict[str, any]:
+        """Escrituras hechas frente a cambios recibidos"""
+        return {
+            'cambios_registrados': self.changes,
+            'escrituras': self.flushes,
+            'intervalo_segundos': self.interval,
+            'cambios_por_escritura': self.max_pending,
+            'tiempo_escritura_segundos': round(self.flush_time, 3)
+        }
@@ -0,0 +1,256 @@
+# common/rate_limiter.py
+"""
+Limitador de peticiones adaptativo por dominio
+Token bucket por host con ajuste AIMD: la tasa sube de forma aditiva mientras
+las respuestas son 2xx y rápidas, y baja de forma multiplicativa ante 429/5xx,
+errores de red o latencia creciente. `Retry-After` pausa el host completo.
+
+Hay un único limitador por proceso (`get_rate_limiter`): todos los clientes
+HTTP, de todos los trabajos simultáneos, comparten los buckets de cada host.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# Tasas iniciales (peticiones/segundo) por dominio. Los valores iniciales
+# equivalen a las pausas fijas que usaba cada scraper; los hosts que no
+# aparecen aquí no se limitan. Una entrada 'dominio/ruta' tiene bucket propio
+# para las URLs de ese prefijo (gana el prefijo más largo).
+DOMAIN_RATES = {
+    # Jurisprudencia CSJ (antes 0.8 s entre páginas)
+    'consultajurisprudencial.ramajudicial.gov.co': {'rate': 1.25, 'min_rate': 0.25, 'max_rate': 8.0},
+    # Descargas de PDFs de la CSJ: antes sin pausa, no compiten con la navegación
+    'consultajurisprudencial.ramajudicial.gov.co/WebRelatoria/FileReferenceServlet':
+        {'rate': 4.0, 'min_rate': 0.5, 'max_rate': 16.0, 'burst': 4},
+    # Elasticsearch del Tesauro (antes 0.5 s entre páginas)
+    'admin.es.prod.ssociedades.nuvu.cc': {'rate': 2.0, 'min_rate': 0.5, 'max_rate': 10.0},
+    # DIAN / CIJUF (antes 1 s por documento)
+    'cijuf.org.co': {'rate': 1.0, 'min_rate': 0.2, 'max_rate': 5.0},
+    # SAMAI Consejo de Estado (antes 0.3 s entre páginas)
+    'samai.consejodeestado.gov.co': {'rate': 3.0, 'min_rate': 0.5, 'max_rate': 10.0},
+    # Biblioteca digital CCB (antes 0.5 s por ítem y 1 s por página)
+    'bibliotecadigital.ccb.org.co': {'rate': 2.0, 'min_rate': 0.25, 'max_rate': 8.0},
+}
+
+# Parámetros AIMD
+INCREASE_FRACTION = 0.1      # Incremento aditivo: 10% de la tasa inicial por respuesta rápida
+ERROR_DECREASE = 0.5         # Factor ante 429/5xx o error de red
+LATENCY_DECREASE = 0.8       # Factor ante latencia creciente
+LATENCY_FACTOR = 2.0         # Lenta = más del doble de la latencia media...
+MIN_SLOW_LATENCY = 0.5       # ...y por encima de medio segundo (evita ruido)
+LATENCY_EWMA_ALPHA = 0.2
+MAX_RETRY_AFTER = 300        # No pausar un host más de 5 minutos
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convertir un header Retry-After (segundos o fecha HTTP) a segundos"""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class HostBucket:
+    """Token bucket de un host con tasa ajustable"""
+
+    def __init__(self, host: str, rate: float, min_rate: float, max_rate: float, burst: float = 1):
+        self.host = host
+        self.initial_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+
+        self.lock = threading.Lock()
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.latency_avg = None
+
+        # Contadores para el reporte
+        self.requests = 0
+        self.slow_responses = 0
+        self.throttled = 0
+        self.retry_after_honored = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        # `last` puede estar en el futuro mientras el host está pausado
+        if now > self.last:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def acquire(self):
+        """Reservar un token y esperar lo necesario"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self) -> float:
+        """Reservar un token sin dormir; devuelve los segundos a esperar (para asyncio)"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            self.requests += 1
+
+            wait = max(self.last - now, 0.0)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            self.total_wait += wait
+        return wait
+
+    def observe(self, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """
+        Ajustar la tasa según el resultado de una petición
+
+        Args:
+            status: Código HTTP (None si hubo error de red)
+            latency: Segundos hasta recibir la respuesta
+            retry_after: Segundos indicados por el servidor en Retry-After
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if status is None or status == 429 or status >= 500:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate * ERROR_DECREASE)
+
+                if retry_after:
+                    # Pausar el host: no se generan tokens hasta que pase el plazo
+                    self.retry_after_honored += 1
+                    self.last = max(self.last, now + min(retry_after, MAX_RETRY_AFTER))
+                    self.tokens = min(self.tokens, 0)
+                return
+
+            slow = (self.latency_avg is not None and latency > MIN_SLOW_LATENCY and
+                    latency > self.latency_avg * LATENCY_FACTOR)
+            if self.latency_avg is None:
+                self.latency_avg = latency
+            else:
+                self.latency_avg += LATENCY_EWMA_ALPHA * (latency - self.latency_avg)
+
+            if slow:
+                self.slow_responses += 1
+                self.rate = max(self.min_rate, self.rate * LATENCY_DECREASE)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.initial_rate * INCREASE_FRACTION)
+
+    def snapshot(self) -> Dict[str, any]:
+        with self.lock:
+            return {
+                'tasa_inicial': self.initial_rate,
+                'tasa_actual': round(self.rate, 3),
+                'tasa_min': self.min_rate,
+                'tasa_max': self.max_rate,
+                'peticiones': self.requests,
+                'respuestas_lentas': self.slow_responses,
+                'errores_throttling': self.throttled,
+                'retry_after_respetados': self.retry_after_honored,
+                'espera_total_segundos': round(self.total_wait, 2),
+                'latencia_media_ms': round(self.latency_avg * 1000, 1) if self.latency_avg is not None else None
+            }
+
+
+class AdaptiveRateLimiter:
+    """Conjunto de buckets por host configurados por dominio"""
+
+    def __init__(self, domain_rates: Optional[Dict[str, dict]] = None):
+        """
+        Args:
+            domain_rates: Configuración adicional o que reemplaza a DOMAIN_RATES,
+                {dominio: {'rate', 'min_rate', 'max_rate', 'burst'}}
+        """
+        self.domain_rates = dict(DOMAIN_RATES)
+        self.domain_rates.update(domain_rates or {})
+        self.buckets: Dict[str, HostBucket] = {}
+        self.lock = threading.Lock()
+
+    def configure(self, domain_rates: Dict[str, dict]):
+        """
+        Añadir o reemplazar configuración de dominios
+
+        Los hosts que ya tienen bucket lo conservan (con su tasa aprendida);
+        la configuración nueva se aplica a los hosts que aún no se usaron.
+        """
+        with self.lock:
+            self.domain_rates.update(domain_rates)
+            for host in [h for h, bucket in self.buckets.items() if bucket is None]:
+                del self.buckets[host]
+
+    def _config_for(self, host: str, path: str) -> Tuple[str, Optional[dict]]:
+        """Clave del bucket (host o host+ruta) y su configuración"""
+        key, match, match_length = host, None, -1
+        for entry, config in self.domain_rates.items():
+            domain, _, prefix = entry.partition('/')
+            prefix = '/' + prefix if prefix else ''
+            # Coincidencia exacta o por subdominio, y por prefijo de ruta
+            if (host == domain or host.endswith('.' + domain)) and path.startswith(prefix) \
+                    and len(prefix) > match_length:
+                key, match, match_length = host + prefix, config, len(prefix)
+        return key, match
+
+    def bucket_for(self, url: str) -> Optional[HostBucket]:
+        """Bucket de `url` (None si el dominio no está limitado)"""
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+
+        with self.lock:
+            key, config = self._config_for(host, parsed.path or '/')
+            if key in self.buckets:
+                return self.buckets[key]
+
+            bucket = None
+            if config:
+                rate = config['rate']
+                bucket = HostBucket(
+                    key,
+                    rate=rate,
+                    min_rate=config.get('min_rate', rate),
+                    max_rate=config.get('max_rate', rate),
+                    burst=config.get('burst', 1)
+                )
+            self.buckets[key] = bucket
+            return bucket
+
+    def get_stats(self) -> Dict[str, Dict[str, any]]:
+        """Estado de cada host limitado, para los reportes finales"""
+        with self.lock:
+            buckets = [b for b in self.buckets.values() if b is not None]
+        return {bucket.host: bucket.snapshot() for bucket in buckets}
+
+
+_limiter: Optional[AdaptiveRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(domain_rates: Optional[Dict[str, dict]] = None) -> AdaptiveRateLimiter:
+    """
+    Limitador compartido por todo el proceso
+
+    Args:
+        domain_rates: Configuración adicional que se fusiona en el limitador
+            compartido (ver `AdaptiveRateLimiter.configure`)
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveRateLimiter()
+        limiter = _limiter
+    if domain_rates:
+        limiter.configure(domain_rates)
+    return limiter
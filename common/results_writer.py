@@ -0,0 +1,236 @@
+# common/results_writer.py
+"""
+Persistencia incremental de resultados
+Cada página de resultados se añade a un JSONL y a un CSV abiertos en modo
+append (una escritura por registro nuevo, no una reescritura del archivo
+completo). Los cambios posteriores de un registro (estado de descarga) se
+añaden al JSONL como una nueva línea: la última línea de cada clave es la
+vigente. Un archivo pequeño `progreso.json` mantiene los conteos para que los
+endpoints de estado no tengan que leer los resultados.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+JSONL_NAME = 'resultados.jsonl'
+PROGRESS_NAME = 'progreso.json'
+
+# Intervalo mínimo entre escrituras de progreso.json
+PROGRESS_INTERVAL = 1.0
+
+
+def read_progress(log_dir: Path) -> Optional[Dict[str, any]]:
+    """Conteos de progreso de una ejecución (None si no hay sidecar)"""
+    try:
+        with open(Path(log_dir) / PROGRESS_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+class IncrementalResultsWriter:
+    """JSONL + CSV en modo append con conteos en un sidecar"""
+
+    def __init__(self, log_dir: Path, csv_name: str, csv_fields: List[str],
+                 key: Union[str, Tuple[str, ...]] = 'id', state_field: str = 'estado_descarga'):
+        """
+        Args:
+            log_dir: Directorio de la ejecución
+            csv_name: Nombre del CSV de resultados
+            csv_fields: Columnas del CSV
+            key: Campo (o tupla de campos) que identifica cada registro
+            state_field: Campo cuyo valor se cuenta en el sidecar
+        """
+        self.log_dir = Path(log_dir)
+        self.jsonl_path = self.log_dir / JSONL_NAME
+        self.csv_path = self.log_dir / csv_name
+        self.progress_path = self.log_dir / PROGRESS_NAME
+        self.csv_fields = csv_fields
+        self.key = key
+        self.state_field = state_field
+
+        self.lock = threading.Lock()
+        self.states: Dict[str, str] = {}
+        self.counts = Counter()
+        self.pages = 0
+        self.last_progress = 0.0
+
+        self._jsonl = None
+        self._csv_file = None
+        self._csv = None
+
+    def _open(self):
+        if self._jsonl is not None:
+            return
+        self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8')
+        new_csv = not self.csv_path.exists() or self.csv_path.stat().st_size == 0
+        self._csv_file = open(self.csv_path, 'a', newline='', encoding='utf-8')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=self.csv_fields, extrasaction='ignore')
+        if new_csv:
+            self._csv.writeheader()
+
+    def _key(self, record: Dict):
+        if isinstance(self.key, tuple):
+            return tuple(record.get(field) for field in self.key)
+        return record.get(self.key)
+
+    def _track(self, record: Dict):
+        """Actualizar los conteos por estado con la versión actual del registro"""
+        record_key = self._key(record)
+        state = record.get(self.state_field)
+        previous = self.states.get(record_key)
+        if previous is not None:
+            self.counts[previous] -= 1
+        self.states[record_key] = state
+        self.counts[state] += 1
+
+    def append_page(self, records: Iterable[Dict]):
+        """Añadir los registros de una página y volcarlos a disco"""
+        with self.lock:
+            self._open()
+            for record in records:
+                self._jsonl.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self._csv.writerow(record)
+                self._track(record)
+            self.pages += 1
+            self._jsonl.flush()
+            self._csv_file.flush()
+            if time.monotonic() - self.last_progress >= PROGRESS_INTERVAL:
+                self._write_progress()
+
+    def update(self, record: Dict):
+        """Añadir la nueva versión de un registro (p.ej. tras su descarga)"""
+        with self.lock:
+            self._open()
+            self._jsonl.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._jsonl.flush()
+            self._track(record)
+            if time.monotonic() - self.last_progress >= PROGRESS_INTERVAL:
+                self._write_progress()
+
+    def read_existing(self) -> List[Dict]:
+        """Registros ya escritos en el JSONL (última versión de cada clave, en orden de llegada)"""
+        latest = {}
+        if not self.jsonl_path.exists():
+            return []
+        with open(self.jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Línea cortada por una interrupción
+                latest[self._key(record)] = record
+        return list(latest.values())
+
+    def restore(self, records: Iterable[Dict]):
+        """Contar registros escritos por una ejecución anterior sin volver a escribirlos"""
+        with self.lock:
+            for record in records:
+                self._track(record)
+
+    def _write_progress(self):
+        progress = {
+            'registros': len(self.states),
+            'paginas': self.pages,
+            'estados': {state: count for state, count in self.counts.items() if count},
+            'fecha_actualizacion': datetime.now().isoformat()
+        }
+        tmp = self.progress_path.with_name(self.progress_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(progress, f, ensure_ascii=False)
+        os.replace(tmp, self.progress_path)
+        self.last_progress = time.monotonic()
+
+    def finalize(self, results: List[Dict], json_path: Optional[Path] = None):
+        """
+        Cerrar los archivos incrementales y escribir una sola vez las versiones finales
+
+        El CSV se reescribe con el estado final de cada registro (el incremental
+        conserva el estado que tenían al recolectarse). El JSON completo solo se
+        escribe si se indica `json_path`.
+        """
+        with self.lock:
+            self.close()
+
+            tmp = self.csv_path.with_name(self.csv_path.name + '.tmp')
+            with open(tmp, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.csv_fields, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(results)
+            os.replace(tmp, self.csv_path)
+
+            if json_path is not None:
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, ensure_ascii=False, indent=2)
+
+            for record in results:
+                self._track(record)
+            self._write_progress()
+
+    def finalize_from_log(self, json_path: Optional[Path] = None) -> int:
+        """
+        Como `finalize`, pero tomando las versiones finales del propio JSONL
+
+        No necesita los resultados en memoria: una primera pasada anota dónde
+        empieza la última línea de cada clave (en orden de llegada) y la
+        segunda escribe el CSV y el JSON registro a registro.
+
+        Returns:
+            Registros escritos
+        """
+        with self.lock:
+            self.close()
+
+            latest: Dict[str, int] = {}
+            if self.jsonl_path.exists():
+                with open(self.jsonl_path, 'rb') as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            # Reasignar una clave existente conserva su posición de llegada
+                            latest[self._key(json.loads(line))] = offset
+                        except json.JSONDecodeError:
+                            pass  # Línea cortada por una interrupción
+                        offset += len(line)
+
+            tmp = self.csv_path.with_name(self.csv_path.name + '.tmp')
+            json_file = open(json_path, 'w', encoding='utf-8') if json_path is not None else None
+            try:
+                with open(self.jsonl_path if latest else os.devnull, 'rb') as source, \
+                        open(tmp, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.DictWriter(f, fieldnames=self.csv_fields, extrasaction='ignore')
+                    writer.writeheader()
+                    if json_file:
+                        json_file.write('[')
+
+                    for n, offset in enumerate(latest.values()):
+                        source.seek(offset)
+                        record = json.loads(source.readline())
+                        writer.writerow(record)
+                        if json_file:
+                            # Mismo formato que json.dump(lista, indent=2)
+                            item = json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                            json_file.write((',\n  ' if n else '\n  ') + item)
+                        self._track(record)
+
+                    if json_file:
+                        json_file.write('\n]' if latest else ']')
+            finally:
+                if json_file:
+                    json_file.close()
+
+            os.replace(tmp, self.csv_path)
+            self._write_progress()
+            return len(latest)
+
+    def close(self):
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._csv_file.close()
+            self._jsonl = self._csv_file = self._csv = None
@@ -0,0 +1,340 @@
+# common/stream_writer.py
+"""
+Escritura de descargas en streaming
+Valida la cabecera con el primer bloque, escribe directamente a un archivo .part
+y lo renombra de forma atómica cuando la descarga termina correctamente.
+`download_resumable` conserva el .part si la conexión se corta y continúa con
+peticiones `Range` en lugar de empezar desde cero.
+"""
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+import requests
+
+# Configuración por defecto para PDFs
+PDF_HEADER = b'%PDF'
+MIN_PDF_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidFileError(Exception):
+    """El contenido descargado no es válido (cabecera incorrecta o muy pequeño)"""
+
+
+class IncompleteDownloadError(Exception):
+    """Se recibieron menos bytes de los anunciados; el .part se conserva para reanudar"""
+
+
+class StreamingFileWriter:
+    """
+    Escribe un archivo bloque a bloque sin acumularlo en memoria
+
+    El contenido se escribe en `<nombre>.part` y solo se renombra al nombre
+    final en `commit()`. Si algo falla se llama a `abort()` y el archivo
+    parcial se elimina, de modo que nunca queda un PDF truncado con el
+    nombre definitivo.
+    """
+
+    def __init__(self, filepath: Path, expected_header: Optional[bytes] = PDF_HEADER,
+                 min_size: int = MIN_PDF_SIZE):
+        """
+        Args:
+            filepath: Ruta final del archivo
+            expected_header: Bytes con los que debe empezar el archivo (None = sin validar)
+            min_size: Tamaño mínimo aceptado en bytes
+        """
+        self.filepath = Path(filepath)
+        self.part_path = self.filepath.with_name(self.filepath.name + '.part')
+        self.expected_header = expected_header or b''
+        self.min_size = min_size
+
+        self.bytes_written = 0
+        self._head = b''
+        self._file = None
+
+        # Si es True, un error de red no borra el .part (ver `download_resumable`)
+        self.keep_partial = False
+
+    def write(self, chunk: bytes):
+        """Escribir un bloque validando la cabecera en cuanto está disponible"""
+        if not chunk:
+            return
+
+        # Validar cabecera con los primeros bytes (normalmente el primer bloque)
+        if len(self._head) < len(self.expected_header):
+            self._head += chunk[:len(self.expected_header) - len(self._head)]
+            if not self.expected_header.startswith(self._head):
+                raise InvalidFileError("Archivo no válido o muy pequeño")
+
+        if self._file is None:
+            self._file = open(self.part_path, 'wb')
+
+        self._file.write(chunk)
+        self.bytes_written += len(chunk)
+
+    def open_partial(self) -> int:
+        """
+        Continuar un .part existente en modo append
+
+        Returns:
+            Bytes ya presentes (0 si no hay archivo parcial)
+        """
+        self._close()
+        self.bytes_written = 0
+        self._head = b''
+
+        if not self.part_path.exists():
+            return 0
+
+        with open(self.part_path, 'rb') as f:
+            self._head = f.read(len(self.expected_header))
+        if not self.expected_header.startswith(self._head):
+            self.reset()
+            return 0
+
+        self.bytes_written = self.part_path.stat().st_size
+        self._file = open(self.part_path, 'ab')
+        return self.bytes_written
+
+    def reset(self):
+        """Descartar lo escrito y volver a empezar desde el byte cero"""
+        self.abort()
+        self.bytes_written = 0
+        self._head = b''
+
+    def commit(self) -> int:
+        """
+        Cerrar, validar y mover el archivo a su nombre final
+
+        Returns:
+            Tamaño final en bytes
+        """
+        self._close()
+
+        if self.bytes_written < self.min_size or self._head != self.expected_header:
+            self.abort()
+            raise InvalidFileError("Archivo no válido o muy pequeño")
+
+        return self._finalize()
+
+    def _finalize(self) -> int:
+        """Mover el archivo parcial ya validado a su destino"""
+        os.replace(self.part_path, self.filepath)
+        return self.bytes_written
+
+    def abort(self):
+        """Descartar el archivo parcial"""
+        self._close()
+        try:
+            self.part_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            return False
+        if self.keep_partial and not issubclass(exc_type, InvalidFileError):
+            self._close()
+        else:
+            self.abort()
+        return False
+
+
+def stream_response_to_file(response, filepath: Path, expected_header: Optional[bytes] = PDF_HEADER,
+                            min_size: int = MIN_PDF_SIZE, chunk_size: int = CHUNK_SIZE,
+                            blob_store=None, key: Optional[str] = None) -> int:
+    """
+    Volcar una respuesta `stream=True` a disco con memoria constante
+
+    Args:
+        response: Respuesta de requests abierta con stream=True
+        filepath: Ruta final del archivo
+        expected_header: Cabecera esperada (None = sin validar)
+        min_size: Tamaño mínimo aceptado en bytes
+        chunk_size: Tamaño de bloque de lectura
+        blob_store: BlobStore donde deduplicar el contenido (opcional)
+        key: Clave de origen del documento para el índice del BlobStore
+
+    Returns:
+        Tamaño del archivo guardado en bytes
+    """
+    # Rechazar antes de escribir nada si el servidor ya anuncia un tamaño inválido
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and int(content_length) < min_size:
+        raise InvalidFileError("Archivo no válido o muy pequeño")
+
+    if blob_store is not None:
+        writer = blob_store.writer(filepath, key, expected_header, min_size)
+    else:
+        writer = StreamingFileWriter(filepath, expected_header, min_size)
+
+    with writer:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            writer.write(chunk)
+        return writer.commit()
+
+
+def validate_existing_file(filepath: Path, expected_header: Optional[bytes] = PDF_HEADER,
+                           min_size: int = MIN_PDF_SIZE) -> Optional[int]:
+    """
+    Comprobar un archivo ya descargado con los mismos criterios que la escritura
+
+    Returns:
+        Tamaño en bytes si el archivo existe y es válido, None en otro caso
+    """
+    try:
+        size = filepath.stat().st_size
+        if size < min_size:
+            return None
+        if expected_header:
+            with open(filepath, 'rb') as f:
+                if f.read(len(expected_header)) != expected_header:
+                    return None
+        return size
+    except OSError:
+        return None
+
+
+def _parse_content_range(value: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """'bytes 100-199/2000' -> (100, 2000); 'bytes */2000' -> (None, 2000)"""
+    match = re.match(r'bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)', value or '')
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) else None
+    total = int(match.group(2)) if match.group(2) != '*' else None
+    return start, total
+
+
+def _read_part_meta(meta_path: Path) -> dict:
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _download_attempt(session: requests.Session, url: str, writer: StreamingFileWriter,
+                      meta_path: Path, headers: Optional[dict], timeout: float, chunk_size: int) -> int:
+    # Sin compresión: los rangos deben referirse a los bytes del archivo
+    request_headers = dict(headers or {})
+    request_headers['Accept-Encoding'] = 'identity'
+
+    offset = writer.open_partial()
+    if offset:
+        request_headers['Range'] = f'bytes={offset}-'
+        meta = _read_part_meta(meta_path)
+        validator = meta.get('etag') or meta.get('last_modified')
+        if validator:
+            # Si el archivo cambió, el servidor responde 200 con el contenido completo
+            request_headers['If-Range'] = validator
+
+    with session.get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 416 and offset:
+            _, total = _parse_content_range(response.headers.get('Content-Range'))
+            if total == offset:
+                return writer.commit()  # El .part ya estaba completo
+            writer.reset()
+            raise IncompleteDownloadError("Rango no satisfacible, se reinicia la descarga")
+
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            start, total = _parse_content_range(response.headers.get('Content-Range'))
+            if start != offset:
+                writer.reset()
+                raise IncompleteDownloadError("Content-Range inesperado, se reinicia la descarga")
+            logger.info(f"Reanudando {writer.filepath.name} desde el byte {offset:,}")
+        else:
+            if offset:
+                logger.info(f"El servidor no admite Range para {writer.filepath.name}, descarga completa")
+                writer.reset()
+
+            content_length = response.headers.get('Content-Length')
+            total = int(content_length) if content_length and content_length.isdigit() else None
+            if total is not None and total < writer.min_size:
+                raise InvalidFileError("Archivo no válido o muy pequeño")
+
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'total': total
+                }, f)
+
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            writer.write(chunk)
+
+    if total is not None and writer.bytes_written != total:
+        raise IncompleteDownloadError(f"Recibidos {writer.bytes_written:,} de {total:,} bytes")
+
+    return writer.commit()
+
+
+def download_resumable(session: requests.Session, url: str, filepath: Path,
+                       headers: Optional[dict] = None, timeout: float = 60,
+                       expected_header: Optional[bytes] = PDF_HEADER, min_size: int = MIN_PDF_SIZE,
+                       chunk_size: int = CHUNK_SIZE, blob_store=None, key: Optional[str] = None,
+                       max_attempts: int = 3) -> int:
+    """
+    Descargar `url` a disco reanudando con `Range` tras un corte
+
+    El .part se conserva entre intentos (y entre llamadas, si hay `key` o no
+    se usa BlobStore) junto a un `.part.json` con ETag/Last-Modified y el
+    tamaño anunciado. Si el servidor ignora el rango se descarga completo, y
+    el tamaño final se valida contra Content-Length / Content-Range.
+
+    Args:
+        session: Sesión con la que descargar
+        url: URL del archivo
+        filepath: Ruta final del archivo
+        headers: Headers adicionales de la petición
+        timeout: Segundos máximos sin recibir datos
+        expected_header: Cabecera esperada (None = sin validar)
+        min_size: Tamaño mínimo aceptado en bytes
+        chunk_size: Tamaño de bloque de lectura
+        blob_store: BlobStore donde deduplicar el contenido (opcional)
+        key: Clave de origen del documento para el índice del BlobStore
+        max_attempts: Intentos contra la misma URL antes de propagar el error
+
+    Returns:
+        Tamaño del archivo guardado en bytes
+    """
+    if blob_store is not None:
+        writer = blob_store.writer(filepath, key, expected_header, min_size, resumable=True)
+    else:
+        writer = StreamingFileWriter(filepath, expected_header, min_size)
+    writer.keep_partial = True
+    meta_path = writer.part_path.with_name(writer.part_path.name + '.json')
+
+    try:
+        with writer:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    size = _download_attempt(session, url, writer, meta_path, headers, timeout, chunk_size)
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        requests.exceptions.ChunkedEncodingError, IncompleteDownloadError) as e:
+                    if attempt == max_attempts:
+                        raise
+                    logger.warning(f"Descarga interrumpida ({e}); reintento {attempt}/{max_attempts - 1}")
+    except InvalidFileError:
+        meta_path.unlink(missing_ok=True)
+        raise
+
+    meta_path.unlink(missing_ok=True)
+    return size
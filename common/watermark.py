@@ -0,0 +1,247 @@
+# common/watermark.py
+"""
+Sincronización incremental por marca de agua
+Cada fuente guarda, por consulta (filtros sin el rango de fechas), la fecha
+más reciente sincronizada y los IDs vistos en ese último periodo. La
+siguiente ejecución en modo sincronización adelanta la fecha inicial hasta
+la marca, de modo que solo se consulta material nuevo; los documentos del
+periodo de la marca que ya se conocían se omiten por ID.
+
+La marca solo se guarda tras una ejecución completa (sin límite de
+resultados ni cancelación): si no, quedarían huecos por debajo de ella.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+WATERMARK_DIR = Path("marcas_sincronizacion")
+
+# Caracteres de la fecha ISO que definen el periodo de la marca
+PERIOD_LENGTH = {'day': 10, 'month': 7}
+
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d')
+
+
+def iso_date(value) -> Optional[str]:
+    """
+    Normalizar una fecha a 'YYYY-MM-DD'
+
+    Acepta date/datetime, 'DD/MM/YYYY', 'YYYY-MM-DD' (con hora opcional),
+    'YYYY-MM' y 'YYYY' (se completan con el primer día). None si no se reconoce.
+    """
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    if not value:
+        return None
+
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text[:10], fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+
+    match = re.match(r'^(\d{4})(?:-(\d{2}))?$', text)
+    if match:
+        return f"{match.group(1)}-{match.group(2) or '01'}-01"
+    return None
+
+
+class Watermark:
+    """Marca de agua de una consulta: fecha más reciente e IDs de ese periodo"""
+
+    def __init__(self, source: str, query: Dict[str, any], period: str = 'day',
+                 directory: Path = WATERMARK_DIR):
+        """
+        Args:
+            source: Nombre de la fuente (prefijo del archivo)
+            query: Filtros de la búsqueda sin el rango de fechas
+            period: 'day' o 'month'; granularidad de la marca y de los conteos
+            directory: Carpeta de las marcas
+        """
+        self.query = {k: v for k, v in query.items() if v not in (None, '')}
+        digest = hashlib.sha1(json.dumps(self.query, sort_keys=True, ensure_ascii=False)
+                              .encode('utf-8')).hexdigest()[:12]
+        self.path = Path(directory) / f'{source}_{digest}.json'
+        self.source = source
+        self.length = PERIOD_LENGTH[period]
+        self.lock = threading.Lock()
+
+        previous = self._load()
+        self.mark: Optional[str] = previous.get('marca')
+        self.coverage_start: str = previous.get('desde', '')
+        self.boundary_ids = set(previous.get('ids_marca', []))
+        self.counts = Counter(previous.get('documentos_por_periodo', {}))
+        self.runs = previous.get('ejecuciones', 0)
+        # Una consulta ya acotada puede caber en una sola página: se recuerda el tamaño real
+        self.page_size = previous.get('tamaño_pagina', 0)
+
+        # Estado de esta ejecución (ver `narrow`)
+        self.narrowed = False
+        self.requested = ('', None)
+        self.effective_start: Optional[str] = None
+        self.new_mark: Optional[str] = None
+        self.new_boundary = set()
+        self.new_counts = Counter()
+        self.new_documents = 0
+        self.skipped = 0
+        self.requests = 0
+
+    def _load(self) -> Dict[str, any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _period(self, value: Optional[str]) -> Optional[str]:
+        return value[:self.length] if value else None
+
+    def narrow(self, start: Optional[str], end: Optional[str] = None) -> Optional[str]:
+        """
+        Fecha inicial efectiva para consultar [start, end]
+
+        Solo se adelanta si el inicio pedido cae dentro del rango ya
+        sincronizado (desde ≤ inicio ≤ marca); si no, es un recorrido completo
+        que sustituirá la marca al guardarse.
+
+        Args:
+            start: Inicio pedido en ISO ('' o None = sin límite)
+            end: Fin pedido en ISO (None = sin límite)
+
+        Returns:
+            Inicio a consultar, con la granularidad del periodo, o None si el
+            rango pedido ya está sincronizado entero
+        """
+        start = self._period(start) or ''
+        end = self._period(end)
+        self.requested = (start, end)
+
+        if self.mark and self.coverage_start <= start <= self.mark:
+            self.narrowed = True
+            self.new_mark = self.mark
+            self.new_boundary = set(self.boundary_ids)
+            if end is not None and end < self.mark:
+                self.effective_start = None
+            else:
+                self.effective_start = self.mark
+        else:
+            self.effective_start = start
+
+        return self.effective_start
+
+    def is_known(self, doc_id: str, doc_date: Optional[str] = None) -> bool:
+        """True si el documento ya se sincronizó (ID del periodo de la marca o fecha anterior)"""
+        if not self.narrowed:
+            return False
+        period = self._period(doc_date)
+        known = doc_id in self.boundary_ids or (period is not None and period < self.mark)
+        if known:
+            with self.lock:
+                self.skipped += 1
+        return known
+
+    def observe(self, doc_id: str, doc_date: Optional[str]):
+        """Registrar un documento nuevo para la próxima marca"""
+        period = self._period(doc_date)
+        with self.lock:
+            self.new_documents += 1
+            if period is None:
+                return
+            self.new_counts[period] += 1
+            if self.new_mark is None or period > self.new_mark:
+                self.new_mark = period
+                self.new_boundary = {doc_id}
+            elif period == self.new_mark:
+                self.new_boundary.add(doc_id)
+
+    def accept(self, doc_id: str, doc_date: Optional[str]) -> bool:
+        """Omitir un documento conocido o registrarlo como nuevo; True si es nuevo"""
+        if self.is_known(doc_id, doc_date):
+            return False
+        self.observe(doc_id, doc_date)
+        return True
+
+    def record_page_size(self, size: int):
+        """Registrar los documentos de una página de listado (se guarda el mayor visto)"""
+        with self.lock:
+            self.page_size = max(self.page_size, size)
+
+    def record_request(self, count: int = 1):
+        """Contar peticiones de listado hechas en esta ejecución"""
+        with self.lock:
+            self.requests += count
+
+    def known_documents(self) -> int:
+        """Documentos ya sincronizados dentro del rango pedido"""
+        if not self.narrowed:
+            return 0
+        start, end = self.requested
+        return sum(count for period, count in self.counts.items()
+                   if period >= start and (end is None or period <= end))
+
+    def save(self):
+        """Guardar la marca tras una ejecución completa"""
+        with self.lock:
+            if self.narrowed:
+                counts = self.counts + self.new_counts
+                coverage_start = self.coverage_start
+            else:
+                counts = self.new_counts
+                coverage_start = self.requested[0]
+
+            state = {
+                'fuente': self.source,
+                'consulta': self.query,
+                'desde': coverage_start,
+                'marca': self.new_mark,
+                'ids_marca': sorted(self.new_boundary),
+                'documentos_por_periodo': dict(sorted(counts.items())),
+                'tamaño_pagina': self.page_size,
+                'ejecuciones': self.runs + 1,
+                'fecha_actualizacion': datetime.now().isoformat()
+            }
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def get_stats(self, per_document: int = 0, fixed_requests: int = 0) -> Dict[str, any]:
+        """
+        Peticiones hechas frente a las de volver a recorrer todo el rango pedido
+
+        Args:
+            per_document: Peticiones por documento que el modo incremental evita
+                (las que el almacén deduplicado ya ahorraría no se cuentan)
+            fixed_requests: Peticiones de listado que no dependen del tamaño
+                (total de resultados, página final vacía...)
+        """
+        with self.lock:
+            known = self.known_documents()
+            total = known + self.new_documents
+            full = fixed_requests + math.ceil(total / max(self.page_size, 1)) + total * per_document
+            made = self.requests + self.new_documents * per_document
+
+            return {
+                'activa': self.narrowed,
+                'archivo_marca': str(self.path),
+                'marca_anterior': self.mark,
+                'marca_nueva': self.new_mark,
+                'fecha_desde_solicitada': self.requested[0] or None,
+                'fecha_desde_consultada': self.effective_start,
+                'documentos_ya_sincronizados': known,
+                'documentos_omitidos': self.skipped,
+                'documentos_nuevos': self.new_documents,
+                'peticiones_realizadas': made,
+                'peticiones_recrawl_estimadas': full,
+                'peticiones_ahorradas': max(0, full - made)
+            }
@@ -1,22 +1,38 @@
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 import json
-import time
 from datetime import datetime
 import re
+import calendar
+from datetime import date
 from pathlib import Path
 import csv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urlencode, urlparse, parse_qs, quote, unquote
 from urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+
+from common.async_downloader import AsyncDownloadEngine
+from common.blob_store import get_blob_store
+from common.http_cache import RECENT_TTL, get_http_cache, period_ttl
+from common.http_client import HTTPClient
+from common.stream_writer import PDF_HEADER, InvalidFileError, stream_response_to_file
+from common.watermark import Watermark, iso_date
+
+# Peticiones por item al procesarlo: metadatos, bundles, lista de bitstreams y
+# al menos un detalle de bitstream (el PDF en sí lo ahorra ya el almacén)
+REQUESTS_PER_ITEM = 4
+
+# Transferencias simultáneas con el motor asyncio (independiente de los workers de metadatos)
+ASYNC_DOWNLOADS = 50
 
 
 class CCBArbitrajeScraper:
     def __init__(self, output_dir: str = "descargas_biblioteca", log_dir: str = None,
-                 timestamp: str = None, max_workers: int = 5):
+                 timestamp: str = None, max_workers: int = 5, download_engine: str = 'threads',
+                 download_concurrency: int = ASYNC_DOWNLOADS):
         # Usar timestamp proporcionado o generar uno nuevo
         self.timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
 
@@ -42,6 +58,13 @@ class CCBArbitrajeScraper:
 
         self.max_workers = max_workers
 
+        # Con 'asyncio' los workers solo piden los metadatos: la transferencia
+        # de los PDFs se envía al event loop de AsyncDownloadEngine, con hasta
+        # `download_concurrency` descargas abiertas sin un hilo por cada una
+        self.download_engine = download_engine
+        self.download_concurrency = download_concurrency
+        self.async_engine = None
+
         # Configurar logging
         log_format = '%(asctime)s - %(levelname)s - %(message)s'
 
@@ -61,15 +84,6 @@ class CCBArbitrajeScraper:
         self.logger.addHandler(file_handler)
         self.logger.addHandler(console_handler)
 
-        # Configurar sesión con timeouts más largos
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'application/json, text/html, */*',
-            'Accept-Language': 'es-ES,es;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br'
-        })
-
         # Retry strategy para manejar errores transitorios
         retry_strategy = Retry(
             total=5,
@@ -77,9 +91,24 @@ class CCBArbitrajeScraper:
             allowed_methods=["HEAD", "GET", "OPTIONS"],
             backoff_factor=1
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+
+        # Sesión sobre el pool compartido, con una conexión por worker más la de navegación
+        self.http = HTTPClient(
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'application/json, text/html, */*',
+                'Accept-Language': 'es-ES,es;q=0.9',
+                'Accept-Encoding': 'gzip, deflate, br'
+            },
+            pool_size=max_workers + 1,
+            max_retries=retry_strategy
+        )
+        self.session = self.http.session
+        self.blob_store = get_blob_store()
+        self.http_cache = get_http_cache()
+
+        # Modo sincronización (solo navegación por fecha): marca de agua mensual
+        self.watermark = None
 
         # Archivo de progreso en el directorio de logs
         self.progress_file = self.log_dir / "progress.json"
@@ -178,6 +207,27 @@ class CCBArbitrajeScraper:
 
         return {'demandante': '', 'demandado': ''}
 
+    def _browse_ttl(self, browse_type: str, starts_with: str = None) -> Optional[float]:
+        """Vigencia en caché de una página de /browse según el periodo filtrado"""
+        if browse_type != 'dateissued':
+            return None
+        if not starts_with:
+            return RECENT_TTL
+
+        # "2024", "2023-04" o "2023-04-15": tomar el último día del periodo
+        parts = [int(p) for p in re.findall(r'\d+', starts_with)[:3]]
+        try:
+            if len(parts) == 1:
+                period_end = date(parts[0], 12, 31)
+            elif len(parts) == 2:
+                period_end = date(parts[0], parts[1], calendar.monthrange(parts[0], parts[1])[1])
+            else:
+                period_end = date(*parts)
+        except (ValueError, TypeError):
+            return RECENT_TTL
+
+        return period_ttl(period_end)
+
     def get_page_items(self, page: int = 1, rpp: int = 20, starts_with: str = None,
                        browse_type: str = 'dateissued', author_value: str = None,
                        subject_value: str = None, title_value: str = None) -> Tuple[List[str], int]:
@@ -231,7 +281,11 @@ class CCBArbitrajeScraper:
 
         try:
             self.logger.debug(f"Solicitando página {page} con rpp={rpp}, tipo={browse_type}")
-            response = self.session.get(url, params=params, timeout=timeout_seconds)
+            response = self.http_cache.get(self.session, url, params=params,
+                                           ttl=self._browse_ttl(browse_type, starts_with),
+                                           timeout=timeout_seconds)
+            if self.watermark:
+                self.watermark.record_request()
             response.raise_for_status()
 
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -426,56 +480,108 @@ class CCBArbitrajeScraper:
             self.logger.error(f"Error obteniendo bitstreams del item {item_id}: {str(e)}")
             return []
 
+    def _prepare_pdf(self, bitstream_info: Dict, item_metadata: Dict) -> Tuple[str, Path, str, bool]:
+        """Nombre, ruta y clave en el almacén del PDF; el último valor indica si ya está en disco"""
+        # Crear nombre de archivo seguro
+        safe_name = re.sub(r'[<>:"/\\|?*]', '_', item_metadata['name'])[:200]
+        fecha = item_metadata.get('fecha', 'sin_fecha')
+        filename = f"{fecha}_{safe_name}.pdf"
+        filepath = self.pdf_dir / filename
+        blob_key = f"ccb:{bitstream_info['id']}"
+
+        # Si ya existe, no descargar de nuevo
+        if filepath.exists():
+            self.logger.info(f"Archivo ya existe: {filename}")
+            return filename, filepath, blob_key, True
+
+        # Bitstream ya descargado en otra ejecución: enlazar desde el almacén
+        entry = self.blob_store.lookup(blob_key)
+        if entry:
+            self.blob_store.restore(entry, filepath)
+            self.logger.info(f"Ya en el almacén: {filename}")
+            return filename, filepath, blob_key, True
+
+        return filename, filepath, blob_key, False
+
     def download_pdf(self, bitstream_info: Dict, item_metadata: Dict) -> bool:
         """Descarga un archivo PDF"""
         try:
-            # Crear nombre de archivo seguro
-            safe_name = re.sub(r'[<>:"/\\|?*]', '_', item_metadata['name'])[:200]
-            fecha = item_metadata.get('fecha', 'sin_fecha')
-            filename = f"{fecha}_{safe_name}.pdf"
-            filepath = self.pdf_dir / filename
-
-            # Si ya existe, no descargar de nuevo
-            if filepath.exists():
-                self.logger.info(f"Archivo ya existe: {filename}")
+            filename, filepath, blob_key, ready = self._prepare_pdf(bitstream_info, item_metadata)
+            if ready:
                 return True
 
             # Descargar archivo con manejo de redirecciones
-            response = self.session.get(
+            with self.session.get(
                 bitstream_info['download_url'],
                 stream=True,
                 timeout=60,
                 allow_redirects=True
-            )
-            response.raise_for_status()
-
-            # Verificar que sea un PDF
-            content_type = response.headers.get('Content-Type', '')
-            if 'pdf' not in content_type.lower() and not response.content[:4] == b'%PDF':
-                self.logger.warning(f"El archivo no parece ser un PDF: {content_type}")
-                if not filename.lower().endswith('.pdf'):
-                    return False
+            ) as response:
+                response.raise_for_status()
 
-            # Guardar archivo
-            total_size = int(response.headers.get('Content-Length', 0))
-            downloaded = 0
+                # Verificar que sea un PDF: el Content-Type solo avisa, decide la cabecera %PDF
+                content_type = response.headers.get('Content-Type', '')
+                if 'pdf' not in content_type.lower():
+                    self.logger.warning(f"El archivo no parece ser un PDF: {content_type}")
 
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
+                # Guardar archivo en streaming dentro del almacén deduplicado
+                downloaded = stream_response_to_file(response, filepath, expected_header=PDF_HEADER,
+                                                     min_size=len(PDF_HEADER),
+                                                     blob_store=self.blob_store, key=blob_key)
 
             size_mb = downloaded / 1024 / 1024
             self.logger.info(f"Descargado: {filename} ({size_mb:.2f} MB)")
             return True
 
+        except InvalidFileError:
+            self.logger.error(f"El bitstream {bitstream_info['id']} no es un PDF válido")
+            return False
         except Exception as e:
             self.logger.error(f"Error descargando PDF {bitstream_info['id']}: {str(e)}")
             return False
 
-    def process_item(self, item_id: str) -> bool:
-        """Procesa un item completo: metadatos y descarga"""
+    async def download_pdf_async(self, bitstream_info: Dict, item_metadata: Dict) -> bool:
+        """Versión de `download_pdf` para el motor asyncio (el disco, en el executor del loop)"""
+        loop = asyncio.get_running_loop()
+        try:
+            filename, filepath, blob_key, ready = await loop.run_in_executor(
+                None, self._prepare_pdf, bitstream_info, item_metadata
+            )
+            if ready:
+                return True
+
+            downloaded = await self.async_engine.fetch_to_file(
+                bitstream_info['download_url'], filepath, expected_header=PDF_HEADER,
+                min_size=len(PDF_HEADER), blob_store=self.blob_store, key=blob_key
+            )
+            self.logger.info(f"Descargado: {filename} ({downloaded / 1024 / 1024:.2f} MB)")
+            return True
+
+        except InvalidFileError:
+            self.logger.error(f"El bitstream {bitstream_info['id']} no es un PDF válido")
+            return False
+        except Exception as e:
+            self.logger.error(f"Error descargando PDF {bitstream_info['id']}: {str(e) or type(e).__name__}")
+            return False
+
+    async def _download_item_async(self, item_id: str, metadata: Dict, candidates: List[Dict]) -> bool:
+        """Transferir el primer PDF que se pueda del item y cerrar su progreso"""
+        pdf_downloaded = False
+        for bitstream in candidates:
+            if await self.download_pdf_async(bitstream, metadata):
+                pdf_downloaded = True
+                break
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._finish_item, item_id, metadata, pdf_downloaded)
+
+    def process_item(self, item_id: str) -> Union[bool, Future]:
+        """
+        Procesa un item completo: metadatos y descarga
+
+        Con el motor asyncio devuelve el Future de la transferencia en cuanto
+        la envía, para que el worker pase al siguiente item.
+        """
         # Verificar si ya fue procesado
         if item_id in self.progress['downloaded']:
             self.logger.debug(f"Item ya procesado: {item_id}")
@@ -492,38 +598,26 @@ class CCBArbitrajeScraper:
                     self.progress['failed'].append(item_id)
                 return False
 
-            # Descargar PDFs
-            pdf_downloaded = False
-            for bitstream in metadata['bitstreams']:
-                is_pdf = (
-                        bitstream.get('mimeType', '').lower() == 'application/pdf' or
-                        bitstream.get('name', '').lower().endswith('.pdf')
-                )
-
-                if is_pdf:
-                    if self.download_pdf(bitstream, metadata):
-                        pdf_downloaded = True
-                        break
-
-            # Guardar metadatos
-            self.save_metadata(metadata)
+            if self.watermark:
+                self.watermark.observe(item_id, iso_date(metadata.get('fecha')))
 
-            # Actualizar progreso
-            if pdf_downloaded:
-                if item_id not in self.progress['downloaded']:
-                    self.progress['downloaded'].append(item_id)
-                if item_id in self.progress['failed']:
-                    self.progress['failed'].remove(item_id)
-            else:
-                if item_id not in self.progress['failed']:
-                    self.progress['failed'].append(item_id)
+            candidates = [
+                bitstream for bitstream in metadata['bitstreams']
+                if bitstream.get('mimeType', '').lower() == 'application/pdf' or
+                bitstream.get('name', '').lower().endswith('.pdf')
+            ]
 
-            self.save_progress()
+            if self.async_engine:
+                return self.async_engine.submit(self._download_item_async, item_id, metadata, candidates)
 
-            # Pequeña pausa para no sobrecargar el servidor
-            time.sleep(0.5)
+            # Descargar PDFs
+            pdf_downloaded = False
+            for bitstream in candidates:
+                if self.download_pdf(bitstream, metadata):
+                    pdf_downloaded = True
+                    break
 
-            return pdf_downloaded
+            return self._finish_item(item_id, metadata, pdf_downloaded)
 
         except Exception as e:
             self.logger.error(f"Error procesando item {item_id}: {str(e)}")
@@ -531,6 +625,25 @@ class CCBArbitrajeScraper:
                 self.progress['failed'].append(item_id)
             return False
 
+    def _finish_item(self, item_id: str, metadata: Dict, pdf_downloaded: bool) -> bool:
+        """Guardar metadatos y progreso de un item ya descargado (o fallido)"""
+        # Guardar metadatos
+        self.save_metadata(metadata)
+
+        # Actualizar progreso
+        if pdf_downloaded:
+            if item_id not in self.progress['downloaded']:
+                self.progress['downloaded'].append(item_id)
+            if item_id in self.progress['failed']:
+                self.progress['failed'].remove(item_id)
+        else:
+            if item_id not in self.progress['failed']:
+                self.progress['failed'].append(item_id)
+
+        self.save_progress()
+
+        return pdf_downloaded
+
     def save_metadata(self, metadata: Dict):
         """Guarda metadatos en CSV"""
         file_exists = self.metadata_file.exists()
@@ -552,7 +665,7 @@ class CCBArbitrajeScraper:
 
     def run(self, limit: int = None, rpp: int = 20, date_filter: str = None,
             browse_type: str = 'dateissued', author_filter: str = None,
-            subject_filter: str = None, title_filter: str = None):
+            subject_filter: str = None, title_filter: str = None, sync: bool = False):
         """
         Ejecuta el scraper completo
 
@@ -564,6 +677,8 @@ class CCBArbitrajeScraper:
             author_filter: Nombre del autor para búsqueda por autor
             subject_filter: Nombre de la materia para búsqueda por materia
             title_filter: Título para búsqueda por título
+            sync: Solo en búsqueda por fecha: empezar el listado en el mes de la
+                marca de agua y omitir los items de ese mes ya procesados
         """
         self.logger.info("=== INICIANDO SCRAPER CCB ARBITRAJE NACIONAL ===")
         self.logger.info(f"Items ya descargados: {len(self.progress['downloaded'])}")
@@ -582,6 +697,16 @@ class CCBArbitrajeScraper:
             self.logger.info(f"BÚSQUEDA POR TÍTULO: {title_filter}")
 
         self.logger.info(f"Resultados por página: {rpp}")
+        if sync and browse_type == 'dateissued':
+            # El listado por fecha es ascendente: lo nuevo está a partir de la marca
+            self.watermark = Watermark('biblioteca_ccb', {'scope': self.scope}, period='month')
+            self.watermark.record_page_size(rpp)
+            desde = self.watermark.narrow(iso_date(date_filter))
+            if self.watermark.narrowed:
+                date_filter = desde
+                self.logger.info(f"SINCRONIZACIÓN: listado desde el mes de la marca {desde}")
+        elif sync:
+            self.logger.warning("La sincronización solo aplica a la búsqueda por fecha; se recorre todo")
 
         # Actualizar manifiesto
         self.update_manifest('en_proceso', {
@@ -598,6 +723,7 @@ class CCBArbitrajeScraper:
         seen_ids = set()
         page = 1
         total_items = 0
+        truncated = False  # El límite cortó el listado: la marca no puede avanzar
 
         while True:
             self.logger.info(f"Obteniendo página {page}")
@@ -640,6 +766,7 @@ class CCBArbitrajeScraper:
                     all_item_ids.append(item_id)
 
             if limit and len(all_item_ids) >= limit:
+                truncated = len(all_item_ids) > limit or len(item_ids) == rpp
                 all_item_ids = all_item_ids[:limit]
                 self.logger.info(f"Límite alcanzado: {len(all_item_ids)} items")
                 break
@@ -651,56 +778,79 @@ class CCBArbitrajeScraper:
                 break
 
             page += 1
-            time.sleep(1)
 
         self.logger.info(f"Total de items únicos encontrados: {len(all_item_ids)}")
 
-        # Filtrar items ya procesados exitosamente
+        # Filtrar items ya procesados exitosamente (y, al sincronizar, los del mes de la marca)
         items_to_process = [
             item_id for item_id in all_item_ids
-            if item_id not in self.progress['downloaded']
+            if item_id not in self.progress['downloaded'] and
+            not (self.watermark and self.watermark.is_known(item_id))
         ]
 
         if limit and len(items_to_process) > limit:
             items_to_process = items_to_process[:limit]
+            truncated = True
 
         self.logger.info(f"Items por procesar: {len(items_to_process)}")
 
         if not items_to_process:
             self.logger.info("No hay nuevos items para procesar")
+            self._save_watermark(truncated)
             self.update_manifest('completado', {
                 'fecha_fin': datetime.now().isoformat(),
                 'resumen': self.get_summary()
             })
             return
 
-        # Procesar items en paralelo
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {
-                executor.submit(self.process_item, item_id): item_id
-                for item_id in items_to_process
-            }
+        if self.download_engine == 'asyncio':
+            self.async_engine = AsyncDownloadEngine(headers=self.http.headers,
+                                                    max_concurrency=self.download_concurrency,
+                                                    per_host_limit=self.download_concurrency,
+                                                    rate_limiter=self.http.rate_limiter)
+            self.async_engine.start()
+            self.logger.info(f"Motor asyncio: {self.download_concurrency} descargas simultáneas")
 
-            completed = 0
-            for future in as_completed(futures):
-                completed += 1
-                item_id = futures[future]
+        # Procesar items en paralelo; con asyncio las transferencias se suman a
+        # la espera según los workers de metadatos las van enviando
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = {
+                    executor.submit(self.process_item, item_id): item_id
+                    for item_id in items_to_process
+                }
 
-                try:
-                    success = future.result()
-                    status = "[OK]" if success else "[FAIL]"
-                    self.logger.info(
-                        f"[{completed}/{len(items_to_process)}] {status} Procesado: {item_id}"
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error en thread para {item_id}: {str(e)}")
+                completed = 0
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item_id = pending.pop(future)
 
-                # Guardar progreso cada 10 items
-                if completed % 10 == 0:
-                    self.save_progress()
+                        try:
+                            success = future.result()
+                            if isinstance(success, Future):
+                                pending[success] = item_id
+                                continue
+                            completed += 1
+                            status = "[OK]" if success else "[FAIL]"
+                            self.logger.info(
+                                f"[{completed}/{len(items_to_process)}] {status} Procesado: {item_id}"
+                            )
+                        except Exception as e:
+                            completed += 1
+                            self.logger.error(f"Error en thread para {item_id}: {str(e)}")
+
+                        # Guardar progreso cada 10 items
+                        if completed % 10 == 0:
+                            self.save_progress()
+        finally:
+            if self.async_engine:
+                self.async_engine.close()
+                self.async_engine = None
 
         # Guardar progreso final
         self.save_progress()
+        self._save_watermark(truncated)
 
         # Actualizar manifiesto final
         resumen = self.get_summary()
@@ -726,6 +876,22 @@ class CCBArbitrajeScraper:
             if len(self.progress['failed']) > 10:
                 self.logger.info(f"  ... y {len(self.progress['failed']) - 10} más")
 
+    def _save_watermark(self, truncated: bool):
+        """Avanzar la marca de agua si se recorrió el listado completo"""
+        if not self.watermark:
+            return
+        if truncated:
+            self.logger.info("Ejecución con límite: la marca de sincronización no avanza")
+            return
+        self.watermark.save()
+        self.logger.info(f"Marca de sincronización guardada: {self.watermark.new_mark}")
+
+    def get_sync_stats(self) -> Optional[Dict]:
+        """Peticiones ahorradas por la sincronización (None si no se usó)"""
+        if not self.watermark:
+            return None
+        return self.watermark.get_stats(per_document=REQUESTS_PER_ITEM)
+
     def get_summary(self):
         """Obtiene resumen del proceso"""
         return {
@@ -748,6 +914,12 @@ class CCBArbitrajeScraper:
                 'valor': getattr(self, 'date_filter', getattr(self, 'author_filter', None))
             },
             'resumen': self.get_summary(),
+            'motor_descargas': self.download_engine,
+            'conexiones_http': self.http.get_pool_stats(),
+            'limites_por_dominio': self.http.get_rate_stats(),
+            'deduplicacion': self.blob_store.get_stats(),
+            'cache_http': self.http_cache.get_stats(),
+            'sincronizacion': self.get_sync_stats(),
             'archivos_generados': {
                 'metadata_csv': str(self.metadata_file),
                 'progress_json': str(self.progress_file),
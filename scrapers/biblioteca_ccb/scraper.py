@@ -51,7 +51,8 @@ class BibliotecaCCBScraper:
 
     def run(self, date_filter: str = None, limit: int = None,
             browse_type: str = 'dateissued', author_filter: str = None,
-            subject_filter: str = None, title_filter: str = None) -> Dict:
+            subject_filter: str = None, title_filter: str = None, sync: bool = False,
+            download_engine: str = 'threads') -> Dict:
         """
         Ejecuta el scraper con filtros específicos
 
@@ -62,6 +63,8 @@ class BibliotecaCCBScraper:
             author_filter: Nombre del autor para búsqueda por autor
             subject_filter: Nombre de la materia para búsqueda por materia
             title_filter: Título para búsqueda por título
+            sync: Búsqueda por fecha incremental desde la marca de agua
+            download_engine: 'threads' o 'asyncio' para la transferencia de los PDFs
         Returns:
             Dict con estadísticas de la ejecución
         """
@@ -108,7 +111,8 @@ class BibliotecaCCBScraper:
                 output_dir=str(self.output_dir),
                 log_dir=str(self.log_dir),
                 timestamp=self.timestamp,
-                max_workers=5
+                max_workers=5,
+                download_engine=download_engine
             )
 
             # Guardar información del filtro para el reporte
@@ -146,7 +150,8 @@ class BibliotecaCCBScraper:
                 self.scraper.run(
                     limit=limit,
                     rpp=40,
-                    date_filter=date_filter
+                    date_filter=date_filter,
+                    sync=sync
                 )
 
             # Actualizar estadísticas desde el progreso del scraper
@@ -199,7 +204,8 @@ class BibliotecaCCBScraper:
             'end_time': self.stats['end_time'].isoformat(),
             'output_dir': str(self.output_dir),
             'log_dir': str(self.log_dir),
-            'timestamp': self.timestamp
+            'timestamp': self.timestamp,
+            'sync': self.scraper.get_sync_stats() if self.scraper else None
         }
 
     def get_progress(self) -> Dict:
@@ -1,19 +1,51 @@
 # scrapers/consejo_estado/scraper.py
+import os
 import time
 import json
-import csv
 from datetime import datetime
 from pathlib import Path
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
 import re
 import urllib.parse
-import requests
 from bs4 import BeautifulSoup
+from common.blob_store import get_blob_store
+from common.bounded_executor import BoundedExecutor
+from common.http_cache import RECENT_TTL, get_http_cache, period_ttl
+from common.http_client import HTTPClient
+from common.periodic_flusher import PeriodicFlusher
+from common.results_writer import IncrementalResultsWriter
+from common.stream_writer import InvalidFileError, download_resumable
+from common.watermark import Watermark, iso_date
 from .data_extractor import SAMAIDataExtractor
 
+# Columnas del CSV de resultados
+CSV_FIELDS = [
+    'pagina', 'indice_en_pagina', 'numero_proceso', 'interno',
+    'fecha_proceso', 'fecha_providencia', 'clase_proceso',
+    'tipo_providencia', 'titular', 'sala_decision', 'actor',
+    'demandado', 'estado_descarga', 'nombre_archivo',
+    'tamaño_archivo', 'error', 'token'
+]
+
+# Una misma providencia puede aparecer en varias posiciones del listado
+RESULT_KEY = ('token', 'pagina', 'indice_en_pagina')
+
+# El manifiesto (que incluye todos los resultados) se reescribe como mucho
+# cada MANIFEST_INTERVAL segundos o cada MANIFEST_BATCH registros
+MANIFEST_INTERVAL = 5.0
+MANIFEST_BATCH = 100
+
+# Páginas de listado pedidas en paralelo una vez conocido el total; el
+# limitador por dominio del HTTPClient sigue marcando el ritmo real
+PAGE_WORKERS = 3
+
+# Páginas que se pueden adelantar a la que se está ensamblando
+PAGE_WINDOW = 8
+
 
 class ConsejoEstadoScraper:
     BASE_URL = "https://samai.consejodeestado.gov.co"
@@ -31,19 +63,38 @@ class ConsejoEstadoScraper:
         self.setup_directories()
         self.setup_logging()
 
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Pool compartido; los workers usan sesiones propias para no mezclar
+        # las cookies ASP.NET de cada providencia
+        self.http = HTTPClient(headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept-Language': 'es-ES,es;q=0.9',
             'Accept-Encoding': 'gzip, deflate, br, zstd',
         })
+        self.session = self.http.session
+        self.blob_store = get_blob_store()
+        self.http_cache = get_http_cache()
 
         self.all_results: List[Dict] = []
+        # (token, pagina, indice_en_pagina) -> registro de all_results
+        self.results_index: Dict[Tuple, Dict] = {}
         self.lock = threading.Lock()
         self.start_time = None
         self.total_esperados = 0
         self.data_extractor = SAMAIDataExtractor()
 
+        # Modo sincronización: marca de agua por sala (ver `search_and_download`)
+        self.watermark: Optional[Watermark] = None
+
+        # Filas añadidas al CSV/JSONL por registro; el manifiesto completo en segundo plano
+        self.results_writer = IncrementalResultsWriter(self.log_dir, self.csv_path.name, CSV_FIELDS,
+                                                       key=RESULT_KEY)
+        self.manifest_flusher = PeriodicFlusher(self.save_manifest, interval=MANIFEST_INTERVAL,
+                                                max_pending=MANIFEST_BATCH, name='consejo-manifiesto')
+
+        # Estadísticas del listado y de la cola de descargas para el reporte
+        self.listing_stats: Optional[Dict[str, any]] = None
+        self.download_queue_stats: Optional[Dict[str, any]] = None
+
     def setup_directories(self):
         self.log_dir.mkdir(parents=True, exist_ok=True)
         self.pdf_dir.mkdir(exist_ok=True)
@@ -71,55 +122,42 @@ class ConsejoEstadoScraper:
         self.logger = logging.getLogger(__name__)
 
     def save_manifest(self):
-        """Guardar manifiesto JSON actualizado"""
-        with self.lock:
-            try:
-                manifest_data = {
-                    'timestamp': self.timestamp,
-                    'total_esperados': self.total_esperados,
-                    'total_procesados': len(self.all_results),
-                    'estado': 'en_proceso',
-                    'resultados': self.all_results
-                }
-                with open(self.manifest_path, 'w', encoding='utf-8') as f:
-                    json.dump(manifest_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                self.logger.error(f"Error guardando manifiesto: {e}")
+        """Guardar manifiesto JSON actualizado (lo llama el guardado diferido)"""
+        try:
+            # Copia bajo el lock; la serialización y la escritura, fuera
+            with self.lock:
+                resultados = [dict(r) for r in self.all_results]
+            manifest_data = {
+                'timestamp': self.timestamp,
+                'total_esperados': self.total_esperados,
+                'total_procesados': len(resultados),
+                'estado': 'en_proceso',
+                'resultados': resultados
+            }
+            tmp = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest_data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.manifest_path)
+        except Exception as e:
+            self.logger.error(f"Error guardando manifiesto: {e}")
 
     def save_csv(self):
-        """Guardar resultados en formato CSV"""
-        with self.lock:
-            try:
-                with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
-                    if not self.all_results:
-                        return
-
-                    # Definir campos del CSV
-                    fieldnames = [
-                        'pagina', 'indice_en_pagina', 'numero_proceso', 'interno',
-                        'fecha_proceso', 'fecha_providencia', 'clase_proceso',
-                        'tipo_providencia', 'titular', 'sala_decision', 'actor',
-                        'demandado', 'estado_descarga', 'nombre_archivo',
-                        'tamaño_archivo', 'error', 'token'
-                    ]
-
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-
-                    for result in self.all_results:
-                        # Crear fila con solo los campos definidos
-                        row = {field: result.get(field, '') for field in fieldnames}
-                        writer.writerow(row)
-
-                self.logger.info(f"CSV guardado: {self.csv_path}")
-            except Exception as e:
-                self.logger.error(f"Error guardando CSV: {e}")
+        """Reescribir el CSV una sola vez con el estado final de cada registro"""
+        try:
+            with self.lock:
+                resultados = list(self.all_results)
+            self.results_writer.finalize(resultados)
+            self.logger.info(f"CSV guardado: {self.csv_path}")
+        except Exception as e:
+            self.logger.error(f"Error guardando CSV: {e}")
 
     def obtener_total_resultados(self, sala_decision: str, fecha_desde: str, fecha_hasta: str) -> int:
         """Obtener el total de resultados esperados para los filtros dados"""
         try:
             url = self.construir_url_busqueda(sala_decision, fecha_desde, fecha_hasta, 0)
-            response = self.session.get(url, timeout=30)
+            response = self.http_cache.get(self.session, url, ttl=self.ttl_busqueda(fecha_hasta), timeout=30)
+            if self.watermark:
+                self.watermark.record_request()
             response.raise_for_status()
 
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -141,6 +179,13 @@ class ConsejoEstadoScraper:
             self.logger.error(f"Error obteniendo total de resultados: {e}")
             return 0
 
+    def ttl_busqueda(self, fecha_hasta: str) -> float:
+        """Vigencia en caché de las páginas de búsqueda según la fecha final del rango"""
+        try:
+            return period_ttl(datetime.strptime(fecha_hasta, '%d/%m/%Y'))
+        except (TypeError, ValueError):
+            return RECENT_TTL
+
     def construir_filtro_odata(self, sala_decision: str, fecha_desde: str, fecha_hasta: str) -> str:
         try:
             fecha_desde_obj = datetime.strptime(fecha_desde, '%d/%m/%Y')
@@ -183,7 +228,7 @@ class ConsejoEstadoScraper:
             'Upgrade-Insecure-Requests': '1',
         }
         try:
-            response = self.session.get(url, headers=headers, timeout=30)
+            response = self.http.thread_session().get(url, headers=headers, timeout=30)
             response.raise_for_status()
             return response.text
         except Exception as e:
@@ -222,7 +267,7 @@ class ConsejoEstadoScraper:
 
         try:
             url = f"{self.VER_PROVIDENCIA_URL}?tokenDocumento={token}"
-            response = self.session.post(url, data=post_data, headers=headers, timeout=30)
+            response = self.http.thread_session().post(url, data=post_data, headers=headers, timeout=30)
             response.raise_for_status()
 
             match = re.search(
@@ -237,7 +282,8 @@ class ConsejoEstadoScraper:
             self.logger.error(f"Error obteniendo URL de descarga ZIP para token {token}: {e}")
             return None
 
-    def descargar_zip(self, url_descarga: str, numero_proceso: str) -> Tuple[Optional[str], int]:
+    def descargar_zip(self, url_descarga: str, numero_proceso: str,
+                      blob_key: Optional[str] = None) -> Tuple[Optional[str], int]:
         try:
             headers = {
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -246,25 +292,18 @@ class ConsejoEstadoScraper:
                 'Sec-Fetch-User': '?1',
                 'Upgrade-Insecure-Requests': '1'
             }
-            response = self.session.get(url_descarga, headers=headers, timeout=60, stream=True)
-            response.raise_for_status()
-
             if numero_proceso and numero_proceso.strip():
                 filename = f"{numero_proceso.replace('/', '_')}.zip"
             else:
                 filename = f"documento_{int(time.time())}.zip"
 
+            # Un corte a mitad del ZIP se reanuda con Range en lugar de empezar de cero
             filepath = self.pdf_dir / filename
-            total_size = 0
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
-
-            if total_size == 0:
-                if filepath.exists():
-                    filepath.unlink()
+            try:
+                total_size = download_resumable(self.http.thread_session(), url_descarga, filepath,
+                                                headers=headers, timeout=60, expected_header=None,
+                                                min_size=1, blob_store=self.blob_store, key=blob_key)
+            except InvalidFileError:
                 self.logger.error(f"ZIP descargado está vacío para proceso {numero_proceso}")
                 return None, 0
 
@@ -285,6 +324,16 @@ class ConsejoEstadoScraper:
         self.logger.info(f"[Worker {threading.get_ident()}] Procesando {numero_proceso}")
         doc['worker'] = threading.get_ident()
 
+        # Documento ya descargado por otra búsqueda: enlazar sin pedir la providencia
+        blob_key = f"consejo:{token}"
+        entry = self.blob_store.lookup(blob_key)
+        if entry:
+            doc['estado_descarga'] = 'descargado'
+            doc['nombre_archivo'] = entry['archivo']
+            doc['tamaño_archivo'] = self.blob_store.restore(entry, self.pdf_dir / entry['archivo'])
+            self._register_result(doc)
+            return doc
+
         html_providencia = self.obtener_pagina_providencia(token)
         if not html_providencia:
             doc['estado_descarga'] = 'error'
@@ -300,7 +349,7 @@ class ConsejoEstadoScraper:
             return doc
 
         doc['ruta_zip'] = url_zip
-        nombre, tamaño = self.descargar_zip(url_zip, numero_proceso)
+        nombre, tamaño = self.descargar_zip(url_zip, numero_proceso, blob_key)
         if nombre:
             doc['estado_descarga'] = 'descargado'
             doc['nombre_archivo'] = nombre
@@ -314,24 +363,30 @@ class ConsejoEstadoScraper:
 
     def _register_result(self, doc: Dict):
         with self.lock:
-            # Evitar duplicados por token+indice
-            existing = next((r for r in self.all_results if
-                             r.get('token') == doc.get('token') and
-                             r.get('indice_en_pagina') == doc.get('indice_en_pagina') and
-                             r.get('pagina') == doc.get('pagina')), None)
-            if existing:
+            # Evitar duplicados por token+pagina+indice
+            key = tuple(doc.get(field) for field in RESULT_KEY)
+            existing = self.results_index.get(key)
+            if existing is not None:
                 existing.update(doc)
             else:
+                self.results_index[key] = doc
                 self.all_results.append(doc)
 
-        # Guardar manifiesto y CSV actualizados
-        self.save_manifest()
-        self.save_csv()
+        # Una fila nueva en el CSV (o versión nueva en el JSONL); el manifiesto, diferido
+        if existing is not None:
+            self.results_writer.update(existing)
+        else:
+            self.results_writer.append_page([doc])
+        self.manifest_flusher.notify()
 
         self.logger.info(f"Registro actualizado: {doc.get('numero_proceso')} - Estado: {doc.get('estado_descarga')}")
 
     def generar_reporte_final(self):
         """Generar reporte final con estadísticas"""
+        # Guardados pendientes y CSV final antes del manifiesto definitivo
+        self.manifest_flusher.close()
+        self.save_csv()
+
         try:
             duracion = (datetime.now() - datetime.fromisoformat(
                 self.start_time)).total_seconds() if self.start_time else 0
@@ -365,9 +420,20 @@ class ConsejoEstadoScraper:
                     'errores': errores,
                     'omitidos': omitidos
                 },
+                'conexiones_http': self.http.get_pool_stats(),
+                'limites_por_dominio': self.http.get_rate_stats(),
+                'deduplicacion': self.blob_store.get_stats(),
+                'cache_http': self.http_cache.get_stats(),
+                'persistencia_manifiesto': self.manifest_flusher.get_stats(),
+                'paginacion_busqueda': self.listing_stats,
+                'cola_descargas': self.download_queue_stats,
+                # Consulta del total y página final vacía; las descargas ya las ahorra el almacén
+                'sincronizacion': self.watermark.get_stats(fixed_requests=2)
+                if self.watermark else None,
                 'archivos_generados': {
                     'log': str(self.log_dir / 'consejo_estado_scraping.log'),
                     'csv': str(self.csv_path),
+                    'jsonl': str(self.results_writer.jsonl_path),
                     'manifest': str(self.manifest_path)
                 }
             }
@@ -396,9 +462,94 @@ class ConsejoEstadoScraper:
             self.logger.error(f"Error generando reporte final: {e}")
             return None
 
+    def obtener_pagina(self, sala: str, fecha_desde: str, fecha_hasta: str, pagina: int) -> List[Dict]:
+        """Descargar una página del listado (desde 0) con pagina/indice_en_pagina en cada documento"""
+        url_busqueda = self.construir_url_busqueda(sala, fecha_desde, fecha_hasta, pagina)
+        self.logger.info(f"Obteniendo página {pagina + 1}")
+
+        response = self.http_cache.get(self.http.thread_session(), url_busqueda,
+                                       ttl=self.ttl_busqueda(fecha_hasta), timeout=30)
+        if self.watermark:
+            self.watermark.record_request()
+        response.raise_for_status()
+
+        documentos = self.data_extractor.extraer_documentos_con_tokens(response.text)
+        for idx, doc in enumerate(documentos):
+            doc['pagina'] = pagina + 1
+            doc['indice_en_pagina'] = idx + 1
+        return documentos
+
+    def iterar_paginas(self, sala: str, fecha_desde: str,
+                       fecha_hasta: str) -> Iterator[Tuple[int, Optional[List[Dict]]]]:
+        """
+        Páginas del listado en orden, como (pagina, documentos)
+
+        La primera se pide sola para conocer el tamaño de página; con
+        `total_esperados` se sabe cuántas hay y las siguientes se piden con
+        PAGE_WORKERS hilos, como mucho PAGE_WINDOW por delante de la que se
+        entrega. Pasadas las páginas previstas se sigue en secuencia hasta una
+        vacía, por si el total cambió durante el recorrido. Una página con
+        error se entrega con documentos None y termina el recorrido; cerrar el
+        generador cancela las páginas aún no pedidas.
+        """
+        stats = {
+            'paginas_previstas': 0,
+            'paginas_en_paralelo': 0,
+            'paginas_secuenciales': 0,
+            'workers': PAGE_WORKERS,
+            'ventana': PAGE_WINDOW,
+            'espera_listado_segundos': 0.0,
+            'tiempo_listado_segundos': 0.0
+        }
+        self.listing_stats = stats
+        inicio = time.monotonic()
+
+        executor = None
+        futures = {}
+        total_paginas = 0
+        siguiente = 1
+        pagina = 0
+        try:
+            while True:
+                espera = time.monotonic()
+                try:
+                    if pagina in futures:
+                        documentos = futures.pop(pagina).result()
+                        stats['paginas_en_paralelo'] += 1
+                    else:
+                        documentos = self.obtener_pagina(sala, fecha_desde, fecha_hasta, pagina)
+                        stats['paginas_secuenciales'] += 1
+                except Exception as e:
+                    self.logger.error(f"Error obteniendo página {pagina + 1}: {e}")
+                    yield pagina, None
+                    return
+                finally:
+                    stats['espera_listado_segundos'] += time.monotonic() - espera
+
+                if pagina == 0 and documentos and self.total_esperados > len(documentos):
+                    total_paginas = math.ceil(self.total_esperados / len(documentos))
+                    stats['paginas_previstas'] = total_paginas
+                    executor = ThreadPoolExecutor(max_workers=PAGE_WORKERS, thread_name_prefix='consejo-listado')
+
+                # Dejar pedidas las siguientes antes de entregar esta página
+                while executor and siguiente < min(total_paginas, pagina + 1 + PAGE_WINDOW):
+                    futures[siguiente] = executor.submit(self.obtener_pagina, sala, fecha_desde,
+                                                         fecha_hasta, siguiente)
+                    siguiente += 1
+
+                yield pagina, documentos
+                if not documentos:
+                    return
+                pagina += 1
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            stats['espera_listado_segundos'] = round(stats['espera_listado_segundos'], 2)
+            stats['tiempo_listado_segundos'] = round(time.monotonic() - inicio, 2)
+
     def search_and_download(self, filters: dict, download_pdfs: bool = True,
                             max_results: Optional[int] = None, max_workers: int = 3,
-                            cancel_event: threading.Event = None) -> List[Dict]:
+                            cancel_event: threading.Event = None, sync: bool = False) -> List[Dict]:
         """
         Buscar y descargar documentos del Consejo de Estado
 
@@ -408,6 +559,9 @@ class ConsejoEstadoScraper:
             max_results: Límite de resultados (None = sin límite)
             max_workers: Número de workers paralelos
             cancel_event: Evento para cancelar el proceso
+            sync: Consultar solo desde la marca de agua de la sala (fecha de
+                la providencia más reciente ya sincronizada) y omitir las
+                providencias de esa fecha ya vistas
 
         Returns:
             Lista de resultados procesados
@@ -422,6 +576,8 @@ class ConsejoEstadoScraper:
         self.logger.info(f"Límite de resultados: {max_results if max_results else 'sin límite'}")
         self.logger.info("=" * 60)
 
+        self.http.ensure_pool_size(max_workers + PAGE_WORKERS + 1)
+
         sala = filters.get('sala_decision')
         fecha_desde = filters.get('fecha_desde')
         fecha_hasta = filters.get('fecha_hasta')
@@ -430,6 +586,17 @@ class ConsejoEstadoScraper:
             self.logger.error("Faltan filtros obligatorios")
             return []
 
+        if sync:
+            self.watermark = Watermark('consejo_estado', {'sala_decision': sala})
+            desde = self.watermark.narrow(iso_date(fecha_desde), iso_date(fecha_hasta))
+            if desde is None:
+                self.logger.info(f"Rango ya sincronizado hasta {self.watermark.mark}: nada que consultar")
+                self.generar_reporte_final()
+                return []
+            if desde != iso_date(fecha_desde):
+                fecha_desde = datetime.strptime(desde, '%Y-%m-%d').strftime('%d/%m/%Y')
+                self.logger.info(f"Sincronización: consultando desde la marca {fecha_desde}")
+
         # Obtener total de resultados esperados
         self.total_esperados = self.obtener_total_resultados(sala, fecha_desde, fecha_hasta)
         self.logger.info(f"Total de documentos esperados: {self.total_esperados}")
@@ -441,85 +608,83 @@ class ConsejoEstadoScraper:
 
         # Guardar manifiesto inicial
         self.save_manifest()
+        self.manifest_flusher.start()
 
         resultados_finales = []
         documentos_vistos = set()
-        pagina = 0
         obtenidos = 0
-        todos_documentos = []  # Recolectar todos los documentos primero
-
-        # FASE 1: Recolectar todos los documentos
-        self.logger.info("FASE 1: Recolectando información de documentos...")
-
-        while True:
-            if cancel_event and cancel_event.is_set():
-                self.logger.info("Cancelado por el usuario durante recolección")
-                break
-
-            if max_results and obtenidos >= max_results:
-                self.logger.info("Se alcanzó el límite de resultados solicitado")
-                break
-
-            url_busqueda = self.construir_url_busqueda(sala, fecha_desde, fecha_hasta, pagina)
-            self.logger.info(f"Obteniendo página {pagina + 1}")
+        futures = []
+        recoleccion_completa = False
+
+        # Los documentos de cada página pasan a la cola de descargas en cuanto
+        # la página se ensambla (en orden); la cola acotada frena el listado
+        # si las descargas van más lentas
+        if download_pdfs:
+            self.logger.info(f"Recolectando páginas y descargando con {max_workers} workers...")
+            executor = BoundedExecutor(max_workers, thread_name_prefix='consejo-descarga')
+        else:
+            self.logger.info("Recolectando información de documentos...")
+            executor = None
 
+        paginas = self.iterar_paginas(sala, fecha_desde, fecha_hasta)
+        try:
+            for pagina, documentos in paginas:
+                if cancel_event and cancel_event.is_set():
+                    self.logger.info("Cancelado por el usuario durante recolección")
+                    break
+
+                if documentos is None:
+                    break
+
+                if not documentos:
+                    self.logger.info("No hay más documentos, finalizando recolección")
+                    recoleccion_completa = True
+                    break
+                if self.watermark:
+                    self.watermark.record_page_size(len(documentos))
+
+                nuevos = []
+                for d in documentos:
+                    token = d.get('token')
+                    key = (token, d.get('pagina'), d.get('indice_en_pagina'))
+                    if token and key not in documentos_vistos:
+                        documentos_vistos.add(key)
+                        nuevos.append(d)
+                        # Providencia de la fecha de la marca ya sincronizada
+                        if self.watermark and not self.watermark.accept(token, iso_date(d.get('fecha_providencia'))):
+                            continue
+                        obtenidos += 1
+
+                        if executor:
+                            future = executor.submit(self.procesar_documento, d, cancel_event=cancel_event)
+                            if future is not None:
+                                futures.append(future)
+                        else:
+                            # Si no se descargan PDFs, marcar como omitidos
+                            d['estado_descarga'] = 'omitido'
+                            self._register_result(d)
+                            resultados_finales.append(d)
+
+                        if max_results and obtenidos >= max_results:
+                            break
+
+                if not nuevos:
+                    self.logger.info("Todos los documentos de esta página ya fueron vistos")
+                    recoleccion_completa = True
+                    break
+
+                self.logger.info(f"Página {pagina + 1}: {len(nuevos)} documentos nuevos recolectados")
+
+                if max_results and obtenidos >= max_results:
+                    self.logger.info("Se alcanzó el límite de resultados solicitado")
+                    break
+        finally:
+            paginas.close()
+
+        self.logger.info(f"Recolección completada: {obtenidos} documentos recolectados")
+
+        if executor:
             try:
-                response = self.session.get(url_busqueda, timeout=30)
-                response.raise_for_status()
-            except Exception as e:
-                self.logger.error(f"Error obteniendo página {pagina}: {e}")
-                break
-
-            documentos = self.data_extractor.extraer_documentos_con_tokens(response.text)
-
-            if not documentos:
-                self.logger.info("No hay más documentos, finalizando recolección")
-                break
-
-            # Actualizar página e índice para cada documento
-            for idx, doc in enumerate(documentos):
-                doc['pagina'] = pagina + 1
-                doc['indice_en_pagina'] = idx + 1
-
-            nuevos = []
-            for d in documentos:
-                token = d.get('token')
-                key = (token, d.get('pagina'), d.get('indice_en_pagina'))
-                if token and key not in documentos_vistos:
-                    documentos_vistos.add(key)
-                    nuevos.append(d)
-                    obtenidos += 1
-
-                    if max_results and obtenidos >= max_results:
-                        break
-
-            todos_documentos.extend(nuevos)
-
-            if not nuevos:
-                self.logger.info("Todos los documentos de esta página ya fueron vistos")
-                break
-
-            self.logger.info(f"Página {pagina + 1}: {len(nuevos)} documentos nuevos recolectados")
-
-            pagina += 1
-            time.sleep(0.3)  # Cortesía entre peticiones
-
-        self.logger.info(f"FASE 1 completada: {len(todos_documentos)} documentos recolectados")
-
-        # FASE 2: Procesar descargas en paralelo
-        if download_pdfs and todos_documentos:
-            self.logger.info(f"FASE 2: Descargando {len(todos_documentos)} documentos con {max_workers} workers...")
-
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = []
-
-                for doc in todos_documentos:
-                    if cancel_event and cancel_event.is_set():
-                        break
-
-                    future = executor.submit(self.procesar_documento, doc)
-                    futures.append(future)
-
                 # Procesar resultados conforme se completan
                 for future in as_completed(futures):
                     if cancel_event and cancel_event.is_set():
@@ -531,12 +696,15 @@ class ConsejoEstadoScraper:
                         resultados_finales.append(result)
                     except Exception as e:
                         self.logger.error(f"Error procesando documento: {e}")
-        else:
-            # Si no se descargan PDFs, marcar como omitidos
-            for doc in todos_documentos:
-                doc['estado_descarga'] = 'omitido'
-                self._register_result(doc)
-                resultados_finales.append(doc)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=cancel_event is not None and cancel_event.is_set())
+                self.download_queue_stats = executor.get_stats()
+
+        # La marca solo avanza si se recorrió todo el rango
+        cancelado = cancel_event is not None and cancel_event.is_set()
+        if self.watermark and recoleccion_completa and not cancelado:
+            self.watermark.save()
+            self.logger.info(f"Marca de sincronización guardada: {self.watermark.new_mark}")
 
         # Generar reporte final
         elapsed = (datetime.now() - start_time).total_seconds()
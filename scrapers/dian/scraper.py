@@ -1,7 +1,6 @@
 # scrapers/dian/scraper.py
 # Versión completa del scraper DIAN con tracking de progreso
 
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import os
@@ -12,6 +11,14 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 import threading
+import calendar
+from datetime import date
+
+from common.blob_store import get_blob_store
+from common.http_cache import get_http_cache, period_ttl
+from common.http_client import HTTPClient
+from common.stream_writer import stream_response_to_file
+from common.watermark import Watermark
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +27,14 @@ class DIANScraperImproved:
     """Scraper DIAN completo con tracking de progreso"""
 
     def __init__(self, progress_callback=None):
-        self.session = requests.Session()
         self.base_url = "https://cijuf.org.co/normatividad/conceptos-y-oficios-dian"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        self.session.headers.update(self.headers)
+        self.http = HTTPClient(headers=self.headers)
+        self.session = self.http.session
+        self.blob_store = get_blob_store()
+        self.http_cache = get_http_cache()
         self.processed_urls = set()
 
         # Atributos para tracking de progreso
@@ -42,6 +51,10 @@ class DIANScraperImproved:
         self.lock = threading.Lock()
         self.max_retries = 3  # Número máximo de reintentos
 
+        # Modo sincronización: marca de agua mensual (ver `sync_months`)
+        self.watermark = None
+        self.listing_complete = True
+
     def update_progress(self, **kwargs):
         """Actualizar estadísticas de progreso de forma thread-safe"""
         with self.lock:
@@ -65,12 +78,48 @@ class DIANScraperImproved:
                         stats_copy[key] = value
                 self.progress_callback(stats_copy)
 
+    def sync_months(self, year: int, months: List[int]) -> List[int]:
+        """
+        Meses a recorrer en modo sincronización
+
+        Los meses anteriores al de la marca de agua ya están sincronizados y
+        se omiten; del mes de la marca solo se procesan los documentos cuya
+        URL no se vio antes.
+        """
+        self.watermark = Watermark('dian', {}, period='month')
+        first = self.watermark.narrow(f"{year}-{months[0]:02d}", f"{year}-{months[-1]:02d}")
+        pending = [m for m in months if first is not None and f"{year}-{m:02d}" >= first]
+        if len(pending) < len(months):
+            logger.info(f"Sincronización: {len(months) - len(pending)} meses ya sincronizados "
+                        f"(marca {self.watermark.mark})")
+        return pending
+
+    def save_watermark(self):
+        """Avanzar la marca si todos los listados se leyeron completos"""
+        if not self.watermark:
+            return
+        if not self.listing_complete:
+            logger.info("Listados incompletos: la marca de sincronización no avanza")
+            return
+        self.watermark.save()
+        logger.info(f"Marca de sincronización guardada: {self.watermark.new_mark}")
+
+    def get_sync_stats(self, months: int, download_docs: bool = True) -> Optional[Dict]:
+        """Peticiones ahorradas por la sincronización (None si no se usó)"""
+        if not self.watermark:
+            return None
+        # Cada mes termina con una página vacía; cada documento nuevo cuesta una petición
+        return self.watermark.get_stats(per_document=1 if download_docs else 0, fixed_requests=months)
+
     def scrape_month(self, year: int, month: int, download_docs: bool = True, max_pages: int = 10) -> List[Dict]:
         """Obtener todos los documentos de un mes específico con tracking"""
         documents = []
         month_str = f"{month:02d}"
         base_month_url = f"{self.base_url}/{year}/{month_str}"
 
+        # Los listados de meses cerrados hace tiempo no cambian
+        listing_ttl = period_ttl(date(year, month, calendar.monthrange(year, month)[1]))
+
         page_num = 0
         consecutive_empty = 0
 
@@ -90,17 +139,31 @@ class DIANScraperImproved:
             logger.info(f"Procesando página {page_num}: {url}")
 
             try:
-                response = self.session.get(url, timeout=30)
+                response = self.http_cache.get(self.session, url, ttl=listing_ttl, timeout=30)
+                if self.watermark:
+                    self.watermark.record_request()
                 if response.status_code != 200:
                     logger.warning(f"Error HTTP {response.status_code} en página {page_num}")
                     consecutive_empty += 1
                     page_num += 1
+                    self.listing_complete = False
                     self.update_progress(errors=self.stats['errors'] + 1)
                     continue
 
                 # Extraer enlaces de la página
                 doc_links = self.extract_document_links_from_listing(response.text)
 
+                # Sincronización: omitir los documentos del mes de la marca ya vistos
+                if self.watermark:
+                    self.watermark.record_page_size(len(doc_links))
+                    period = f"{year}-{month_str}"
+                    total_links = len(doc_links)
+                    doc_links = [link for link in doc_links if self.watermark.accept(link['url'], period)]
+                    if total_links and not doc_links:
+                        logger.info(f"Página {page_num}: {total_links} documentos ya sincronizados")
+                        page_num += 1
+                        continue
+
                 if not doc_links:
                     logger.info(f"Página {page_num} vacía")
                     consecutive_empty += 1
@@ -147,8 +210,6 @@ class DIANScraperImproved:
                                     error_doc['error_message'] = 'No se pudo procesar el documento'
                                     self.stats['documents'].append(error_doc)
                                     self.update_progress(errors=self.stats['errors'] + 1)
-
-                                time.sleep(1)
                             except Exception as e:
                                 logger.error(f"Error procesando {link_info['url']}: {e}")
                                 self.update_progress(errors=self.stats['errors'] + 1)
@@ -161,9 +222,14 @@ class DIANScraperImproved:
             except Exception as e:
                 logger.error(f"Error en página {page_num}: {e}")
                 self.update_progress(errors=self.stats['errors'] + 1)
+                self.listing_complete = False
                 consecutive_empty += 1
                 page_num += 1
 
+        if page_num >= max_pages and consecutive_empty == 0:
+            # Se cortó en max_pages con páginas aún llenas
+            self.listing_complete = False
+
         logger.info(f"Total documentos encontrados en {year}/{month_str}: {len(documents)}")
         # No agregar documents directamente a stats porque pueden contener objetos soup
         return documents
@@ -534,17 +600,23 @@ class DIANScraperImproved:
             logger.debug(f"PDF ya existe: {filename}")
             return True
 
+        # PDF ya descargado para otro año/mes o ejecución: enlazar desde el almacén
+        entry = self.blob_store.lookup(pdf_url)
+        if entry:
+            self.blob_store.restore(entry, filepath)
+            logger.info(f"  PDF ya en el almacén: {filename}")
+            return True
+
         for attempt in range(self.max_retries):
             try:
-                response = self.session.get(pdf_url, stream=True, timeout=60)
-                if response.status_code == 200:
-                    file_size = int(response.headers.get('content-length', 0))
-
-                    with open(filepath, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-
+                with self.session.get(pdf_url, stream=True, timeout=60) as response:
+                    status_code = response.status_code
+                    if status_code == 200:
+                        file_size = stream_response_to_file(response, filepath, expected_header=None,
+                                                            min_size=1, blob_store=self.blob_store,
+                                                            key=pdf_url)
+
+                if status_code == 200:
                     # Actualizar estadísticas
                     self.update_progress(
                         pdfs_downloaded=self.stats['pdfs_downloaded'] + 1,
@@ -556,11 +628,11 @@ class DIANScraperImproved:
                     return True
                 else:
                     if attempt < self.max_retries - 1:
-                        logger.warning(f"Error HTTP {response.status_code}, reintentando...")
+                        logger.warning(f"Error HTTP {status_code}, reintentando...")
                         time.sleep(2)
                         continue
                     logger.warning(
-                        f"  Error HTTP {response.status_code} descargando PDF después de {self.max_retries} intentos")
+                        f"  Error HTTP {status_code} descargando PDF después de {self.max_retries} intentos")
                     self.update_progress(errors=self.stats['errors'] + 1)
                     return False
 
@@ -4,11 +4,9 @@ Scraper mejorado para documentos DIAN legacy (2001-2009)
 Combina navegación de scraper_legacy con extracción mejorada de script_descarga_html
 """
 
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import os
-import time
 import re
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
@@ -16,6 +14,9 @@ import logging
 import json
 from pathlib import Path
 
+from common.http_cache import IMMUTABLE, get_http_cache
+from common.http_client import HTTPClient
+
 from .content_extractor import ContentExtractor
 from .html_formatter import HTMLFormatter
 from .encoding_fixer import EncodingFixer
@@ -27,11 +28,12 @@ class DIANLegacyImprovedScraper:
     """Scraper mejorado para documentos DIAN de años 2001-2009"""
 
     def __init__(self, progress_callback=None):
-        self.session = requests.Session()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        self.session.headers.update(self.headers)
+        self.http = HTTPClient(headers=self.headers)
+        self.session = self.http.session
+        self.http_cache = get_http_cache()
 
         # Inicializar helpers
         self.content_extractor = ContentExtractor()
@@ -100,7 +102,8 @@ class DIANLegacyImprovedScraper:
         for url in urls_to_try:
             try:
                 logger.info(f"Intentando obtener: {url}")
-                response = self.session.get(url, timeout=30)
+                # El archivo 2001-2009 es histórico: sus páginas no cambian
+                response = self.http_cache.get(self.session, url, ttl=IMMUTABLE, timeout=30)
 
                 if response.status_code == 200:
                     # Usar el encoding_fixer para detectar y decodificar correctamente
@@ -541,7 +544,6 @@ class DIANLegacyImprovedScraper:
                 documents = self.scrape_month(year, month)
                 if documents:
                     results[month] = documents
-                time.sleep(1)  # Pausa entre requests
             except Exception as e:
                 logger.error(f"Error procesando {year}/{month:0>2}: {e}")
                 self.update_progress(errors=self.stats['errors'] + 1)
@@ -630,10 +632,6 @@ class DIANLegacyImprovedScraper:
                     current_action=f"Guardado: {doc.get('numero', 'Sin número')}"
                 )
 
-                # Pausa para no sobrecargar el servidor
-                if download_full_content and i < len(documents):
-                    time.sleep(0.5)
-
             except Exception as e:
                 logger.error(f"Error guardando documento {doc.get('numero')}: {e}", exc_info=True)
                 self.update_progress(errors=self.stats['errors'] + 1)
@@ -745,8 +743,6 @@ class DIANLegacyImprovedScraper:
                         'error': 'No se pudo procesar el documento'
                     })
 
-                time.sleep(0.5)  # Pausa entre requests
-
             except Exception as e:
                 logger.error(f"Error procesando {url}: {e}")
                 results.append({
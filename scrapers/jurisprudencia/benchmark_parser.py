@@ -0,0 +1,188 @@
+# scrapers/jurisprudencia/benchmark_parser.py
+"""
+Benchmark del parser de registros CDATA de jurisprudencia
+
+Compara el método anterior (un `re.search` sin compilar por campo) con el
+tokenizador de una sola pasada (`parse_cdata_fields`) sobre páginas guardadas
+de respuestas AJAX, y verifica que ambos producen los mismos registros.
+Si no se indican fixtures se generan páginas sintéticas con la misma
+estructura que las del portal.
+
+Uso:
+    python -m scrapers.jurisprudencia.benchmark_parser
+    python -m scrapers.jurisprudencia.benchmark_parser --fixtures paginas_guardadas/ --repeat 20
+"""
+import argparse
+import logging
+import re
+import time
+from pathlib import Path
+
+from common.id_index import IdIndex
+from scrapers.jurisprudencia.scraper import JudicialScraperV2
+
+FIELD_TEMPLATE = '<font color="#000000"><b>{label}: </b></font><font color="#333333">{value}</font><br>'
+
+
+def synthetic_page(page_number: int, records_per_page: int = 10) -> str:
+    """Página AJAX con la estructura de resultForm:jurisTable"""
+    records = []
+    for i in range(records_per_page):
+        doc_id = 100000 + page_number * records_per_page + i
+        fields = [
+            ('ID', doc_id),
+            ('NÚMERO DE PROCESO', f'1100102030002023{doc_id:05d}00'),
+            ('NÚMERO DE PROVIDENCIA', f'AC{doc_id % 9000}-2023'),
+            ('CLASE DE ACTUACIÓN', 'RECURSO DE CASACIÓN'),
+            ('TIPO DE PROVIDENCIA', 'SENTENCIA' if i % 3 else 'AUTO INTERLOCUTORIO'),
+            ('FECHA', f'{1 + i % 28:02d}/{1 + page_number % 12:02d}/2023'),
+            ('PONENTE', 'MAGISTRADO PONENTE DE PRUEBA'),
+            ('TEMA', 'RECURSO DE CASACIÓN - Requisitos formales de la demanda<br><b>Tesis:</b> '
+                     + 'La demanda debe formular cargos claros y precisos. ' * 8),
+            ('FUENTE FORMAL', 'Código General del Proceso art. 344<br>Ley 1564 de 2012 art. 336 num. 1'
+                              '<br><i>Constitución Política</i> art. 29'),
+        ]
+        body = ''.join(FIELD_TEMPLATE.format(label=label, value=value) for label, value in fields)
+        records.append(f'<![CDATA[<div class="registro">{body}</div>]]>')
+
+    return ('<?xml version="1.0" encoding="UTF-8"?><partial-response><changes>'
+            f'<update id="resultForm:pagText2"><![CDATA[Resultado: {page_number * records_per_page + 1} / 20000]]>'
+            '</update><update id="resultForm:jurisTable">' + ''.join(records) + '</update></changes>'
+            '</partial-response>')
+
+
+def legacy_extract(scraper: JudicialScraperV2, cdata: str):
+    """Reproducción del método anterior: un re.search sin compilar por campo"""
+    record = {
+        'nombre_archivo': None,
+        'estado_descarga': 'pendiente',
+        'intentos': 0,
+        'error': None,
+        'tamaño_archivo': None,
+        'fecha_descarga': None,
+        'pagina_origen': None,
+        'intentos_descarga': 0
+    }
+
+    id_match = re.search(r'ID:\s*</b></font><font[^>]*>(\d+)', cdata)
+    if not id_match:
+        return None
+    record['id'] = id_match.group(1)
+
+    proceso_match = re.search(r'PROCESO:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['numero_proceso'] = proceso_match.group(1).strip() if proceso_match else ''
+    providencia_match = re.search(r'PROVIDENCIA:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['numero_providencia'] = providencia_match.group(1).strip() if providencia_match else ''
+    actuacion_match = re.search(r'ACTUACI[ÓO]N:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['clase_actuacion'] = actuacion_match.group(1).strip() if actuacion_match else ''
+    tipo_match = re.search(r'TIPO DE PROVIDENCIA:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['tipo_providencia'] = tipo_match.group(1).strip() if tipo_match else ''
+    fecha_match = re.search(r'FECHA:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['fecha'] = fecha_match.group(1).strip() if fecha_match else ''
+    ponente_match = re.search(r'PONENTE:\s*</b></font><font[^>]*>([^<]+)', cdata)
+    record['ponente'] = ponente_match.group(1).strip() if ponente_match else ''
+
+    tema_match = re.search(r'TEMA:\s*</b></font><font[^>]*>(.*?)</font>', cdata, re.DOTALL)
+    if tema_match:
+        tema = tema_match.group(1).replace('<br>', ' ').replace('<b>', '').replace('</b>', '')
+        tema = re.sub(r'<[^>]+>', '', tema).strip()
+        for delimiter in [' - ', '\n', '|', '•']:
+            if delimiter in tema:
+                tema = tema.split(delimiter)[0].strip()
+                break
+        if len(tema) > scraper.max_tema_length:
+            tema = tema[:scraper.max_tema_length] + "..."
+        record['tema'] = tema
+    else:
+        record['tema'] = ''
+
+    fuente_match = re.search(r'FUENTE FORMAL:\s*</b></font><font[^>]*>(.*?)</font>', cdata, re.DOTALL)
+    if fuente_match:
+        fuente = fuente_match.group(1).replace('<br>', ' ')
+        fuente = re.sub(r'<[^>]+>', '', fuente).strip()
+        record['fuente_formal'] = fuente[:500] if len(fuente) > 500 else fuente
+    else:
+        record['fuente_formal'] = ''
+
+    return record
+
+
+def legacy_page(scraper: JudicialScraperV2, html: str):
+    """Registros de una página con el método anterior"""
+    records = []
+    for cdata in re.findall(r'<!\[CDATA\[(.*?)\]\]>', html, re.DOTALL):
+        if 'ID:' in cdata and 'PROCESO:' in cdata:
+            record = legacy_extract(scraper, cdata)
+            if record:
+                records.append(record)
+    return records
+
+
+def tokenizer_page(scraper: JudicialScraperV2, html: str):
+    """Registros de una página con el parser actual (sin deduplicar entre pasadas)"""
+    scraper.id_index = IdIndex()
+    scraper.watermark = None
+    return scraper.extract_jurisprudence_data(html)
+
+
+def parser_only_scraper() -> JudicialScraperV2:
+    """Instancia sin sesión, directorios ni logging de archivo: solo el parser"""
+    scraper = JudicialScraperV2.__new__(JudicialScraperV2)
+    scraper.max_tema_length = 200
+    scraper.logger = logging.getLogger(__name__)
+    scraper.id_index = IdIndex()
+    scraper.watermark = None
+    return scraper
+
+
+def load_pages(fixtures: Path = None, pages: int = 200):
+    if fixtures:
+        files = sorted(p for p in fixtures.iterdir() if p.suffix in ('.xml', '.html', '.txt'))
+        return [f.read_text(encoding='utf-8', errors='ignore') for f in files]
+    return [synthetic_page(n) for n in range(pages)]
+
+
+def measure(parse_page, pages, repeat: int):
+    """Registros/seg parseando todas las páginas `repeat` veces"""
+    records = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            records += len(parse_page(html))
+    elapsed = time.perf_counter() - start
+    return records, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', type=Path, help='Carpeta con respuestas AJAX guardadas (.xml/.html)')
+    parser.add_argument('--pages', type=int, default=200, help='Páginas sintéticas si no hay fixtures')
+    parser.add_argument('--repeat', type=int, default=5, help='Pasadas sobre el conjunto de páginas')
+    args = parser.parse_args()
+
+    scraper = parser_only_scraper()
+    pages = load_pages(args.fixtures, args.pages)
+
+    # Ambos parsers deben producir exactamente los mismos registros
+    mismatches = 0
+    for html in pages:
+        legacy = legacy_page(scraper, html)
+        current = tokenizer_page(scraper, html)
+        for record in current:
+            record['pagina_origen'] = None
+        if len(legacy) != len(current):
+            mismatches += abs(len(legacy) - len(current))
+        mismatches += sum(1 for old, new in zip(legacy, current) if old != new)
+
+    print(f"Páginas: {len(pages)} | pasadas: {args.repeat} | registros distintos entre métodos: {mismatches}")
+    print(f"{'método':<12} | {'registros':>9} | {'tiempo (s)':>10} | {'registros/seg':>13}")
+    print("-" * 54)
+
+    for name, parse_page in (('re.search', lambda html: legacy_page(scraper, html)),
+                             ('tokenizador', lambda html: tokenizer_page(scraper, html))):
+        records, elapsed = measure(parse_page, pages, args.repeat)
+        print(f"{name:<12} | {records:>9} | {elapsed:>10.3f} | {records / elapsed:>13,.0f}")
+
+
+if __name__ == '__main__':
+    main()
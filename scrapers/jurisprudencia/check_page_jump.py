@@ -0,0 +1,154 @@
+# scrapers/jurisprudencia/check_page_jump.py
+"""
+Verificación del salto directo de página contra un doble local del portal JSF
+
+Levanta un servidor local que reproduce respuestas AJAX grabadas (o páginas
+sintéticas con la misma estructura) y responde como el portal: GET con el
+ViewState, POST de búsqueda, botón "siguiente" y, opcionalmente, el
+paginador de PrimeFaces. Para cada página objetivo comprueba que
+`go_to_page` devuelve exactamente los registros de la página grabada:
+- con paginador: un solo POST (salto directo)
+- sin paginador (el servidor ignora los parámetros y repite la página
+  actual): se detecta y se avanza con "siguiente" (fallback)
+
+Uso:
+    python -m scrapers.jurisprudencia.check_page_jump
+    python -m scrapers.jurisprudencia.check_page_jump --fixtures paginas_guardadas/ --targets 2 5 9
+"""
+import argparse
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import scrapers.jurisprudencia.scraper as jurisprudencia
+from common.http_client import HTTPClient
+from scrapers.jurisprudencia.benchmark_parser import load_pages, parser_only_scraper
+
+
+class StandInJSF:
+    """Servidor local que sirve las páginas grabadas según el estado de cada ViewState"""
+
+    def __init__(self, pages, page_size: int, paginator: bool = True):
+        self.pages = pages
+        self.page_size = page_size
+        self.paginator = paginator
+        self.states = {}
+        self.posts = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, body: str):
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                viewstate = uuid.uuid4().hex
+                with stand_in.lock:
+                    stand_in.states[viewstate] = 0
+                self._send(f'<input type="hidden" name="javax.faces.ViewState" id="j_id1" value="{viewstate}" />')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+                viewstate = form.get('javax.faces.ViewState')
+                table = jurisprudencia.RESULTS_TABLE
+
+                with stand_in.lock:
+                    stand_in.posts += 1
+                    page = stand_in.states.get(viewstate, 0)
+                    if jurisprudencia.NEXT_BUTTON in form:
+                        page += 1
+                    elif form.get(f'{table}_pagination') == 'true':
+                        if stand_in.paginator:
+                            page = int(form[f'{table}_first']) // stand_in.page_size
+                    else:
+                        page = 0  # Búsqueda
+                    page = min(page, len(stand_in.pages) - 1)
+                    stand_in.states[viewstate] = page
+
+                self._send(stand_in.pages[page])
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}/WebRelatoria/csj/index.xhtml'
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+def record_ids(html: str):
+    return [record['id'] for record in parser_only_scraper().extract_jurisprudence_data(html)] if html else []
+
+
+def check(pages, targets, paginator: bool) -> bool:
+    """Abrir la búsqueda y saltar a cada página objetivo; True si todo coincide"""
+    page_size = len(record_ids(pages[0]))
+    ok = True
+    mode = 'paginador' if paginator else 'fallback'
+    stand_in = StandInJSF(pages, page_size, paginator)
+
+    with stand_in as url:
+        jurisprudencia.INDEX_URL = url
+
+        for target in targets:
+            scraper = parser_only_scraper()
+            scraper.http = HTTPClient()
+            scraper.results_lock = threading.Lock()
+            scraper.page_jump_supported = None
+            scraper.jump_stats = {'saltos_directos': 0, 'paginas_recorridas': 0}
+
+            session = scraper.http.new_session()
+            viewstate, _, _ = scraper._open_search(session, {'searchForm:searchButton': ''})
+            posts_before = stand_in.posts
+
+            success, html, _ = scraper.go_to_page(session, viewstate, target, page_size)
+            matches = success and record_ids(html) == record_ids(pages[target - 1])
+            ok &= matches
+            print(f"{mode:<10} | página {target:>4} | {'OK   ' if matches else 'FALLO'} | "
+                  f"peticiones: {stand_in.posts - posts_before:>4} | "
+                  f"saltos: {scraper.jump_stats['saltos_directos']} | "
+                  f"páginas recorridas: {scraper.jump_stats['paginas_recorridas']}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', type=Path, help='Carpeta con respuestas AJAX grabadas, en orden de página')
+    parser.add_argument('--pages', type=int, default=60, help='Páginas sintéticas si no hay fixtures')
+    parser.add_argument('--targets', type=int, nargs='+', help='Páginas a las que saltar')
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures, args.pages)
+    targets = args.targets or sorted({2, len(pages) // 2, len(pages)})
+    targets = [t for t in targets if 1 < t <= len(pages)]
+
+    ok = check(pages, targets, paginator=True)
+    ok &= check(pages, targets, paginator=False)
+
+    print("Resultado:", "OK" if ok else "FALLO")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
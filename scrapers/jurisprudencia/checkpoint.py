@@ -0,0 +1,63 @@
+# scrapers/jurisprudencia/checkpoint.py
+"""
+Checkpoints de ejecuciones largas de jurisprudencia
+Guarda periódicamente (y de forma atómica) los parámetros de búsqueda y la
+página alcanzada por cada recorrido. El estado de descarga de cada registro
+está en el JSONL incremental de la ejecución (ver common.results_writer), de
+modo que el checkpoint no crece con los resultados y una ejecución
+interrumpida puede reanudarse sin volver a descargar lo que ya está en disco.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Guardar como mucho cada N páginas o cada N segundos
+CHECKPOINT_EVERY_PAGES = 10
+CHECKPOINT_EVERY_SECONDS = 30
+
+
+class CheckpointManager:
+    """Lectura y escritura de `checkpoint.json` en el directorio de logs"""
+
+    def __init__(self, log_dir: Path):
+        self.path = Path(log_dir) / 'checkpoint.json'
+        self.lock = threading.Lock()
+        self._pages_since_save = 0
+        self._last_save = time.monotonic()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> Optional[Dict[str, any]]:
+        """Último checkpoint guardado (None si no hay o está dañado)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, state: Dict[str, any]):
+        """Escribir el checkpoint de forma atómica"""
+        state = dict(state)
+        state['fecha_actualizacion'] = datetime.now().isoformat()
+
+        with self.lock:
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._pages_since_save = 0
+            self._last_save = time.monotonic()
+
+    def page_done(self, build_state: Callable[[], Dict[str, any]]):
+        """Contar una página y guardar si toca (el estado solo se construye entonces)"""
+        with self.lock:
+            self._pages_since_save += 1
+            due = (self._pages_since_save >= CHECKPOINT_EVERY_PAGES or
+                   time.monotonic() - self._last_save >= CHECKPOINT_EVERY_SECONDS)
+        if due:
+            self.save(build_state())
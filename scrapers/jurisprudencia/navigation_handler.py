@@ -90,18 +90,15 @@ class NavigationHandler:
             if not page_data:
                 self.logger.warning(f"⚠️ Sin datos en página {current_page + 1}")
             else:
-                # Filtrar duplicados
-                new_records = self._filter_duplicates(page_data, all_results)
+                # Los duplicados ya los descarta el scraper con su índice de IDs
+                all_results.extend(page_data)
+                if process_callback:
+                    process_callback(page_data)
 
-                if new_records:
-                    all_results.extend(new_records)
-                    if process_callback:
-                        process_callback(new_records)
-
-                    self.logger.info(
-                        f"📄 Página {current_page + 1}: {len(new_records)} nuevos, "
-                        f"Total: {len(all_results)}/{target_results}"
-                    )
+                self.logger.info(
+                    f"📄 Página {current_page + 1}: {len(page_data)} nuevos, "
+                    f"Total: {len(all_results)}/{target_results}"
+                )
 
             current_page += 1
             self.pages_navigated += 1
@@ -138,19 +135,6 @@ class NavigationHandler:
 
         return False, None
 
-    def _filter_duplicates(self, new_data: List[Dict], existing_data: List[Dict]) -> List[Dict]:
-        """Filtrar registros duplicados"""
-        existing_ids = {record.get('id') for record in existing_data if record.get('id')}
-        filtered = []
-
-        for record in new_data:
-            if record.get('id') and record['id'] not in existing_ids:
-                filtered.append(record)
-            else:
-                self.logger.debug(f"Duplicado filtrado: {record.get('id')}")
-
-        return filtered
-
     def _adaptive_delay(self):
         """Pausa adaptativa basada en el estado"""
         if self.consecutive_failures > 0:
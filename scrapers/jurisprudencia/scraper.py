@@ -3,19 +3,28 @@
 Scraper de Jurisprudencia - Versión simplificada
 Mantiene una sola sesión y descarga todo de manera secuencial con workers paralelos
 """
-import requests
 from urllib.parse import unquote
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import time
-import csv
 import json
 from pathlib import Path
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import threading
+import queue
 from typing import List, Dict, Optional, Tuple
 
+from common.blob_store import get_blob_store
+from common.bounded_executor import BoundedExecutor
+from common.download_stats import DownloadStats
+from common.http_client import HTTPClient
+from common.id_index import IdIndex
+from common.results_writer import IncrementalResultsWriter
+from common.stream_writer import stream_response_to_file, validate_existing_file
+from common.watermark import Watermark, iso_date
+from scrapers.jurisprudencia.checkpoint import CheckpointManager
+
 # Configuración
 BASE_URL = "https://consultajurisprudencial.ramajudicial.gov.co"
 INDEX_URL = f"{BASE_URL}/WebRelatoria/csj/index.xhtml"
@@ -28,28 +37,170 @@ HEADERS = {
     'Accept-Encoding': 'gzip, deflate, br, zstd',
 }
 
+# Headers de las peticiones AJAX de JSF (búsqueda y paginación)
+AJAX_HEADERS = {
+    **HEADERS,
+    'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+    'X-Requested-With': 'XMLHttpRequest',
+    'Faces-Request': 'partial/ajax',
+    'Accept': 'application/xml, text/xml, */*; q=0.01',
+    'Origin': BASE_URL,
+    'Referer': INDEX_URL,
+}
+
+# Formato de fechas del formulario (fechaIniCal / fechaFinCal)
+DATE_FORMAT = '%d/%m/%Y'
+
+# Columnas del CSV de resultados
+CSV_FIELDS = [
+    'id', 'numero_providencia', 'numero_proceso', 'fecha',
+    'ponente', 'tipo_providencia', 'clase_actuacion',
+    'tema', 'nombre_archivo', 'estado_descarga', 'error',
+    'pagina_origen', 'intentos_descarga'
+]
+
+# Páginas en espera entre el navegador y el parser
+PARSE_QUEUE_SIZE = 4
+
+# Tabla de resultados (paginador de PrimeFaces) y botón "siguiente" de la barra propia
+RESULTS_TABLE = 'resultForm:jurisTable'
+NEXT_BUTTON = 'resultForm:j_idt259'
+
+# Patrones precompilados del parser de resultados
+VIEWSTATE_RE = re.compile(r'<input type="hidden" name="javax\.faces\.ViewState".*?value="([^"]+)"')
+# "Resultado: <primer registro de la página> / <total>"
+RESULT_COUNT_RE = re.compile(r'Resultado:\s*(\d+)\s*/\s*(\d+)')
+# Contenido de cada bloque CDATA (bucle desenrollado: sin backtracking por carácter)
+CDATA_RE = re.compile(r'<!\[CDATA\[([^\]]*(?:\](?!\]>)[^\]]*)*)\]\]>')
+TAG_RE = re.compile(r'<[^>]+>')
+DIGITS_RE = re.compile(r'\d+')
+
+# Tokenizador de un registro: cada "ETIQUETA: </b></font><font ...>valor</font>"
+# en una sola pasada sobre el CDATA. El patrón empieza por un literal, así que
+# el motor salta directamente de un campo al siguiente; la etiqueta es el
+# texto entre el '>' anterior y el inicio del match
+FIELD_SEPARATOR = '</b></font><font'
+FIELD_RE = re.compile(FIELD_SEPARATOR + r'[^>]*>([^<]*(?:<(?!/font>)[^<]*)*)</font>')
+
+# (sufijo de la etiqueta, campo del registro, tipo de valor). Se compara por
+# sufijo y gana la primera aparición, igual que hacía `re.search` por campo:
+# 'digits' = solo dígitos iniciales, 'text' = hasta la primera etiqueta HTML,
+# 'html' = contenido completo del <font>
+CDATA_FIELDS = (
+    ('ID', 'id', 'digits'),
+    ('PROCESO', 'numero_proceso', 'text'),
+    ('PROVIDENCIA', 'numero_providencia', 'text'),
+    ('ACTUACIÓN', 'clase_actuacion', 'text'),
+    ('ACTUACION', 'clase_actuacion', 'text'),
+    ('TIPO DE PROVIDENCIA', 'tipo_providencia', 'text'),
+    ('FECHA', 'fecha', 'text'),
+    ('PONENTE', 'ponente', 'text'),
+    ('TEMA', 'tema', 'html'),
+    ('FUENTE FORMAL', 'fuente_formal', 'html'),
+)
+
+_label_cache: Dict[str, tuple] = {}
+
+
+def _fields_for_label(label: str) -> tuple:
+    """Campos a los que corresponde una etiqueta (memoizado: hay pocas etiquetas distintas)"""
+    fields = _label_cache.get(label)
+    if fields is None:
+        fields = ()
+        if label.endswith(':'):
+            name = label[:-1]
+            fields = tuple((field, kind) for suffix, field, kind in CDATA_FIELDS if name.endswith(suffix))
+        _label_cache[label] = fields
+    return fields
+
+
+def parse_cdata_fields(cdata: str) -> Dict[str, str]:
+    """
+    Extraer los valores crudos de un registro CDATA en una sola pasada
+
+    Returns:
+        {campo: valor}; 'text' y 'digits' ya vienen sin espacios sobrantes
+    """
+    fields = {}
+    for match in FIELD_RE.finditer(cdata):
+        start = match.start()
+        label = cdata[cdata.rfind('>', 0, start) + 1:start].rstrip()
+
+        for field, kind in _fields_for_label(label):
+            if field in fields:
+                continue
+
+            value = match.group(1)
+            if kind == 'text':
+                value = value.split('<', 1)[0]
+                if not value:
+                    continue
+                value = value.strip()
+            elif kind == 'digits':
+                digits = DIGITS_RE.match(value)
+                if not digits:
+                    continue
+                value = digits.group(0)
+            fields[field] = value
+    return fields
+
 
 class JudicialScraperV2:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
-        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def __init__(self, timestamp: Optional[str] = None):
+        """
+        Args:
+            timestamp: Ejecución a continuar (reutiliza su carpeta de logs y
+                su checkpoint); por defecto una ejecución nueva
+        """
+        # Sesión principal (cookies JSF) y pool compartido con los workers de descarga
+        self.http = HTTPClient(headers=HEADERS)
+        self.session = self.http.session
+        self.timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_dir = Path(f"logs/{self.timestamp}")
         self.pdf_dir = Path("descargas_pdf")
+        self.blob_store = get_blob_store()
         self.setup_directories()
         self.setup_logging()
+        self.download_stats = DownloadStats(self.log_dir, source='jurisprudencia',
+                                            type_field='tipo_providencia')
+        # Resultados en JSONL/CSV añadidos página a página, conteos en progreso.json
+        self.results_writer = IncrementalResultsWriter(self.log_dir, f'jurisprudencia_{self.timestamp}.csv',
+                                                       CSV_FIELDS)
 
         # Estado
         self.viewstate = None
         self.download_queue = []
         self.results_lock = threading.Lock()
         self.all_results = []
-        self.processed_ids = set()
+        # IDs ya extraídos (compartido por páginas y particiones); ver `id_history`
+        self.id_index = IdIndex()
+        # Modo sincronización: marca de agua de la consulta (ver `sync`)
+        self.watermark: Optional[Watermark] = None
+        self.strategy = 'simple'
+        self.partition_stats = []
+        self.download_executor = None
+        self.downloads_done = 0
+
+        # Checkpoint: página alcanzada por recorrido ('principal' o tramo de fechas)
+        self.checkpoint = CheckpointManager(self.log_dir)
+        self.run_params = {}
+        self.pages_reached: Dict[str, int] = {}
+        self.resume_pages: Dict[str, int] = {}
+        self.resume_downloads: Dict[str, Dict] = {}
+        self.resumed_skipped = 0
+        self.restored_records: List[Dict] = []
+
+        # Salto directo de página: None = sin probar, luego True/False según el servidor
+        self.page_jump_supported = None
+        self.jump_stats = {'saltos_directos': 0, 'paginas_recorridas': 0}
+        self.pipeline_stats = {'paginas_parseadas': 0, 'tiempo_parser_segundos': 0.0,
+                               'espera_navegador_segundos': 0.0}
 
         # Configuración
         self.max_tema_length = 200
         self.download_timeout = 60
         self.max_retries = 3
+        self.save_full_json = True  # resultados_completos.json al terminar
 
     def setup_directories(self):
         """Crear directorios necesarios"""
@@ -80,10 +231,16 @@ class JudicialScraperV2:
 
     def extract_viewstate(self, html_content: str) -> Optional[str]:
         """Extrae el ViewState del HTML"""
-        pattern = r'<input type="hidden" name="javax\.faces\.ViewState".*?value="([^"]+)"'
-        match = re.search(pattern, html_content)
+        match = VIEWSTATE_RE.search(html_content)
         return match.group(1) if match else None
 
+    def _parse_date(self, value: Optional[str]) -> Optional[date]:
+        """Fecha del formulario (DD/MM/YYYY) o None si falta o no es válida"""
+        try:
+            return datetime.strptime(value, DATE_FORMAT).date()
+        except (TypeError, ValueError):
+            return None
+
     def clean_tema(self, tema_text: str) -> str:
         """Limpia y trunca el texto del tema"""
         if not tema_text:
@@ -91,7 +248,7 @@ class JudicialScraperV2:
 
         # Limpiar HTML
         tema = tema_text.replace('<br>', ' ').replace('<b>', '').replace('</b>', '')
-        tema = re.sub(r'<[^>]+>', '', tema).strip()
+        tema = TAG_RE.sub('', tema).strip()
 
         # Cortar en el primer delimitador
         for delimiter in [' - ', '\n', '|', '•']:
@@ -107,30 +264,50 @@ class JudicialScraperV2:
 
     def extract_jurisprudence_data(self, html_content: str, page_number: int = 1) -> List[Dict]:
         """Extrae todos los datos de jurisprudencia del HTML"""
+        return self.parse_page(html_content, page_number)[0]
+
+    def parse_page(self, html_content: str, page_number: int = 1) -> Tuple[List[Dict], int]:
+        """
+        Registros nuevos de una página
+
+        Returns:
+            (registros no vistos antes, registros presentes en la página). Una
+            página solo con duplicados no está vacía: la navegación debe seguir
+        """
         data = []
+        on_page = 0
 
         # Extraer contenido CDATA
-        cdata_pattern = r'<!\[CDATA\[(.*?)\]\]>'
-        cdata_matches = re.findall(cdata_pattern, html_content, re.DOTALL)
-
-        for cdata in cdata_matches:
+        for cdata in CDATA_RE.findall(html_content):
             if 'ID:' in cdata and 'PROCESO:' in cdata:
                 record = self._extract_record_from_cdata(cdata)
 
                 if record and record.get('id'):
-                    # Verificar duplicados
-                    if record['id'] not in self.processed_ids:
-                        self.processed_ids.add(record['id'])
+                    on_page += 1
+                    # Verificar duplicados (las particiones y el historial comparten el índice)
+                    if self.id_index.add_if_new(record['id']):
+                        # Providencia de la fecha de la marca ya sincronizada
+                        if self.watermark is not None and not self.watermark.accept(
+                                record['id'], iso_date(record.get('fecha'))):
+                            continue
                         record['pagina_origen'] = page_number  # AGREGAR número de página
                         data.append(record)
-                        self.logger.debug(
-                            f"Extraído: ID={record['id']}, Providencia={record.get('numero_providencia', 'N/A')}, Página={page_number}")
+                        self.logger.debug("Extraído: ID=%s, Providencia=%s, Página=%s",
+                                          record['id'], record.get('numero_providencia', 'N/A'), page_number)
 
-        return data
+        if self.watermark is not None:
+            self.watermark.record_page_size(on_page)
+        return data, on_page
 
     def _extract_record_from_cdata(self, cdata: str) -> Optional[Dict]:
         """Extrae un registro individual del contenido CDATA"""
         try:
+            fields = parse_cdata_fields(cdata)
+
+            # ID (requerido)
+            if 'id' not in fields:
+                return None
+
             record = {
                 'nombre_archivo': None,
                 'estado_descarga': 'pendiente',
@@ -139,54 +316,23 @@ class JudicialScraperV2:
                 'tamaño_archivo': None,
                 'fecha_descarga': None,
                 'pagina_origen': None,
-                'intentos_descarga': 0
+                'intentos_descarga': 0,
+                'id': fields['id'],
+                'numero_proceso': fields.get('numero_proceso', ''),
+                'numero_providencia': fields.get('numero_providencia', ''),
+                'clase_actuacion': fields.get('clase_actuacion', ''),
+                'tipo_providencia': fields.get('tipo_providencia', ''),
+                'fecha': fields.get('fecha', ''),
+                'ponente': fields.get('ponente', ''),
+                # Tema (con limpieza)
+                'tema': self.clean_tema(fields.get('tema', '')),
+                'fuente_formal': ''
             }
 
-            # ID (requerido)
-            id_match = re.search(r'ID:\s*</b></font><font[^>]*>(\d+)', cdata)
-            if not id_match:
-                return None
-            record['id'] = id_match.group(1)
-
-            # Número de proceso
-            proceso_match = re.search(r'PROCESO:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['numero_proceso'] = proceso_match.group(1).strip() if proceso_match else ''
-
-            # Número de providencia
-            providencia_match = re.search(r'PROVIDENCIA:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['numero_providencia'] = providencia_match.group(1).strip() if providencia_match else ''
-
-            # Clase de actuación
-            actuacion_match = re.search(r'ACTUACI[ÓO]N:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['clase_actuacion'] = actuacion_match.group(1).strip() if actuacion_match else ''
-
-            # Tipo de providencia
-            tipo_match = re.search(r'TIPO DE PROVIDENCIA:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['tipo_providencia'] = tipo_match.group(1).strip() if tipo_match else ''
-
-            # Fecha
-            fecha_match = re.search(r'FECHA:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['fecha'] = fecha_match.group(1).strip() if fecha_match else ''
-
-            # Ponente
-            ponente_match = re.search(r'PONENTE:\s*</b></font><font[^>]*>([^<]+)', cdata)
-            record['ponente'] = ponente_match.group(1).strip() if ponente_match else ''
-
-            # Tema (con limpieza)
-            tema_match = re.search(r'TEMA:\s*</b></font><font[^>]*>(.*?)</font>', cdata, re.DOTALL)
-            if tema_match:
-                record['tema'] = self.clean_tema(tema_match.group(1))
-            else:
-                record['tema'] = ''
-
             # Fuente formal
-            fuente_match = re.search(r'FUENTE FORMAL:\s*</b></font><font[^>]*>(.*?)</font>', cdata, re.DOTALL)
-            if fuente_match:
-                fuente = fuente_match.group(1).replace('<br>', ' ')
-                fuente = re.sub(r'<[^>]+>', '', fuente).strip()
-                record['fuente_formal'] = fuente[:500] if len(fuente) > 500 else fuente
-            else:
-                record['fuente_formal'] = ''
+            if 'fuente_formal' in fields:
+                fuente = TAG_RE.sub('', fields['fuente_formal'].replace('<br>', ' ')).strip()
+                record['fuente_formal'] = fuente[:500]
 
             return record
 
@@ -216,13 +362,33 @@ class JudicialScraperV2:
         return f"{doc_id}.pdf"
 
     def download_pdf_worker(self, record: Dict) -> Tuple[bool, str]:
-        """Worker para descargar un PDF con 5 reintentos"""
+        """Worker para descargar un PDF, registrando latencia y tamaño"""
+        start = time.monotonic()
+        success, message = self._download_pdf(record)
+        self.download_stats.update_download(record, success, time.monotonic() - start,
+                                            record.get('tamaño_archivo'))
+        return success, message
+
+    def _download_pdf(self, record: Dict) -> Tuple[bool, str]:
+        """Descargar un PDF con 5 reintentos"""
         doc_id = record['id']
         max_download_retries = 5  # Aumentado a 5 reintentos
 
-        # Crear sesión temporal para esta descarga
-        session = requests.Session()
-        session.headers.update(HEADERS)
+        # Si el documento ya se descargó en otra búsqueda, solo enlazarlo
+        blob_key = f"csj:{doc_id}"
+        entry = self.blob_store.lookup(blob_key)
+        if entry:
+            file_size = self.blob_store.restore(entry, self.pdf_dir / entry['archivo'])
+            with self.results_lock:
+                record['nombre_archivo'] = entry['archivo']
+                record['estado_descarga'] = 'completado'
+                record['tamaño_archivo'] = file_size
+                record['fecha_descarga'] = datetime.now().isoformat()
+            self.logger.info(f"♻️ Ya en el almacén: {entry['archivo']} ({file_size:,} bytes)")
+            return True, f"Deduplicado: {entry['archivo']}"
+
+        # Sesión del worker: cookies aisladas de la sesión JSF, conexiones del pool compartido
+        session = self.http.thread_session()
 
         for attempt in range(max_download_retries):
             try:
@@ -238,44 +404,33 @@ class JudicialScraperV2:
 
                 self.logger.info(f"📥 Descargando {doc_id} - Intento {attempt + 1}/{max_download_retries}")
 
-                response = session.get(
+                with session.get(
                     PDF_URL,
                     params=pdf_params,
                     timeout=self.download_timeout,
                     stream=True
-                )
+                ) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"HTTP {response.status_code}")
 
-                if response.status_code == 200:
                     # Obtener nombre del archivo
                     content_disposition = response.headers.get('Content-Disposition')
                     filename = self.get_filename_from_cd(content_disposition, doc_id)
 
-                    # Descargar contenido
-                    content = b''
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            content += chunk
-
-                    # Validar PDF
-                    if len(content) < 1000 or not content.startswith(b'%PDF'):
-                        raise Exception("Archivo no válido o muy pequeño")
-
-                    # Guardar archivo
+                    # Descargar en streaming validando cabecera y tamaño
                     filepath = self.pdf_dir / filename
-                    with open(filepath, 'wb') as f:
-                        f.write(content)
+                    file_size = stream_response_to_file(response, filepath,
+                                                        blob_store=self.blob_store, key=blob_key)
 
-                    # Actualizar registro
-                    with self.results_lock:
-                        record['nombre_archivo'] = filename
-                        record['estado_descarga'] = 'completado'
-                        record['tamaño_archivo'] = len(content)
-                        record['fecha_descarga'] = datetime.now().isoformat()
+                # Actualizar registro
+                with self.results_lock:
+                    record['nombre_archivo'] = filename
+                    record['estado_descarga'] = 'completado'
+                    record['tamaño_archivo'] = file_size
+                    record['fecha_descarga'] = datetime.now().isoformat()
 
-                    self.logger.info(f"✅ Descargado: {filename} ({len(content):,} bytes) - Intento {attempt + 1}")
-                    return True, f"Descargado: {filename}"
-                else:
-                    raise Exception(f"HTTP {response.status_code}")
+                self.logger.info(f"✅ Descargado: {filename} ({file_size:,} bytes) - Intento {attempt + 1}")
+                return True, f"Descargado: {filename}"
 
             except Exception as e:
                 error_msg = str(e)
@@ -295,55 +450,452 @@ class JudicialScraperV2:
                         f"❌ Error descargando {doc_id} después de {max_download_retries} intentos: {error_msg}")
                     return False, error_msg
 
-        session.close()
-
     def navigate_to_next(self, viewstate: str) -> Tuple[bool, Optional[str]]:
         """Navegar a la siguiente página"""
-        try:
-            ajax_headers = HEADERS.copy()
-            ajax_headers.update({
-                'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                'X-Requested-With': 'XMLHttpRequest',
-                'Faces-Request': 'partial/ajax',
-                'Accept': 'application/xml, text/xml, */*; q=0.01',
-                'Origin': BASE_URL,
-                'Referer': INDEX_URL,
-            })
+        success, html, new_viewstate = self._navigate_next(self.session, viewstate)
+        if success:
+            self.viewstate = new_viewstate
+        return success, html
+
+    def _navigate_next(self, session, viewstate: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Pedir la página siguiente con el botón "next" de JSF
 
+        Returns:
+            (éxito, html de la respuesta, ViewState para la siguiente petición)
+        """
+        try:
             nav_params = {
                 'javax.faces.partial.ajax': 'true',
-                'javax.faces.source': 'resultForm:j_idt259',  # Botón siguiente
+                'javax.faces.source': NEXT_BUTTON,  # Botón siguiente
                 'javax.faces.partial.execute': '@all',
-                'javax.faces.partial.render': 'resultForm:jurisTable resultForm:pagText2',
-                'resultForm:j_idt259': 'resultForm:j_idt259',
+                'javax.faces.partial.render': f'{RESULTS_TABLE} resultForm:pagText2',
+                NEXT_BUTTON: NEXT_BUTTON,
                 'resultForm': 'resultForm',
                 'resultForm:jurisTable_selection': '',
                 'javax.faces.ViewState': viewstate
             }
 
-            response = self.session.post(
+            response = session.post(
                 INDEX_URL,
                 data=nav_params,
-                headers=ajax_headers,
+                headers=AJAX_HEADERS,
                 timeout=30
             )
+            self._count_search_request()
 
             if response.status_code == 200:
                 # Actualizar ViewState
-                new_viewstate = self.extract_viewstate(response.text)
-                if new_viewstate:
-                    self.viewstate = new_viewstate
-                return True, response.text
+                return True, response.text, self.extract_viewstate(response.text) or viewstate
             else:
-                return False, None
+                return False, None, viewstate
 
         except Exception as e:
             self.logger.error(f"Error en navegación: {e}")
-            return False, None
+            return False, None, viewstate
+
+    def _jump_to_page(self, session, viewstate: str, page: int,
+                      page_size: int) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Pedir la página `page` con los parámetros del paginador de PrimeFaces
+
+        Solo se da por buena si el texto "Resultado: x / N" confirma que la
+        página empieza en el registro esperado.
+
+        Returns:
+            (éxito, html de la respuesta, ViewState para la siguiente petición)
+        """
+        first = (page - 1) * page_size
+        params = {
+            'javax.faces.partial.ajax': 'true',
+            'javax.faces.source': RESULTS_TABLE,
+            'javax.faces.partial.execute': RESULTS_TABLE,
+            'javax.faces.partial.render': f'{RESULTS_TABLE} resultForm:pagText2',
+            'javax.faces.behavior.event': 'page',
+            'javax.faces.partial.event': 'page',
+            f'{RESULTS_TABLE}_pagination': 'true',
+            f'{RESULTS_TABLE}_first': str(first),
+            f'{RESULTS_TABLE}_rows': str(page_size),
+            f'{RESULTS_TABLE}_encodeFeature': 'true',
+            'resultForm': 'resultForm',
+            'javax.faces.ViewState': viewstate
+        }
+
+        try:
+            response = session.post(INDEX_URL, data=params, headers=AJAX_HEADERS, timeout=30)
+            self._count_search_request()
+        except Exception as e:
+            self.logger.warning(f"Error en salto a página {page}: {e}")
+            return False, None, viewstate
+
+        if response.status_code != 200 or self.parse_result_position(response.text) != first + 1:
+            return False, None, viewstate
+        return True, response.text, self.extract_viewstate(response.text) or viewstate
+
+    def go_to_page(self, session, viewstate: str, page: int, page_size: int,
+                   current_page: int = 1) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Llegar a la página `page` desde `current_page`
+
+        Prueba primero el salto directo del paginador; si el servidor no lo
+        acepta, se recuerda y se avanza con el botón "siguiente" hasta que
+        "Resultado: x / N" indique que se llegó (el salto fallido pudo mover
+        o no la tabla, así que se sigue la posición real).
+
+        Returns:
+            (éxito, html de la página `page`, ViewState para la siguiente petición)
+        """
+        if page <= current_page:
+            return True, None, viewstate
+
+        if self.page_jump_supported is not False:
+            success, html, new_viewstate = self._jump_to_page(session, viewstate, page, page_size)
+            if success:
+                self.page_jump_supported = True
+                with self.results_lock:
+                    self.jump_stats['saltos_directos'] += 1
+                self.logger.info(f"⏩ Salto directo a la página {page}")
+                return True, html, new_viewstate
+
+            if self.page_jump_supported is None:
+                self.logger.warning("⚠️ El paginador no aceptó el salto directo: se avanza página a página")
+            self.page_jump_supported = False
+
+        html = None
+        while current_page < page:
+            success, html, viewstate = self._navigate_next(session, viewstate)
+            if not success:
+                return False, None, viewstate
+
+            with self.results_lock:
+                self.jump_stats['paginas_recorridas'] += 1
+            position = self.parse_result_position(html)
+            current_page = (position - 1) // page_size + 1 if position else current_page + 1
+
+        return True, html, viewstate
+
+    def format_search_params(self, search_params: dict, viewstate: str,
+                             fecha_ini: Optional[date] = None, fecha_fin: Optional[date] = None) -> dict:
+        """Parámetros del POST de búsqueda con ViewState, comillas y rango de fechas"""
+        formatted_params = search_params.copy()
+        formatted_params['javax.faces.ViewState'] = viewstate
+
+        if fecha_ini:
+            formatted_params['searchForm:fechaIniCal'] = fecha_ini.strftime(DATE_FORMAT)
+        if fecha_fin:
+            formatted_params['searchForm:fechaFinCal'] = fecha_fin.strftime(DATE_FORMAT)
+
+        # Formatear campos especiales
+        if 'searchForm:tipoInput' in formatted_params and formatted_params['searchForm:tipoInput']:
+            tipo_value = formatted_params['searchForm:tipoInput']
+            # Si ya tiene comillas dobles, no agregar más
+            if not (tipo_value.startswith('"') and tipo_value.endswith('"')):
+                formatted_params['searchForm:tipoInput'] = f'"{tipo_value}"'
+
+        if 'searchForm:temaInput' in formatted_params and formatted_params['searchForm:temaInput']:
+            tema_value = formatted_params['searchForm:temaInput']
+            # Si ya tiene comillas dobles, no agregar más
+            if not (tema_value.startswith('"') and tema_value.endswith('"')):
+                formatted_params['searchForm:temaInput'] = f'"{tema_value}"'
+
+        return formatted_params
+
+    def parse_result_count(self, html_content: str) -> Optional[int]:
+        """Total del texto "Resultado: x / N" (None si no aparece)"""
+        match = RESULT_COUNT_RE.search(html_content)
+        return int(match.group(2)) if match else None
+
+    def parse_result_position(self, html_content: str) -> Optional[int]:
+        """Primer registro de la página según "Resultado: x / N" (None si no aparece)"""
+        match = RESULT_COUNT_RE.search(html_content)
+        return int(match.group(1)) if match else None
+
+    def _open_search(self, session, search_params: dict, fecha_ini: Optional[date] = None,
+                     fecha_fin: Optional[date] = None, viewstate: Optional[str] = None):
+        """
+        Ejecutar la búsqueda en `session` (pidiendo un ViewState nuevo si no se indica)
+
+        Returns:
+            (ViewState, html de la primera página, total) o None si falla
+        """
+        if viewstate is None:
+            response = session.get(INDEX_URL, timeout=30)
+            self._count_search_request()
+            if response.status_code != 200:
+                return None
+            viewstate = self.extract_viewstate(response.text)
+            if not viewstate:
+                return None
+
+        response = session.post(
+            INDEX_URL,
+            data=self.format_search_params(search_params, viewstate, fecha_ini, fecha_fin),
+            headers=AJAX_HEADERS,
+            timeout=45
+        )
+        self._count_search_request()
+        if response.status_code != 200:
+            return None
+
+        total = self.parse_result_count(response.text)
+        if total is None:
+            # Sin texto de resultados: rango sin providencias
+            total = 0
+        return self.extract_viewstate(response.text) or viewstate, response.text, total
+
+    def _count_search_request(self):
+        """Contar una petición de búsqueda o navegación para el informe de sincronización"""
+        if self.watermark is not None:
+            self.watermark.record_request()
+
+    def plan_partitions(self, search_params: dict, fecha_ini: date, fecha_fin: date,
+                        total_results: int, partitions: int) -> List[Tuple[date, date, int]]:
+        """
+        Dividir el rango de fechas en tramos con un número parecido de resultados
+
+        Se parte siempre el tramo con más resultados por su fecha media; basta
+        contar la mitad izquierda porque la derecha es la diferencia.
+
+        Returns:
+            Lista de (fecha_inicio, fecha_fin, resultados) sin tramos vacíos
+        """
+        session = self.http.new_session()
+        ranges = [(fecha_ini, fecha_fin, total_results)]
+        viewstate = None
+
+        while len(ranges) < partitions:
+            splittable = [i for i, (ini, fin, count) in enumerate(ranges) if fin > ini and count > 1]
+            if not splittable:
+                break
+
+            index = max(splittable, key=lambda i: ranges[i][2])
+            ini, fin, count = ranges[index]
+            middle = ini + (fin - ini) // 2
+
+            opened = self._open_search(session, search_params, ini, middle, viewstate)
+            if opened is None:
+                self.logger.warning("No se pudo contar un tramo; se usan las particiones actuales")
+                break
+            viewstate, _, left = opened
+
+            ranges[index:index + 1] = [(ini, middle, left),
+                                       (middle + timedelta(days=1), fin, max(count - left, 0))]
+
+        return [r for r in ranges if r[2] > 0]
+
+    def _collect_partition(self, search_params: dict, fecha_ini: date, fecha_fin: date,
+                           on_page, cancel_event=None) -> int:
+        """Recorrer un tramo de fechas con su propia sesión y ViewState"""
+        label = f"{fecha_ini.strftime(DATE_FORMAT)}-{fecha_fin.strftime(DATE_FORMAT)}"
+        session = self.http.new_session()
+
+        opened = self._open_search(session, search_params, fecha_ini, fecha_fin)
+        if opened is None:
+            self.logger.error(f"❌ Partición {label}: no se pudo ejecutar la búsqueda")
+            return 0
+        viewstate, html, total = opened
+
+        page_data, collected = self.parse_page(html, 1)
+        keep_going = on_page(page_data)
+        pages = 1
+        self._page_done(label, pages)
+        consecutive_empty_pages = 0
+
+        # Reanudación: saltar a la última página del checkpoint
+        skipped = self._skip_to_checkpoint(label, session, viewstate, collected)
+        if skipped:
+            pages, html, viewstate = skipped
+            page_data, page_records = self.parse_page(html, pages)
+            collected = (pages - 1) * collected + page_records
+            keep_going = on_page(page_data)
+            self._page_done(label, pages)
+
+        while keep_going and collected < total:
+            if cancel_event and cancel_event.is_set():
+                break
+
+            success, html, viewstate = self._navigate_next(session, viewstate)
+            page_records = 0
+            if success:
+                pages += 1
+                page_data, page_records = self.parse_page(html, pages)
+
+            if not page_records:
+                consecutive_empty_pages += 1
+                if consecutive_empty_pages >= 3:
+                    self.logger.error(f"❌ Partición {label}: 3 páginas consecutivas sin datos")
+                    break
+                continue
+
+            consecutive_empty_pages = 0
+            collected += page_records
+            keep_going = on_page(page_data)
+            self._page_done(label, pages)
+            self.logger.info(f"📄 Partición {label} página {pages}: {collected}/{total}")
+
+        return collected
+
+    def _collect_partitioned(self, search_params: dict, fecha_ini: date, fecha_fin: date,
+                             total_results: int, partitions: int, download_pdfs: bool,
+                             max_results: Optional[int], max_workers: int,
+                             max_pending_downloads: Optional[int], cancel_event=None):
+        """Recolectar (y descargar) en paralelo, una sesión JSF por tramo de fechas"""
+        ranges = self.plan_partitions(search_params, fecha_ini, fecha_fin, total_results, partitions)
+        self.logger.info(f"🧩 {len(ranges)} particiones: " + ", ".join(
+            f"{ini.strftime(DATE_FORMAT)}-{fin.strftime(DATE_FORMAT)} ({count})" for ini, fin, count in ranges))
+
+        if download_pdfs:
+            self.download_executor = BoundedExecutor(max_workers, max_pending_downloads,
+                                                     thread_name_prefix='csj-descarga')
+            self.downloads_done = 0
+            self._submit_downloads(self.download_executor, self.restored_records, cancel_event)
+
+        def on_page(page_data: List[Dict]) -> bool:
+            with self.results_lock:
+                if max_results:
+                    page_data = page_data[:max(max_results - len(self.all_results), 0)]
+                self.all_results.extend(page_data)
+                limit_reached = bool(max_results) and len(self.all_results) >= max_results
+            self.results_writer.append_page(page_data)
+            if download_pdfs:
+                self._submit_downloads(self.download_executor, page_data, cancel_event)
+            return not limit_reached
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(ranges), 1),
+                                    thread_name_prefix='csj-particion') as pool:
+                futures = [pool.submit(self._collect_partition, search_params, ini, fin, on_page, cancel_event)
+                           for ini, fin, _ in ranges]
+
+                for future, (ini, fin, expected) in zip(futures, ranges):
+                    try:
+                        collected = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Excepción en partición: {e}")
+                        collected = 0
+                    self.partition_stats.append({
+                        'fecha_inicio': ini.strftime(DATE_FORMAT),
+                        'fecha_fin': fin.strftime(DATE_FORMAT),
+                        'resultados_esperados': expected,
+                        'resultados_recolectados': collected
+                    })
+        finally:
+            if self.download_executor is not None:
+                self.logger.info("\n⏳ Esperando descargas pendientes...")
+                self.download_executor.shutdown(wait=True)
+
+    def _collect_sequential(self, start_page: int, page_size: int, found_results: int, total_results: int,
+                            executor: Optional[BoundedExecutor] = None, cancel_event=None) -> int:
+        """
+        Recorrer las páginas siguientes a `start_page` en dos etapas
+
+        - Navegador (este hilo): POST "siguiente", ViewState y posición
+          ("Resultado: x / N"); entrega el html crudo sin parsearlo
+        - Parser (hilo aparte): registros, deduplicación, resultados
+          incrementales, checkpoint y programación de descargas
+
+        La ruta crítica por página queda en el RTT más dos regex pequeñas. La
+        cola entre etapas es acotada: si las descargas frenan al parser, el
+        parser frena al navegador. Al llegar a `total_results` (max_results)
+        el navegador deja de pedir páginas, el parser descarta las que ya
+        estaban en cola y la última se recorta para no pasar del límite.
+
+        Returns:
+            Registros vistos (incluidos duplicados) en las páginas recorridas
+        """
+        if not page_size:
+            # Sin filas en la página de partida no hay con qué medir el final del recorrido
+            if len(self.all_results) < total_results:
+                self.logger.error("❌ La primera página no trajo registros: se detiene la navegación")
+            return 0
+
+        parse_queue = queue.Queue(maxsize=PARSE_QUEUE_SIZE)
+        limit_reached = threading.Event()
+        seen = {'registros': 0}
+
+        # Página 1, registros recuperados o página del checkpoint pueden bastar
+        if len(self.all_results) >= total_results:
+            limit_reached.set()
+
+        def parse_stage():
+            while True:
+                item = parse_queue.get()
+                if item is None:
+                    return
+                if limit_reached.is_set():
+                    # Páginas pedidas antes de llegar al límite: no se procesan
+                    continue
+
+                page_number, html = item
+                start = time.monotonic()
+                try:
+                    page_data, page_records = self.parse_page(html, page_number)
+                    seen['registros'] += page_records
+                    page_data = self._within_limit(page_data, total_results)
+                    self._add_results(page_data)
+                    if executor is not None:
+                        self._submit_downloads(executor, page_data, cancel_event)
+                    self._page_done('principal', page_number)
+                    self.logger.info(f"📄 Página {page_number}: {len(page_data)} registros, "
+                                     f"Total: {len(self.all_results)}/{total_results}")
+                    if len(self.all_results) >= total_results:
+                        limit_reached.set()
+                except Exception as e:
+                    self.logger.error(f"Error procesando página {page_number}: {e}")
+                with self.results_lock:
+                    self.pipeline_stats['paginas_parseadas'] += 1
+                    self.pipeline_stats['tiempo_parser_segundos'] += time.monotonic() - start
+
+        parser = threading.Thread(target=parse_stage, name='csj-parser', daemon=True)
+        parser.start()
+
+        page = start_page
+        consecutive_empty_pages = 0
+        max_empty_pages = 3  # Máximo de páginas vacías antes de terminar
+
+        try:
+            # La última página ya pedida cubre todos los resultados: no hay siguiente
+            while not limit_reached.is_set() and page * page_size < found_results:
+                if cancel_event and cancel_event.is_set():
+                    self.logger.info("🛑 Proceso cancelado por el usuario")
+                    break
+
+                success, html = self.navigate_to_next(self.viewstate)
+
+                # Sin texto de resultados = página sin datos
+                if not success or self.parse_result_position(html) is None:
+                    consecutive_empty_pages += 1
+                    self.logger.warning(f"⚠️ Sin datos en página {page + 1}")
+                    if consecutive_empty_pages >= max_empty_pages:
+                        self.logger.error(
+                            f"❌ {max_empty_pages} páginas consecutivas sin datos. Terminando navegación.")
+                        break
+                    if success:
+                        page += 1
+                        time.sleep(1.5)  # Pausa más larga en páginas vacías
+                    continue
+
+                consecutive_empty_pages = 0
+                page += 1
+
+                start = time.monotonic()
+                parse_queue.put((page, html))
+                with self.results_lock:
+                    self.pipeline_stats['espera_navegador_segundos'] += time.monotonic() - start
+                    if len(self.all_results) >= total_results:
+                        limit_reached.set()
+        finally:
+            parse_queue.put(None)
+            parser.join()
+
+        return seen['registros']
 
     def search_and_download_with_params(self, search_params: dict, download_pdfs: bool = True,
                                         max_results: Optional[int] = None, max_workers: int = 3,
-                                        cancel_event=None, **kwargs) -> Optional[List[Dict]]:
+                                        cancel_event=None, max_pending_downloads: Optional[int] = None,
+                                        partitions: int = 1, resume: bool = False,
+                                        id_history: Optional[str] = None, sync: bool = False,
+                                        **kwargs) -> Optional[List[Dict]]:
         """
         Función principal que realiza búsqueda y descarga
 
@@ -353,9 +905,43 @@ class JudicialScraperV2:
             max_results: Límite máximo de resultados
             max_workers: Número de workers para descargas paralelas
             cancel_event: Evento de cancelación
+            max_pending_downloads: Descargas pendientes antes de pausar la navegación
+                (por defecto 4 por worker)
+            partitions: Tramos de fechas a recorrer en paralelo, cada uno con su
+                sesión y ViewState (1 = navegación secuencial)
+            id_history: Omitir también los IDs de ejecuciones anteriores usando
+                un historial en disco: 'bloom' (O(1), memoria fija, falsos
+                positivos ~0.1%) o 'sorted' (exacto). None = solo esta ejecución
+            resume: Continuar desde el checkpoint de esta ejecución: se repite la
+                búsqueda, se avanza sin descargar hasta la página guardada y se
+                omiten los PDFs que ya están en disco y son válidos
+            sync: Buscar solo desde la marca de agua de esta consulta (fecha de
+                la providencia más reciente ya sincronizada) y omitir las
+                providencias de esa fecha ya vistas. La marca avanza al
+                recorrer el rango completo
             **kwargs: Ignorar parámetros adicionales de la versión segmentada
         """
         start_time = datetime.now()
+        self.run_params = {
+            'search_params': search_params,
+            'download_pdfs': download_pdfs,
+            'max_results': max_results,
+            'max_workers': max_workers,
+            'max_pending_downloads': max_pending_downloads,
+            'partitions': partitions,
+            'id_history': id_history,
+            'sync': sync
+        }
+        if id_history:
+            self.id_index = IdIndex(history=id_history, name='csj')
+        if sync:
+            search_params = self._narrow_to_watermark(search_params)
+            if search_params is None:
+                self.generate_final_report([], start_time)
+                self.download_stats.close()
+                return []
+        if resume:
+            self._load_checkpoint()
 
         # Logging inicial
         fecha_inicio = search_params.get('searchForm:fechaIniCal', 'N/A')
@@ -369,10 +955,15 @@ class JudicialScraperV2:
         self.logger.info(f"📥 Descargar PDFs: {download_pdfs}")
         self.logger.info(f"🎯 Límite resultados: {max_results if max_results else 'Sin límite'}")
 
+        # Una conexión por worker de descarga más una por sesión de navegación
+        self.http.ensure_pool_size(max_workers + max(partitions, 1))
+        run_state = 'interrumpido'
+
         try:
             # Fase 1: Obtener página inicial y ViewState
             self.logger.info("\n📡 FASE 1: Obteniendo página inicial...")
             response = self.session.get(INDEX_URL, timeout=30)
+            self._count_search_request()
             if response.status_code != 200:
                 self.logger.error(f"Error obteniendo página inicial: {response.status_code}")
                 return None
@@ -382,64 +973,45 @@ class JudicialScraperV2:
                 self.logger.error("No se pudo extraer ViewState")
                 return None
 
-            # Headers AJAX para todas las peticiones
-            ajax_headers = HEADERS.copy()
-            ajax_headers.update({
-                'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                'X-Requested-With': 'XMLHttpRequest',
-                'Faces-Request': 'partial/ajax',
-                'Accept': 'application/xml, text/xml, */*; q=0.01',
-                'Origin': BASE_URL,
-                'Referer': INDEX_URL,
-            })
-
             # Fase 2: Realizar búsqueda
             self.logger.info("\n🔍 FASE 2: Realizando búsqueda...")
 
-            # Actualizar ViewState en parámetros
-            formatted_params = search_params.copy()
-            formatted_params['javax.faces.ViewState'] = self.viewstate
-
-            # Formatear campos especiales
-            if 'searchForm:tipoInput' in formatted_params and formatted_params['searchForm:tipoInput']:
-                tipo_value = formatted_params['searchForm:tipoInput']
-                # Si ya tiene comillas dobles, no agregar más
-                if not (tipo_value.startswith('"') and tipo_value.endswith('"')):
-                    formatted_params['searchForm:tipoInput'] = f'"{tipo_value}"'
-
-            if 'searchForm:temaInput' in formatted_params and formatted_params['searchForm:temaInput']:
-                tema_value = formatted_params['searchForm:temaInput']
-                # Si ya tiene comillas dobles, no agregar más
-                if not (tema_value.startswith('"') and tema_value.endswith('"')):
-                    formatted_params['searchForm:temaInput'] = f'"{tema_value}"'
+            # ViewState y campos especiales
+            formatted_params = self.format_search_params(search_params, self.viewstate)
 
             # Realizar búsqueda
             response = self.session.post(
                 INDEX_URL,
                 data=formatted_params,
-                headers=ajax_headers,
+                headers=AJAX_HEADERS,
                 timeout=45
             )
+            self._count_search_request()
 
             if response.status_code != 200:
                 self.logger.error(f"Error en búsqueda: HTTP {response.status_code}")
                 return None
 
             # Obtener total de resultados
-            results_pattern = r'Resultado:\s*(\d+)\s*/\s*(\d+)'
-            match = re.search(results_pattern, response.text)
-            if not match:
+            found_results = self.parse_result_count(response.text)
+            if found_results is None:
                 self.logger.error("No se pudo determinar el número de resultados")
                 return None
 
-            current_result = int(match.group(1))
-            total_results = int(match.group(2))
-
+            total_results = found_results
             if max_results and max_results < total_results:
                 total_results = max_results
 
             self.logger.info(f"📊 Resultados encontrados: {total_results}")
 
+            # Modo particionado: requiere ambas fechas
+            fecha_ini = self._parse_date(search_params.get('searchForm:fechaIniCal'))
+            fecha_fin = self._parse_date(search_params.get('searchForm:fechaFinCal'))
+            if partitions > 1 and fecha_ini and fecha_fin and fecha_fin > fecha_ini:
+                self.strategy = 'particionada'
+            elif partitions > 1:
+                self.logger.warning("⚠️ Sin rango de fechas válido: se navega de forma secuencial")
+
             # Guardar manifiesto
             self.save_manifest(formatted_params, total_results)
 
@@ -450,141 +1022,73 @@ class JudicialScraperV2:
             # Fase 3: Recolectar y descargar
             self.logger.info("\n🔄 FASE 3: Recolectando datos y descargando PDFs...")
 
-            if download_pdfs:
-                # Usar ThreadPoolExecutor para descargas paralelas
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    futures = {}
-                    pages_processed = 0
-
-                    # Procesar primera página
-                    page_data = self.extract_jurisprudence_data(response.text)
-                    self.all_results.extend(page_data)
-
-                    # Programar descargas de la primera página
-                    for record in page_data:
-                        future = executor.submit(self.download_pdf_worker, record)
-                        futures[future] = record['id']
-
-                    pages_processed += 1
-                    self.logger.info(f"📄 Página 1: {len(page_data)} registros")
-
-                    # Navegar por páginas restantes
-                    consecutive_empty_pages = 0  # Contador de páginas vacías consecutivas
-                    max_empty_pages = 3  # Máximo de páginas vacías antes de terminar
-
-                    while len(self.all_results) < total_results:
-                        # Verificar cancelación
-                        if cancel_event and cancel_event.is_set():
-                            self.logger.info("🛑 Proceso cancelado por el usuario")
-                            break
-
-                        # Navegar a siguiente página
-                        success, html = self.navigate_to_next(self.viewstate)
-
-                        if not success:
-                            self.logger.error(f"Error navegando a página {pages_processed + 1}")
-                            consecutive_empty_pages += 1
-                            if consecutive_empty_pages >= max_empty_pages:
-                                self.logger.error(
-                                    f"❌ {max_empty_pages} páginas consecutivas sin datos. Terminando navegación.")
-                                break
-                            continue
-
-                        # Extraer datos con número de página
-                        page_data = self.extract_jurisprudence_data(html, pages_processed + 1)
-
-                        if not page_data:
-                            self.logger.warning(f"⚠️ Sin datos en página {pages_processed + 1}")
-                            consecutive_empty_pages += 1
-
-                            if consecutive_empty_pages >= max_empty_pages:
-                                self.logger.error(
-                                    f"❌ {max_empty_pages} páginas consecutivas sin datos. Terminando navegación.")
-                                break
-
-                            # Intentar continuar con la siguiente página
-                            pages_processed += 1
-                            time.sleep(1.5)  # Pausa más larga en páginas vacías
-                            continue
-                        else:
-                            # Resetear contador si encontramos datos
-                            consecutive_empty_pages = 0
-                            self.all_results.extend(page_data)
-
-                            # Programar descargas
-                            for record in page_data:
-                                future = executor.submit(self.download_pdf_worker, record)
-                                futures[future] = record['id']
-
-                            pages_processed += 1
-                            self.logger.info(
-                                f"📄 Página {pages_processed}: {len(page_data)} registros, "
-                                f"Total: {len(self.all_results)}/{total_results}"
-                            )
-
-                        # Guardar progreso cada 50 registros
-                        if len(self.all_results) % 50 == 0:
-                            self.save_results(self.all_results)
-
-                        # Pausa entre navegación
-                        time.sleep(0.8)
-
-                    # Esperar descargas pendientes
-                    self.logger.info("\n⏳ Esperando descargas pendientes...")
-                    completed = 0
-                    for future in as_completed(futures):
-                        completed += 1
-                        doc_id = futures[future]
-
-                        try:
-                            success, msg = future.result()
-                            if not success:
-                                self.logger.warning(f"Descarga fallida {doc_id}: {msg}")
-                        except Exception as e:
-                            self.logger.error(f"Excepción en descarga {doc_id}: {e}")
-
-                        if completed % 10 == 0:
-                            self.logger.info(f"Progreso descargas: {completed}/{len(futures)}")
+            if self.strategy == 'particionada':
+                self._collect_partitioned(search_params, fecha_ini, fecha_fin, found_results, partitions,
+                                          download_pdfs, max_results, max_workers,
+                                          max_pending_downloads, cancel_event)
+                records_seen = sum(p['resultados_recolectados'] for p in self.partition_stats)
 
             else:
-                # Solo recolectar metadatos sin descargar
-                page_data = self.extract_jurisprudence_data(response.text, 1)  # Página 1
-                self.all_results.extend(page_data)
-                pages_processed = 1
-                consecutive_empty_pages = 0
-
-                while len(self.all_results) < total_results:
-                    if cancel_event and cancel_event.is_set():
-                        break
+                # Cola acotada: la navegación se pausa si las descargas se quedan atrás
+                executor = None
+                if download_pdfs:
+                    self.download_executor = BoundedExecutor(max_workers, max_pending_downloads,
+                                                             thread_name_prefix='csj-descarga')
+                    self.downloads_done = 0
+                    executor = self.download_executor
+
+                try:
+                    # Primera página: su tamaño sirve para los saltos y para detectar el final
+                    page_data, page_size = self.parse_page(response.text, 1)
+                    page_data = self._within_limit(page_data, total_results)
+                    self._add_results(page_data)
+                    if executor is not None:
+                        self._submit_downloads(executor, page_data, cancel_event)
+                    pages_processed = 1
+                    records_seen = page_size
+                    self._page_done('principal', pages_processed)
+                    self.logger.info(f"📄 Página 1: {len(page_data)} registros")
 
-                    success, html = self.navigate_to_next(self.viewstate)
-                    if not success:
-                        consecutive_empty_pages += 1
-                        if consecutive_empty_pages >= 3:
-                            break
-                        continue
-
-                    page_data = self.extract_jurisprudence_data(html, pages_processed + 1)
-                    if page_data:
-                        consecutive_empty_pages = 0
-                        self.all_results.extend(page_data)
-                        pages_processed += 1
-                        self.logger.info(f"Página {pages_processed}: {len(page_data)} registros")
-                    else:
-                        consecutive_empty_pages += 1
-                        if consecutive_empty_pages >= 3:
-                            self.logger.error("3 páginas consecutivas sin datos. Terminando.")
-                            break
-                        pages_processed += 1
-
-                    time.sleep(0.5)
+                    # Reanudación: registros ya recolectados y salto a la página del checkpoint
+                    if executor is not None:
+                        self._submit_downloads(executor, self.restored_records, cancel_event)
+                    skipped = None
+                    if len(self.all_results) < total_results:
+                        skipped = self._skip_to_checkpoint('principal', self.session, self.viewstate, page_size)
+                    if skipped:
+                        pages_processed, html, self.viewstate = skipped
+                        page_data, page_records = self.parse_page(html, pages_processed)
+                        records_seen = (pages_processed - 1) * page_size + page_records
+                        page_data = self._within_limit(page_data, total_results)
+                        self._add_results(page_data)
+                        if executor is not None:
+                            self._submit_downloads(executor, page_data, cancel_event)
+                        self._page_done('principal', pages_processed)
+
+                    records_seen += self._collect_sequential(pages_processed, page_size, found_results,
+                                                             total_results, executor, cancel_event)
+                finally:
+                    if executor is not None:
+                        self.logger.info("\n⏳ Esperando descargas pendientes...")
+                        executor.shutdown(wait=True)
 
             # Fase 4: Guardar resultados finales
             self.logger.info("\n💾 FASE 4: Guardando resultados finales...")
             self.save_results(self.all_results)
 
-            # Generar reporte final
+            # Generar reporte final (la navegación pudo cortarse antes del total)
+            reached_end = len(self.all_results) >= total_results or records_seen >= found_results
+            if not (cancel_event and cancel_event.is_set()) and reached_end:
+                run_state = 'completado'
+                # Solo las ejecuciones completas pasan al historial: una reanudación
+                # debe volver a ver los IDs de las páginas ya recorridas
+                self.id_index.save()
+                # La marca exige además haber visto todo el rango (no solo max_results)
+                if self.watermark is not None and records_seen >= found_results:
+                    self.watermark.save()
+                    self.logger.info(f"🔖 Marca de sincronización guardada: {self.watermark.new_mark}")
             report = self.generate_final_report(self.all_results, start_time)
+            self.download_stats.close()
 
             # Logging final
             elapsed_time = (datetime.now() - start_time).total_seconds()
@@ -603,6 +1107,190 @@ class JudicialScraperV2:
             self.logger.error(f"❌ Error crítico: {e}", exc_info=True)
             return None
 
+        finally:
+            # Siempre dejar un checkpoint con el estado final de esta ejecución
+            self.checkpoint.save(self._checkpoint_state(run_state))
+
+    def _narrow_to_watermark(self, search_params: dict) -> Optional[dict]:
+        """
+        Adelantar la fecha inicial de la búsqueda hasta la marca de agua
+
+        Returns:
+            Parámetros con la fecha inicial ajustada, o None si el rango pedido
+            ya está sincronizado entero
+        """
+        date_fields = ('searchForm:fechaIniCal', 'searchForm:fechaFinCal')
+        self.watermark = Watermark('jurisprudencia', {k: v for k, v in search_params.items()
+                                                      if k not in date_fields})
+        start = self.watermark.narrow(iso_date(self._parse_date(search_params.get(date_fields[0]))),
+                                      iso_date(self._parse_date(search_params.get(date_fields[1]))))
+        if start is None:
+            self.logger.info(f"🔖 Rango ya sincronizado hasta {self.watermark.mark}: nada que buscar")
+            return None
+        if not self.watermark.narrowed:
+            return search_params
+
+        fecha_ini = datetime.strptime(start, '%Y-%m-%d').strftime(DATE_FORMAT)
+        self.logger.info(f"🔖 Sincronización: buscando desde la marca {fecha_ini}")
+        return {**search_params, date_fields[0]: fecha_ini}
+
+    def _checkpoint_state(self, state: str = 'en_progreso') -> Dict[str, any]:
+        """
+        Parámetros y página alcanzada por cada recorrido
+
+        El estado de descarga de cada registro no va aquí: ya queda en el JSONL
+        incremental (una línea por cambio) y se reconstruye de él al reanudar,
+        así que guardar no depende del número de registros.
+        """
+        with self.results_lock:
+            pages = dict(self.pages_reached)
+
+        # Las páginas de la ejecución anterior siguen valiendo aunque esta aún
+        # no haya vuelto a pasar por ellas
+        for key, page in self.resume_pages.items():
+            pages[key] = max(pages.get(key, 0), page)
+
+        return {
+            'timestamp': self.timestamp,
+            'estado': state,
+            'parametros': self.run_params,
+            'paginas': pages
+        }
+
+    def _page_done(self, key: str, page: int):
+        """Registrar la página alcanzada por un recorrido y guardar el checkpoint si toca"""
+        with self.results_lock:
+            self.pages_reached[key] = page
+        target = self.resume_pages.get(key, 0)
+        if page < target:
+            self.logger.info(f"⏩ Avanzando hasta la página {target} del checkpoint ({key}: {page})")
+        self.checkpoint.page_done(self._checkpoint_state)
+
+    def _load_checkpoint(self):
+        """Cargar páginas del checkpoint y estado de descargas del JSONL de la ejecución interrumpida"""
+        state = self.checkpoint.load()
+        if not state:
+            self.logger.warning("⚠️ No hay checkpoint válido: se empieza desde la página 1")
+            return
+
+        self.resume_pages = state.get('paginas', {})
+        self._restore_previous_records()
+        completed = sum(1 for d in self.resume_downloads.values() if d.get('estado_descarga') == 'completado')
+        self.logger.info(f"♻️ Reanudando {self.timestamp}: páginas {self.resume_pages}, "
+                         f"{len(self.resume_downloads)} registros ({completed} descargados)")
+
+    def _restore_previous_records(self):
+        """
+        Recuperar del JSONL los registros de la ejecución anterior (última
+        versión de cada uno, con su estado de descarga), para que la
+        reanudación pueda saltar sus páginas en lugar de volver a parsearlas
+        """
+        records = [r for r in self.results_writer.read_existing() if r.get('id')]
+        self.resume_downloads = {r['id']: r for r in records}
+        for record in records:
+            self.id_index.add_if_new(record['id'])
+            if self.watermark is not None:
+                self.watermark.observe(record['id'], iso_date(record.get('fecha')))
+        with self.results_lock:
+            self.all_results.extend(records)
+        self.results_writer.restore(records)
+        self.restored_records = records
+        self.logger.info(f"♻️ {len(records)} registros recuperados de {self.results_writer.jsonl_path}")
+
+    def _skip_to_checkpoint(self, key: str, session, viewstate: str, page_size: int):
+        """
+        Saltar a la última página del checkpoint para el recorrido `key`
+
+        Solo si sus registros se recuperaron del JSONL (si no, hay que volver a
+        recorrer las páginas para reconstruirlos).
+
+        Returns:
+            (página, html, ViewState) o None si no hay que saltar o el salto falla
+        """
+        target = self.resume_pages.get(key, 0) if self.restored_records else 0
+        if target <= 1 or not page_size:
+            return None
+
+        success, html, viewstate = self.go_to_page(session, viewstate, target, page_size)
+        if not success:
+            self.logger.warning(f"⚠️ No se pudo llegar a la página {target} ({key}): se sigue desde la actual")
+            return None
+        return target, html, viewstate
+
+    def _restore_from_checkpoint(self, record: Dict) -> bool:
+        """Marcar como completado un registro cuyo PDF del checkpoint sigue en disco y es válido"""
+        previous = self.resume_downloads.get(record['id'])
+        if not previous or previous.get('estado_descarga') != 'completado' or not previous.get('nombre_archivo'):
+            return False
+
+        file_size = validate_existing_file(self.pdf_dir / previous['nombre_archivo'])
+        if file_size is None:
+            return False
+
+        with self.results_lock:
+            record['nombre_archivo'] = previous['nombre_archivo']
+            record['estado_descarga'] = 'completado'
+            record['tamaño_archivo'] = file_size
+            record['fecha_descarga'] = record.get('fecha_descarga') or datetime.now().isoformat()
+            self.resumed_skipped += 1
+        self.logger.debug(f"⏭️ Ya descargado: {previous['nombre_archivo']}")
+        return True
+
+    def resume_from_checkpoint(self, cancel_event=None) -> Optional[List[Dict]]:
+        """Reanudar esta ejecución con los parámetros guardados en su checkpoint"""
+        state = self.checkpoint.load()
+        if not state:
+            self.logger.error(f"No hay checkpoint en {self.log_dir}")
+            return None
+        return self.search_and_download_with_params(**state['parametros'], cancel_event=cancel_event,
+                                                    resume=True)
+
+    def _within_limit(self, page_data: List[Dict], total_results: int) -> List[Dict]:
+        """Recortar una página a lo que falta para `total_results` registros"""
+        with self.results_lock:
+            room = total_results - len(self.all_results)
+        return page_data[:max(room, 0)]
+
+    def _add_results(self, page_data: List[Dict]):
+        """Acumular los registros de una página y añadirlos a los archivos incrementales"""
+        with self.results_lock:
+            self.all_results.extend(page_data)
+        self.results_writer.append_page(page_data)
+
+    def _submit_downloads(self, executor: BoundedExecutor, records: List[Dict], cancel_event=None):
+        """Encolar las descargas de una página respetando el límite de pendientes"""
+        for record in records:
+            # Ejecución reanudada: el PDF ya está en disco y es válido
+            if self.resume_downloads and self._restore_from_checkpoint(record):
+                self.results_writer.update(record)
+                continue
+            future = executor.submit(self.download_pdf_worker, record, cancel_event=cancel_event)
+            if future is None:
+                return  # Cancelado mientras esperaba hueco
+            future.add_done_callback(
+                lambda f, record=record: self._on_download_done(f, record))
+
+    def _on_download_done(self, future, record: Dict):
+        """Registrar el resultado de una descarga sin retener el future"""
+        if future.cancelled():
+            return
+        doc_id = record['id']
+        try:
+            success, msg = future.result()
+            if not success:
+                self.logger.warning(f"Descarga fallida {doc_id}: {msg}")
+        except Exception as e:
+            self.logger.error(f"Excepción en descarga {doc_id}: {e}")
+        self.results_writer.update(record)
+
+        with self.results_lock:
+            self.downloads_done += 1
+            completed = self.downloads_done
+        if completed % 10 == 0:
+            stats = self.download_executor.get_stats()
+            self.logger.info(f"Progreso descargas: {completed}/{stats['tareas_enviadas']} "
+                             f"(en cola: {stats['pendientes_actuales']})")
+
     def save_manifest(self, search_params: dict, total_results: int):
         """Guardar manifiesto inicial"""
         manifest = {
@@ -611,11 +1299,15 @@ class JudicialScraperV2:
             'parametros_busqueda': search_params,
             'total_resultados_esperados': total_results,
             'estado': 'iniciado',
-            'estrategia': 'simple',
+            'estrategia': self.strategy,
+            'reanudado': bool(self.resume_pages or self.resume_downloads),
             'archivos_generados': {
                 'log': str(self.log_dir / 'descarga.log'),
+                'checkpoint': str(self.checkpoint.path),
                 'resultados_json': str(self.log_dir / 'resultados_completos.json'),
-                'resultados_csv': str(self.log_dir / f'jurisprudencia_{self.timestamp}.csv'),
+                'resultados_jsonl': str(self.results_writer.jsonl_path),
+                'resultados_csv': str(self.results_writer.csv_path),
+                'progreso': str(self.results_writer.progress_path),
                 'carpeta_pdfs': str(self.pdf_dir)
             }
         }
@@ -627,27 +1319,9 @@ class JudicialScraperV2:
         self.logger.info(f"📋 Manifiesto guardado en: {manifest_path}")
 
     def save_results(self, results: List[Dict]):
-        """Guardar resultados en JSON y CSV"""
-        # JSON completo
-        json_path = self.log_dir / 'resultados_completos.json'
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-
-        # CSV
-        if results:
-            csv_path = self.log_dir / f'jurisprudencia_{self.timestamp}.csv'
-            csv_fields = [
-                'id', 'numero_providencia', 'numero_proceso', 'fecha',
-                'ponente', 'tipo_providencia', 'clase_actuacion',
-                'tema', 'nombre_archivo', 'estado_descarga', 'error',
-                'pagina_origen', 'intentos_descarga'  # NUEVOS CAMPOS
-            ]
-
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
-                writer.writeheader()
-                writer.writerows(results)
-
+        """Escribir las versiones finales del CSV (y del JSON completo si se quiere)"""
+        json_path = self.log_dir / 'resultados_completos.json' if self.save_full_json else None
+        self.results_writer.finalize(results, json_path)
         self.logger.debug(f"💾 Resultados guardados: {len(results)} registros")
 
     def generate_final_report(self, results: List[Dict], start_time: datetime) -> dict:
@@ -669,8 +1343,31 @@ class JudicialScraperV2:
                 'tasa_exito': f"{(total_descargados / total_recolectados * 100):.2f}%" if total_recolectados > 0 else "0%",
                 'tiempo_total_segundos': elapsed,
                 'tiempo_total_formateado': f"{int(elapsed // 60)}m {int(elapsed % 60)}s",
-                'estrategia_usada': 'simple'
+                'estrategia_usada': self.strategy
+            },
+            'particiones': self.partition_stats,
+            'indice_ids': self.id_index.get_stats(),
+            # GET inicial + búsqueda; los PDFs ya descargados los omite el almacén
+            'sincronizacion': self.watermark.get_stats(fixed_requests=1)
+            if self.watermark is not None else None,
+            'reanudacion': {
+                'reanudada': bool(self.resume_pages or self.resume_downloads),
+                'paginas_checkpoint': self.resume_pages,
+                'pdfs_ya_descargados': self.resumed_skipped,
+                'registros_recuperados': len(self.restored_records)
+            },
+            'navegacion': {
+                'salto_directo_soportado': self.page_jump_supported,
+                **self.jump_stats,
+                'paginas_parseadas': self.pipeline_stats['paginas_parseadas'],
+                'tiempo_parser_segundos': round(self.pipeline_stats['tiempo_parser_segundos'], 2),
+                'espera_navegador_segundos': round(self.pipeline_stats['espera_navegador_segundos'], 2)
             },
+            'conexiones_http': self.http.get_pool_stats(),
+            'limites_por_dominio': self.http.get_rate_stats(),
+            'deduplicacion': self.blob_store.get_stats(),
+            'estadisticas_descarga': self.download_stats.get_summary(),
+            'cola_descargas': self.download_executor.get_stats() if self.download_executor else None,
             'registros_con_error': [
                                        {
                                            'id': r['id'],
@@ -714,6 +1411,8 @@ class JudicialScraperV2:
         print(f"Total pendientes:   {total_pendientes}")
         print(f"Tasa de éxito:      {report['resumen']['tasa_exito']}")
         print(f"Tiempo total:       {report['resumen']['tiempo_total_formateado']}")
+        print(f"Conexiones reusadas: {report['conexiones_http']['handshakes_saved']}")
+        print(f"MB ahorrados (dedup): {report['deduplicacion']['mb_ahorrados']}")
         print("=" * 60)
 
         return report
\ No newline at end of file
@@ -0,0 +1,237 @@
+# scrapers/tesauro/benchmark_payload.py
+"""
+Benchmark del payload de búsqueda del Tesauro contra un Elasticsearch local
+
+Levanta un servidor local que imita `index_thesaurus/_search` (paginación
+from/size, `?pretty`, filtrado de `_source` e highlight con `no_match_size`)
+sobre documentos sintéticos con la estructura del índice real, incluido el
+texto completo en `documento_principal.contenido_archivo`. Compara:
+- anterior: `?pretty` y el `_source` completo, recortado en el cliente
+- actual: `build_search_query` (solo SOURCE_INCLUDES y extracto por highlight)
+
+Mide bytes por hit y páginas/seg (petición + JSON + extract_document_data) y
+verifica que ambos métodos producen los mismos registros.
+
+Uso:
+    python -m scrapers.tesauro.benchmark_payload
+    python -m scrapers.tesauro.benchmark_payload --docs 2000 --content-kb 120
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from scrapers.tesauro.scraper import CONTENT_FIELD, TesauroScraper
+
+PAGE_SIZE = 50
+
+
+def synthetic_document(n: int, content_kb: int) -> dict:
+    """Documento con los campos del índice y un texto completo de `content_kb` KB"""
+    paragraph = ('La Superintendencia de Sociedades, en ejercicio de funciones jurisdiccionales, '
+                 f'resuelve la controversia societaria número {n} conforme a la Ley 222 de 1995. ')
+    return {
+        'titulo': f'Sentencia {n} de 2023',
+        'id_relatoria': f'REL-{n:06d}',
+        'informacion': {
+            'tipo_contenido': 'Sentencia procedimiento mercantil',
+            'numero_radicado': f'2023-800-{n:05d}',
+            'fecha_sentencia': f'2023-{1 + n % 12:02d}-{1 + n % 28:02d}',
+            'consecutivo': str(n),
+            'numero_proceso': f'2023-01-{n:06d}',
+            'tramite': 'Proceso verbal',
+            'tema': 'Abuso del derecho de voto',
+            'ano_expediente': '2023',
+            'normatividad': 'Ley 1258 de 2008 art. 43',
+            'fecha_ultima_modificacion': '2024-01-15',
+            'campos_internos': {'indexado_por': 'pipeline', 'version': 3}
+        },
+        'documento_principal': {
+            'ruta_s3': f'tesauro/sentencias/2023/{n}.pdf',
+            'contenido_archivo': paragraph * (content_kb * 1024 // len(paragraph) + 1),
+            'paginas': 12
+        },
+        'descriptores': [{'descriptor_principal': 'Sociedades', 'descriptores_secundarios': ['Voto']}],
+        'fuentes_juridicas': [{'fuente': 'Ley 1258 de 2008', 'tipo': 'Ley'}],
+        'partes': [{'nombre': f'Sociedad {n} S.A.S.', 'rol': 'Demandante', 'tipo_doc': 'NIT',
+                    'numero_doc': f'900{n:06d}'}],
+        'anexos': [{'nombre': f'anexo_{i}.pdf', 'ruta_s3': f'tesauro/anexos/{n}_{i}.pdf'} for i in range(3)]
+    }
+
+
+def _pick(source: dict, path: str):
+    """Copiar `path` (con puntos) de source a un dict nuevo; None si no existe"""
+    head, _, rest = path.partition('.')
+    if head not in source:
+        return None
+    if not rest:
+        return {head: source[head]}
+    inner = _pick(source[head], rest) if isinstance(source[head], dict) else None
+    return {head: inner} if inner is not None else None
+
+
+def _merge(target: dict, part: dict):
+    for key, value in part.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _drop(source: dict, path: str):
+    head, _, rest = path.partition('.')
+    if head in source:
+        if not rest:
+            del source[head]
+        elif isinstance(source[head], dict):
+            _drop(source[head], rest)
+
+
+def filter_source(source: dict, spec) -> dict:
+    """Aplicar `_source` (includes/excludes) como Elasticsearch"""
+    if not spec:
+        return source
+    filtered = {}
+    for path in spec.get('includes', []):
+        part = _pick(source, path)
+        if part is not None:
+            _merge(filtered, part)
+    for path in spec.get('excludes', []):
+        _drop(filtered, path)
+    return filtered
+
+
+class StandInElasticsearch:
+    """Servidor local que responde búsquedas from/size sobre documentos sintéticos"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+
+    def search(self, query: dict) -> dict:
+        offset, size = query.get('from', 0), query.get('size', 10)
+        hits = []
+        for n, document in enumerate(self.documents[offset:offset + size], start=offset):
+            hit = {'_index': 'index_thesaurus', '_id': f'doc-{n}', '_score': 0.0,
+                   '_source': filter_source(document, query.get('_source'))}
+            fields = query.get('highlight', {}).get('fields', {})
+            if CONTENT_FIELD in fields:
+                # Sin términos que resaltar: no_match_size caracteres desde el inicio
+                text = document['documento_principal']['contenido_archivo']
+                hit['highlight'] = {CONTENT_FIELD: [text[:fields[CONTENT_FIELD]['no_match_size']]]}
+            hits.append(hit)
+        return {'took': 1, 'timed_out': False,
+                'hits': {'total': {'value': len(self.documents), 'relation': 'eq'}, 'hits': hits}}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                query = json.loads(self.rfile.read(length) or b'{}')
+                pretty = 'pretty' in urlparse(self.path).query
+                body = json.dumps(stand_in.search(query), ensure_ascii=False,
+                                  indent=2 if pretty else None).encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stand_in.lock:
+                    stand_in.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}/index_thesaurus/_search'
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+def current_query(scraper: TesauroScraper, size: int, offset: int) -> dict:
+    return scraper.build_search_query({}, size=size, from_offset=offset)
+
+
+def legacy_query(scraper: TesauroScraper, size: int, offset: int) -> dict:
+    """Query anterior: sin filtrado de _source ni highlight y con la agregación de tipos"""
+    query = scraper.build_search_query({}, size=size, from_offset=offset)
+    del query['_source']
+    del query['highlight']
+    query['aggregations'] = {
+        "contentType": {
+            "terms": {
+                "field": "informacion.tipo_contenido.keyword",
+                "size": 1000
+            }
+        }
+    }
+    return query
+
+
+def run(stand_in: StandInElasticsearch, url: str, build_query, total: int):
+    """Recorrer todas las páginas; devuelve registros, bytes recibidos y segundos"""
+    scraper = TesauroScraper.__new__(TesauroScraper)
+    session = requests.Session()
+    records = []
+    bytes_before = stand_in.bytes_sent
+
+    start = time.perf_counter()
+    for offset in range(0, total, PAGE_SIZE):
+        response = session.post(url, json=build_query(scraper, PAGE_SIZE, offset), timeout=60)
+        for hit in response.json()['hits']['hits']:
+            records.append(scraper.extract_document_data(hit['_source'], hit.get('highlight')))
+    elapsed = time.perf_counter() - start
+
+    session.close()
+    return records, stand_in.bytes_sent - bytes_before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=1000, help='Documentos en el índice local')
+    parser.add_argument('--content-kb', type=int, default=60, help='KB de texto completo por documento')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    documents = [synthetic_document(n, args.content_kb) for n in range(args.docs)]
+    pages = -(-args.docs // PAGE_SIZE)
+
+    results = {}
+    stand_in = StandInElasticsearch(documents)
+    with stand_in as url:
+        print(f"Documentos: {args.docs} | texto por documento: {args.content_kb} KB | "
+              f"páginas de {PAGE_SIZE}: {pages}")
+        print(f"{'método':<10} | {'MB recibidos':>12} | {'bytes/hit':>10} | {'tiempo (s)':>10} | {'páginas/seg':>11}")
+        print("-" * 66)
+
+        for name, build_query, suffix in (('anterior', legacy_query, '?pretty'), ('actual', current_query, '')):
+            records, received, elapsed = run(stand_in, url + suffix, build_query, args.docs)
+            results[name] = records
+            print(f"{name:<10} | {received / 1024 / 1024:>12.2f} | {received / max(len(records), 1):>10,.0f} | "
+                  f"{elapsed:>10.3f} | {pages / elapsed:>11.1f}")
+
+    mismatches = sum(1 for old, new in zip(results['anterior'], results['actual']) if old != new)
+    mismatches += abs(len(results['anterior']) - len(results['actual']))
+    print(f"Registros distintos entre métodos: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# scrapers/tesauro/facets.py
+"""
+Servicio de facetas del Tesauro
+La agregación de tipos de contenido (1000 buckets) se pide una sola vez y se
+comparte con caducidad entre la página de filtros, las vistas previas y los
+scrapers; las consultas de paginación ya no la incluyen. Las vistas previas
+usan una consulta de conteo (`track_total_hits`) con solo los primeros hits,
+sin crear un TesauroScraper (ni su carpeta de logs).
+
+La agregación se pide fuera del lock y una sola a la vez: mientras está en
+curso, quien no puede esperar (el render de la página) recibe los últimos
+buckets conocidos o ninguno.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from common.http_client import HTTPClient
+from scrapers.tesauro.scraper import (API_URL, CONTENT_TYPE_MAPPING, EXCERPT_HIGHLIGHT, HEADERS, SOURCE_EXCLUDES,
+                                      SOURCE_INCLUDES, TesauroScraper, build_filter_query)
+
+# Vigencia de la agregación en memoria (segundos)
+FACET_TTL = 30 * 60
+
+# Una página de filtros no debe quedarse colgada esperando al índice
+FACET_TIMEOUT = 10
+
+# Tras un fallo no se reintenta la agregación hasta pasado este tiempo
+FACET_RETRY = 60
+
+
+class TesauroFacetService:
+    """Facetas cacheadas y conteos ligeros sobre index_thesaurus"""
+
+    def __init__(self, http: Optional[HTTPClient] = None, ttl: float = FACET_TTL):
+        self.http = http or HTTPClient(headers=HEADERS)
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+
+        self.lock = threading.Lock()
+        self.buckets: Optional[List[Dict[str, any]]] = None
+        self.expires = 0.0
+        self.refreshing: Optional[threading.Event] = None  # Consulta en curso
+        self.stats = {'consultas_agregacion': 0, 'aciertos_cache': 0, 'conteos': 0}
+
+    def get_content_types(self, refresh: bool = False, wait: bool = True) -> List[Dict[str, any]]:
+        """
+        Buckets {key, doc_count} de informacion.tipo_contenido
+
+        Dentro de la vigencia se sirven de memoria. Si la consulta falla se
+        devuelven los últimos buckets conocidos aunque hayan caducado (o
+        ninguno) y no se reintenta hasta pasados FACET_RETRY segundos.
+
+        Args:
+            refresh: Pedir la agregación aunque la caché esté vigente
+            wait: Esperar a la consulta; con False se lanza en segundo plano
+                y se devuelve lo que haya
+        """
+        with self.lock:
+            if not refresh and self.buckets is not None and time.monotonic() < self.expires:
+                self.stats['aciertos_cache'] += 1
+                return self.buckets
+
+            pending = self.refreshing
+            owner = pending is None
+            if owner:
+                pending = self.refreshing = threading.Event()
+                self.stats['consultas_agregacion'] += 1
+            stale = self.buckets
+
+        if not wait:
+            if owner:
+                threading.Thread(target=self._refresh, args=(pending,),
+                                 name='tesauro-facetas', daemon=True).start()
+            return stale or []
+
+        if owner:
+            self._refresh(pending)
+        else:
+            pending.wait()
+
+        with self.lock:
+            return self.buckets or []
+
+    def _refresh(self, pending: threading.Event):
+        """Pedir la agregación (sin el lock) y publicar el resultado"""
+        query = {
+            "size": 0,
+            "aggregations": {
+                "tipos": {
+                    "terms": {
+                        "field": "informacion.tipo_contenido.keyword",
+                        "size": 1000
+                    }
+                }
+            }
+        }
+
+        try:
+            response = self.http.session.post(API_URL, json=query, timeout=FACET_TIMEOUT)
+            response.raise_for_status()
+            buckets = response.json().get('aggregations', {}).get('tipos', {}).get('buckets', [])
+            with self.lock:
+                self.buckets = buckets
+                self.expires = time.monotonic() + self.ttl
+            self.logger.info(f"Facetas del tesauro actualizadas: {len(buckets)} tipos de contenido")
+        except Exception as e:
+            self.logger.error(f"Error obteniendo facetas del tesauro: {str(e)}")
+            with self.lock:
+                self.buckets = self.buckets or []
+                self.expires = time.monotonic() + FACET_RETRY
+        finally:
+            with self.lock:
+                self.refreshing = None
+            pending.set()
+
+    def get_filter_options(self, wait: bool = True) -> Dict[str, any]:
+        """Opciones de filtro con el número de documentos de cada tipo"""
+        buckets = self.get_content_types(wait=wait)
+        return {
+            'tipos_contenido': [bucket['key'] for bucket in buckets],
+            'conteos': {bucket['key']: bucket['doc_count'] for bucket in buckets}
+        }
+
+    def get_ui_counts(self, wait: bool = False) -> Dict[str, int]:
+        """
+        Documentos por tipo con las etiquetas del formulario (ver CONTENT_TYPE_MAPPING)
+
+        Por defecto no espera al índice: sirve para pintar la página al momento.
+        """
+        counts = self.get_filter_options(wait=wait)['conteos']
+        return {label: counts[api_name] for label, api_name in CONTENT_TYPE_MAPPING.items() if api_name in counts}
+
+    def count(self, filters: Dict[str, any], sample_size: int = 0) -> Dict[str, any]:
+        """
+        Total exacto de documentos para unos filtros
+
+        Con `sample_size=0` es un conteo puro; la vista previa pide además los
+        primeros documentos en la misma petición (solo los campos que se leen).
+
+        Returns:
+            {'total': int, 'documentos': [registros como los de extract_document_data]}
+        """
+        query = {
+            "query": build_filter_query(filters),
+            "size": sample_size,
+            "track_total_hits": True
+        }
+        if sample_size:
+            query['_source'] = {"includes": SOURCE_INCLUDES, "excludes": SOURCE_EXCLUDES}
+            query['highlight'] = EXCERPT_HIGHLIGHT
+
+        with self.lock:
+            self.stats['conteos'] += 1
+        response = self.http.session.post(API_URL, json=query, timeout=FACET_TIMEOUT)
+        response.raise_for_status()
+        hits = response.json().get('hits', {})
+
+        documents = []
+        for hit in hits.get('hits', []):
+            record = TesauroScraper.extract_document_data(hit['_source'], hit.get('highlight'))
+            record['_id'] = hit['_id']
+            documents.append(record)
+
+        return {'total': hits.get('total', {}).get('value', 0), 'documentos': documents}
+
+    def get_stats(self) -> Dict[str, any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['tipos_en_cache'] = len(self.buckets or [])
+            stats['segundos_para_caducar'] = max(0, round(self.expires - time.monotonic())) if self.buckets is not None else 0
+            return stats
+
+
+_service: Optional[TesauroFacetService] = None
+_service_lock = threading.Lock()
+
+
+def get_facet_service() -> TesauroFacetService:
+    """Instancia compartida por la aplicación y los scrapers"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TesauroFacetService()
+        return _service
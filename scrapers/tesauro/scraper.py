@@ -3,23 +3,47 @@
 Scraper principal del Tesauro Jurídico
 Versión actualizada con módulo de descarga mejorado
 """
-import requests
+import asyncio
 import json
+import queue
 import time
-import csv
 from datetime import datetime
 from pathlib import Path
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
 # Importar el módulo de descarga
 # Import desde common
-from common.pdf_downloader import PDFDownloader
+from common.async_downloader import AsyncDownloadEngine
+from common.bounded_executor import BoundedExecutor
+from common.download_stats import DownloadStats
+from common.http_client import HTTPClient
+from common.pdf_downloader import SIGN_WORKERS, PDFDownloader
+from common.results_writer import IncrementalResultsWriter
+from common.watermark import Watermark, iso_date
 
 # Configuración
 BASE_URL = "https://tesauro.supersociedades.gov.co"
-API_URL = "https://admin.es.prod.ssociedades.nuvu.cc/index_thesaurus/_search"
+ES_URL = "https://admin.es.prod.ssociedades.nuvu.cc"
+INDEX_NAME = "index_thesaurus"
+API_URL = f"{ES_URL}/{INDEX_NAME}/_search"
+SEARCH_URL = f"{ES_URL}/_search"  # Búsquedas con PIT: el índice va implícito en el PIT
+PIT_URL = f"{ES_URL}/{INDEX_NAME}/_pit"
+SCROLL_URL = f"{ES_URL}/_search/scroll"
+
+# Paginación profunda: vida del point-in-time / scroll entre páginas (con
+# margen: la búsqueda espera a las descargas) y cortes (slices) en paralelo
+KEEP_ALIVE = '5m'
+SEARCH_SLICES = 4
+
+# from + size no puede superar index.max_result_window (10.000 por defecto)
+MAX_RESULT_WINDOW = 10000
+
+# Respuestas con las que el endpoint indica que no admite PIT/scroll
+UNSUPPORTED_STATUS = {400, 403, 404, 405, 501}
+UNSUPPORTED = 'no_soportado'
 
 # Headers comunes
 HEADERS = {
@@ -37,6 +61,32 @@ HEADERS = {
     'sec-fetch-site': 'cross-site'
 }
 
+# Campos de _source que lee extract_document_data. El texto completo del
+# documento (contenido_archivo) nunca viaja: el extracto llega como highlight
+SOURCE_INCLUDES = [
+    'titulo', 'id_relatoria',
+    'informacion.tipo_contenido', 'informacion.numero_radicado', 'informacion.fecha_sentencia',
+    'informacion.consecutivo', 'informacion.numero_proceso', 'informacion.tramite', 'informacion.tema',
+    'informacion.ano_expediente', 'informacion.normatividad', 'informacion.fecha_ultima_modificacion',
+    'documento_principal.ruta_s3',
+    'descriptores', 'fuentes_juridicas', 'partes'
+]
+SOURCE_EXCLUDES = ['documento_principal.contenido_archivo']
+CONTENT_FIELD = 'documento_principal.contenido_archivo'
+EXCERPT_LENGTH = 500
+
+# Sin texto de búsqueda no hay coincidencias: no_match_size devuelve el
+# inicio del campo, que es el extracto que guardamos
+EXCERPT_HIGHLIGHT = {
+    "fields": {
+        CONTENT_FIELD: {
+            "fragment_size": EXCERPT_LENGTH,
+            "number_of_fragments": 1,
+            "no_match_size": EXCERPT_LENGTH
+        }
+    }
+}
+
 # Mapeo de tipos de contenido entre UI y API
 CONTENT_TYPE_MAPPING = {
     "Conceptos jurídicos": "Conceptos jurídicos",
@@ -45,11 +95,92 @@ CONTENT_TYPE_MAPPING = {
     "Sentencias en formato video": "Sentencia en video"
 }
 
+# Columnas del CSV de resultados
+CSV_FIELDS = [
+    'titulo', 'tipo_contenido', 'numero_radicado', 'consecutivo',
+    'fecha_sentencia', 'numero_proceso', 'tramite', 'tema',
+    'normatividad', 'descriptores', 'fuentes_juridicas', 'partes',
+    'nombre_archivo', 'estado_descarga', 'error'
+]
+
+
+def build_filter_query(filters):
+    """Query bool con los filtros de la búsqueda (compartida por búsqueda, conteos y facetas)"""
+    clauses = []
+
+    # Agregar filtro de tipo de contenido
+    if filters.get('tipo_contenido'):
+        tipo_api = CONTENT_TYPE_MAPPING.get(filters['tipo_contenido'], filters['tipo_contenido'])
+        clauses.append({
+            "match": {
+                "informacion.tipo_contenido": {
+                    "query": tipo_api,
+                    "operator": "and"
+                }
+            }
+        })
+
+    # Agregar filtro de fechas
+    if filters.get('fecha_desde') or filters.get('fecha_hasta'):
+        date_filter = {"range": {"informacion.fecha_sentencia": {}}}
+
+        if filters.get('fecha_desde'):
+            date_filter['range']['informacion.fecha_sentencia']['gte'] = filters['fecha_desde']
+
+        if filters.get('fecha_hasta'):
+            date_filter['range']['informacion.fecha_sentencia']['lte'] = filters['fecha_hasta']
+
+        clauses.append(date_filter)
+
+    # Agregar otros filtros
+    if filters.get('numero_consecutivo'):
+        clauses.append({
+            "match": {
+                "informacion.consecutivo": {
+                    "query": filters['numero_consecutivo'],
+                    "operator": "and"
+                }
+            }
+        })
+
+    return {"bool": {"filter": clauses}}
+
+
+class HitStream:
+    """Cola acotada de páginas entre los cortes de búsqueda y el consumidor"""
+
+    def __init__(self, max_results=None, max_pages=8):
+        self.queue = queue.Queue(maxsize=max_pages)
+        self.max_results = max_results
+        self.count = 0
+        self.stop = threading.Event()       # No hacen falta más páginas (límite o abandono)
+        self.abandoned = threading.Event()  # El consumidor dejó de leer
+
+    def put(self, page):
+        """Encolar una página esperando hueco; se descarta si el consumidor se fue"""
+        while not self.abandoned.is_set():
+            try:
+                self.queue.put(page, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def get(self):
+        """Siguiente página, o None al terminar la búsqueda"""
+        return self.queue.get()
+
+    def close(self):
+        self.put(None)
+
+    def abandon(self):
+        self.abandoned.set()
+        self.stop.set()
+
 
 class TesauroScraper:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update(HEADERS)
+        self.http = HTTPClient(headers=HEADERS)
+        self.session = self.http.session
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_dir = Path(f"logs/tesauro_{self.timestamp}")
         self.pdf_dir = Path("descargas_tesauro")
@@ -60,6 +191,30 @@ class TesauroScraper:
         # Inicializar el descargador de PDFs
         self.pdf_downloader = PDFDownloader(session=self.session, pdf_dir=self.pdf_dir)
 
+        # Latencias y throughput de descarga (consultables en vivo)
+        self.download_stats = DownloadStats(self.log_dir, source='tesauro')
+
+        # Resultados en JSONL/CSV añadidos página a página, conteos en progreso.json
+        self.results_writer = IncrementalResultsWriter(self.log_dir, f'tesauro_resultados_{self.timestamp}.csv',
+                                                       CSV_FIELDS, key='_id')
+        self.save_full_json = True  # tesauro_resultados_<timestamp>.json al terminar
+
+        # Modo sincronización: marca de agua sobre fecha_sentencia
+        self.watermark = None
+        self.search_complete = False
+
+        # Estrategia de paginación usada en la última búsqueda (pit, scroll, from_size)
+        self.search_mode = None
+        self.search_slices = 1
+
+        # Conteos del flujo por páginas (no se guarda la lista de resultados)
+        self.content_types = Counter()
+        self.download_queue_stats = None
+
+        # Motor de la última ejecución ('threads' o 'asyncio', ver search_and_download)
+        self.download_engine = 'threads'
+        self.async_engine = None
+
     def setup_directories(self):
         """Crear directorios necesarios"""
         self.log_dir.mkdir(parents=True, exist_ok=True)
@@ -79,167 +234,314 @@ class TesauroScraper:
         self.logger = logging.getLogger(__name__)
 
     def get_filter_options(self):
-        """Obtener opciones disponibles para cada filtro"""
-        self.logger.info("Obteniendo opciones de filtros disponibles...")
-
-        query = {
-            "size": 0,
-            "aggregations": {
-                "tipos": {
-                    "terms": {
-                        "field": "informacion.tipo_contenido.keyword",
-                        "size": 1000
-                    }
-                }
-            }
+        """Obtener opciones disponibles para cada filtro (del servicio de facetas compartido)"""
+        from scrapers.tesauro.facets import get_facet_service  # facets importa este módulo
+
+        return get_facet_service().get_filter_options()
+
+    def build_search_query(self, filters, size=5, from_offset=0):
+        """Construir query de búsqueda con filtros (sin agregaciones: las da el servicio de facetas)"""
+        return {
+            "query": build_filter_query(filters),
+            "size": size,
+            "from": from_offset,
+            "_source": {
+                "includes": SOURCE_INCLUDES,
+                "excludes": SOURCE_EXCLUDES
+            },
+            "highlight": EXCERPT_HIGHLIGHT
         }
 
-        try:
-            response = self.session.post(
-                f"{API_URL}?pretty",
-                json=query,
-                timeout=30
-            )
+    def search_documents(self, filters, max_results=None, page_size=50, slices=None):
+        """Buscar documentos con filtros aplicados (todos en una lista; ver `iter_search_pages`)"""
+        return [record for page in self.iter_search_pages(filters, max_results, page_size, slices)
+                for record in page]
+
+    def iter_search_pages(self, filters, max_results=None, page_size=50, slices=None):
+        """
+        Páginas de registros según llegan de la búsqueda
+
+        Pagina con `search_after` sobre un point-in-time; si el endpoint no
+        permite abrir un PIT usa scroll y, como último recurso, from/size
+        (limitado a index.max_result_window). Con PIT o scroll la búsqueda se
+        reparte en `slices` cortes que se recorren en paralelo en un hilo
+        productor. Cada página ya está escrita en el JSONL/CSV al entregarse,
+        y la cola entre productor y consumidor está acotada: si el consumidor
+        (las descargas) va más lento, la búsqueda espera.
+        """
+        self.logger.info("Iniciando búsqueda con filtros:")
+        for k, v in filters.items():
+            if v:
+                self.logger.info(f"  {k}: {v}")
 
-            if response.status_code == 200:
-                data = response.json()
-                tipos = data.get('aggregations', {}).get('tipos', {}).get('buckets', [])
+        self.search_complete = False
+        if self.watermark:
+            self.watermark.record_page_size(page_size)
 
-                self.logger.info("Tipos de contenido encontrados:")
-                for tipo in tipos:
-                    self.logger.info(f"  - {tipo['key']} ({tipo['doc_count']} documentos)")
+        # Una vista previa cabe en la primera página: no merece cortes paralelos
+        if slices is None:
+            slices = 1 if max_results and max_results <= page_size else SEARCH_SLICES
+        self.search_slices = max(1, slices)
 
-                return {
-                    'tipos_contenido': [t['key'] for t in tipos]
-                }
+        stream = HitStream(max_results, max_pages=self.search_slices * 2)
+        producer = threading.Thread(target=self._run_search, args=(filters, page_size, stream),
+                                    name='tesauro-busqueda', daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                page = stream.get()
+                if page is None:
+                    break
+                yield page
+        finally:
+            # El consumidor puede abandonar antes del final: liberar al productor
+            stream.abandon()
+            producer.join()
+
+    def _run_search(self, filters, page_size, stream):
+        """Probar las estrategias de paginación en orden (hilo productor)"""
+        try:
+            for mode, strategy in (('pit', self._search_pit), ('scroll', self._search_scroll)):
+                outcome = strategy(filters, page_size, stream)
+                if outcome != UNSUPPORTED:
+                    self.search_mode = mode
+                    self.search_complete = outcome
+                    break
+                self.logger.info(f"El endpoint no admite {mode}; probando la siguiente estrategia")
             else:
-                self.logger.error(f"Error obteniendo opciones: HTTP {response.status_code}")
-                return {}
+                self.search_mode = 'from_size'
+                self.search_slices = 1
+                self.search_complete = self._search_from_size(filters, page_size, stream)
 
+            self.logger.info(f"Búsqueda completada ({self.search_mode}, {self.search_slices} cortes): "
+                             f"{stream.count} documentos encontrados")
         except Exception as e:
-            self.logger.error(f"Error obteniendo opciones: {str(e)}")
-            return {}
+            self.logger.error(f"Error en búsqueda: {str(e)}")
+        finally:
+            stream.close()
+
+    def _paging_query(self, filters, page_size, slice_id):
+        """Query de una página de PIT/scroll: sin offset y con su corte si hay varios"""
+        query = self.build_search_query(filters, size=page_size)
+        del query['from']
+        if self.search_slices > 1:
+            query['slice'] = {'id': slice_id, 'max': self.search_slices}
+        return query
 
-    def build_search_query(self, filters, size=5, from_offset=0):
-        """Construir query de búsqueda con filtros"""
-        query = {
-            "query": {
-                "bool": {
-                    "filter": []
-                }
-            },
-            "size": size,
-            "from": from_offset,
-            "aggregations": {
-                "contentType": {
-                    "terms": {
-                        "field": "informacion.tipo_contenido.keyword",
-                        "size": 1000
-                    }
-                }
-            }
-        }
+    def _post_search(self, session, url, body, params=None):
+        """POST de búsqueda contado para la marca de agua"""
+        response = session.post(url, params=params, json=body, timeout=30)
+        if self.watermark:
+            self.watermark.record_request()
+        return response
+
+    def _run_slices(self, worker, *args):
+        """
+        Recorrer todos los cortes en paralelo
+
+        Returns:
+            UNSUPPORTED si todos los cortes fallaron en su primera petición,
+            True si todos llegaron al final, False si alguno se interrumpió
+        """
+        if self.search_slices == 1:
+            outcomes = [worker(0, *args)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.search_slices) as executor:
+                outcomes = list(executor.map(lambda slice_id: worker(slice_id, *args), range(self.search_slices)))
+
+        if all(outcome == UNSUPPORTED for outcome in outcomes):
+            return UNSUPPORTED
+        return all(outcome is True for outcome in outcomes)
+
+    def _search_pit(self, filters, page_size, stream):
+        """search_after ordenado por _shard_doc sobre un point-in-time"""
+        try:
+            response = self.session.post(PIT_URL, params={'keep_alive': KEEP_ALIVE}, timeout=30)
+            if response.status_code != 200:
+                return UNSUPPORTED
+            pit_id = response.json()['id']
+        except Exception as e:
+            self.logger.info(f"No se pudo abrir el point-in-time: {str(e)}")
+            return UNSUPPORTED
 
-        # Agregar filtro de tipo de contenido
-        if filters.get('tipo_contenido'):
-            tipo_api = CONTENT_TYPE_MAPPING.get(filters['tipo_contenido'], filters['tipo_contenido'])
-            query['query']['bool']['filter'].append({
-                "match": {
-                    "informacion.tipo_contenido": {
-                        "query": tipo_api,
-                        "operator": "and"
-                    }
-                }
-            })
+        try:
+            return self._run_slices(self._pit_slice, filters, page_size, pit_id, stream)
+        finally:
+            try:
+                self.session.delete(f"{ES_URL}/_pit", json={'id': pit_id}, timeout=30)
+            except Exception:
+                pass  # El PIT caduca solo tras KEEP_ALIVE
 
-        # Agregar filtro de fechas
-        if filters.get('fecha_desde') or filters.get('fecha_hasta'):
-            date_filter = {"range": {"informacion.fecha_sentencia": {}}}
+    def _pit_slice(self, slice_id, filters, page_size, pit_id, stream):
+        session = self.http.thread_session()
+        search_after = None
 
-            if filters.get('fecha_desde'):
-                date_filter['range']['informacion.fecha_sentencia']['gte'] = filters['fecha_desde']
+        try:
+            while not stream.stop.is_set():
+                query = self._paging_query(filters, page_size, slice_id)
+                query['pit'] = {'id': pit_id, 'keep_alive': KEEP_ALIVE}
+                query['sort'] = [{'_shard_doc': 'asc'}]
+                if search_after is not None:
+                    query['search_after'] = search_after
+
+                response = self._post_search(session, SEARCH_URL, query)
+                if response.status_code != 200:
+                    if search_after is None and response.status_code in UNSUPPORTED_STATUS:
+                        return UNSUPPORTED
+                    self.logger.error(f"Error en búsqueda (corte {slice_id}): HTTP {response.status_code}")
+                    return False
 
-            if filters.get('fecha_hasta'):
-                date_filter['range']['informacion.fecha_sentencia']['lte'] = filters['fecha_hasta']
+                data = response.json()
+                pit_id = data.get('pit_id', pit_id)  # ES puede devolver un id renovado
+                hits = data.get('hits', {}).get('hits', [])
+                if not hits:
+                    return True
 
-            query['query']['bool']['filter'].append(date_filter)
+                self._collect_hits(hits, stream)
+                search_after = hits[-1]['sort']
+        except Exception as e:
+            self.logger.error(f"Error en búsqueda (corte {slice_id}): {str(e)}")
+        return False
 
-        # Agregar otros filtros
-        if filters.get('numero_consecutivo'):
-            query['query']['bool']['filter'].append({
-                "match": {
-                    "informacion.consecutivo": {
-                        "query": filters['numero_consecutivo'],
-                        "operator": "and"
-                    }
-                }
-            })
+    def _search_scroll(self, filters, page_size, stream):
+        """Scroll ordenado por _doc (orden de índice, el más barato)"""
+        return self._run_slices(self._scroll_slice, filters, page_size, stream)
 
-        return query
+    def _scroll_slice(self, slice_id, filters, page_size, stream):
+        session = self.http.thread_session()
+        scroll_id = None
 
-    def search_documents(self, filters, max_results=None, page_size=50):
-        """Buscar documentos con filtros aplicados"""
-        self.logger.info("Iniciando búsqueda con filtros:")
-        for k, v in filters.items():
-            if v:
-                self.logger.info(f"  {k}: {v}")
+        try:
+            query = self._paging_query(filters, page_size, slice_id)
+            query['sort'] = ['_doc']
+            response = self._post_search(session, API_URL, query, params={'scroll': KEEP_ALIVE})
+
+            while True:
+                if response.status_code != 200:
+                    if scroll_id is None and response.status_code in UNSUPPORTED_STATUS:
+                        return UNSUPPORTED
+                    self.logger.error(f"Error en scroll (corte {slice_id}): HTTP {response.status_code}")
+                    return False
 
-        all_results = []
+                data = response.json()
+                scroll_id = data.get('_scroll_id', scroll_id)
+                hits = data.get('hits', {}).get('hits', [])
+                if not hits:
+                    return True
+
+                self._collect_hits(hits, stream)
+                if stream.stop.is_set():
+                    return False
+
+                response = self._post_search(session, SCROLL_URL, {'scroll': KEEP_ALIVE, 'scroll_id': scroll_id})
+        except Exception as e:
+            self.logger.error(f"Error en scroll (corte {slice_id}): {str(e)}")
+            return False
+        finally:
+            if scroll_id:
+                try:
+                    session.delete(SCROLL_URL, json={'scroll_id': scroll_id}, timeout=30)
+                except Exception:
+                    pass  # El contexto caduca solo tras KEEP_ALIVE
+
+    def _search_from_size(self, filters, page_size, stream):
+        """
+        Paginación from/size (solo si el endpoint no admite PIT ni scroll)
+
+        Pide `track_total_hits` para que el total no quede topado en 10.000
+        (relation 'gte'); si aun así el total no es exacto se sigue hasta una
+        página vacía. Llegar a index.max_result_window con resultados
+        pendientes deja la búsqueda incompleta: la marca de agua no avanza.
+        """
         offset = 0
+        received = 0
 
         while True:
-            query = self.build_search_query(filters, size=page_size, from_offset=offset)
+            size = min(page_size, MAX_RESULT_WINDOW - offset)
+            if size <= 0:
+                self.logger.warning(f"from/size no llega más allá de {MAX_RESULT_WINDOW} resultados: "
+                                    f"búsqueda truncada")
+                return False
+
+            query = self.build_search_query(filters, size=size, from_offset=offset)
+            query['track_total_hits'] = True
 
             try:
-                response = self.session.post(
-                    f"{API_URL}?pretty",
-                    json=query,
-                    timeout=30
-                )
+                response = self._post_search(self.session, API_URL, query)
 
                 if response.status_code != 200:
                     self.logger.error(f"Error en búsqueda: HTTP {response.status_code}")
-                    break
+                    return False
 
                 data = response.json()
                 hits = data.get('hits', {}).get('hits', [])
-                total = data.get('hits', {}).get('total', {}).get('value', 0)
+                total_info = data.get('hits', {}).get('total', {})
+                total = total_info.get('value', 0)
+                exact = total_info.get('relation', 'eq') == 'eq'
 
                 if not hits:
-                    break
-
-                # Procesar resultados
-                for hit in hits:
-                    doc = hit['_source']
-                    result = self.extract_document_data(doc)
-                    result['_id'] = hit['_id']
-                    result['_score'] = hit.get('_score', 0)
-                    all_results.append(result)
+                    return True
 
-                self.logger.info(f"Procesados {len(all_results)} de {total} documentos")
+                self._collect_hits(hits, stream)
+                received += len(hits)
 
                 # Verificar límites
-                if max_results and len(all_results) >= max_results:
-                    all_results = all_results[:max_results]
-                    break
+                if stream.stop.is_set():
+                    return False
 
-                if len(all_results) >= total:
-                    break
+                if exact and received >= total:
+                    return True
 
-                offset += page_size
-                time.sleep(0.5)  # Pausa entre páginas
+                offset += len(hits)
 
             except Exception as e:
                 self.logger.error(f"Error en búsqueda: {str(e)}")
-                break
-
-        self.logger.info(f"Búsqueda completada: {len(all_results)} documentos encontrados")
-        return all_results
-
-    def extract_document_data(self, doc):
-        """Extraer datos relevantes de un documento"""
+                return False
+
+    def _collect_hits(self, hits, stream):
+        """Extraer una página de hits, escribirla y entregarla al consumidor (seguro entre cortes)"""
+        page_results = []
+        for hit in hits:
+            doc = hit['_source']
+            result = self.extract_document_data(doc, hit.get('highlight'))
+            # Documento de la fecha de la marca ya sincronizado
+            if self.watermark and not self.watermark.accept(hit['_id'], iso_date(result['fecha_sentencia'])):
+                continue
+            result['_id'] = hit['_id']
+            result['_score'] = hit.get('_score') or 0  # null con orden explícito
+            page_results.append(result)
+
+        with self.results_lock:
+            if stream.stop.is_set():
+                return
+            if stream.max_results:
+                page_results = page_results[:stream.max_results - stream.count]
+            stream.count += len(page_results)
+            self.results_writer.append_page(page_results)
+            if stream.max_results and stream.count >= stream.max_results:
+                stream.stop.set()
+
+            self.logger.info(f"Procesados {stream.count} documentos")
+
+        # Fuera del lock: puede esperar a que el consumidor libere la cola
+        if page_results:
+            stream.put(page_results)
+
+    @staticmethod
+    def extract_document_data(doc, highlight=None):
+        """
+        Extraer datos relevantes de un documento
+
+        Args:
+            doc: _source del hit (solo SOURCE_INCLUDES)
+            highlight: Fragmentos del hit; el de CONTENT_FIELD es el extracto.
+                Si el _source trae el texto completo se recorta aquí
+        """
         info = doc.get('informacion', {})
         doc_principal = doc.get('documento_principal', {})
+        fragments = (highlight or {}).get(CONTENT_FIELD)
+        contenido = fragments[0] if fragments else doc_principal.get('contenido_archivo', '')[:EXCERPT_LENGTH]
 
         result = {
             'titulo': doc.get('titulo', ''),
@@ -254,8 +556,7 @@ class TesauroScraper:
             'normatividad': info.get('normatividad', ''),
             'fecha_ultima_modificacion': info.get('fecha_ultima_modificacion', ''),
             'ruta_pdf': doc_principal.get('ruta_s3', ''),
-            'contenido_archivo': doc_principal.get('contenido_archivo', '')[:500] + '...' if doc_principal.get(
-                'contenido_archivo') else '',
+            'contenido_archivo': contenido + '...' if contenido else '',
             'id_relatoria': doc.get('id_relatoria', ''),
             'descriptores': [],
             'fuentes_juridicas': [],
@@ -297,83 +598,106 @@ class TesauroScraper:
     def download_pdf_worker(self, record):
         """Worker para descargar un PDF usando el módulo PDFDownloader"""
         if not record.get('ruta_pdf'):
-            with self.results_lock:
-                record['estado_descarga'] = 'sin_pdf'
-            return False, "No hay PDF disponible"
+            return self._record_without_pdf(record)
 
+        start = time.monotonic()
         try:
-            s3_path = record['ruta_pdf']
-
             # Usar el módulo de descarga con reintentos, pasando los datos para el nombre
             result = self.pdf_downloader.download_with_retry(
-                s3_path,
+                record['ruta_pdf'],
                 max_retries=3,
                 numero_radicado=record.get('numero_radicado'),
                 fecha_sentencia=record.get('fecha_sentencia')
             )
+        except Exception as e:
+            return self._record_download_error(record, e)
 
-            # Actualizar el registro con los resultados
-            with self.results_lock:
-                if result['success']:
-                    record['nombre_archivo'] = result['filename']
-                    record['estado_descarga'] = 'completado'
-                    record['tamaño_archivo'] = result['size']
-                    record['fecha_descarga'] = datetime.now().isoformat()
-
-                    return True, f"Descargado: {result['filename']}"
-                else:
-                    record['error'] = result['error']
-                    record['estado_descarga'] = 'error'
+        return self._record_download_result(record, result, time.monotonic() - start)
 
-                    return False, result['error']
+    async def download_pdf_worker_async(self, record):
+        """Versión de `download_pdf_worker` para el motor asyncio"""
+        loop = asyncio.get_running_loop()
+        if not record.get('ruta_pdf'):
+            return await loop.run_in_executor(None, self._record_without_pdf, record)
 
+        start = time.monotonic()
+        try:
+            result = await self.pdf_downloader.download_with_retry_async(
+                self.async_engine,
+                record['ruta_pdf'],
+                max_retries=3,
+                numero_radicado=record.get('numero_radicado'),
+                fecha_sentencia=record.get('fecha_sentencia')
+            )
         except Exception as e:
-            error_msg = f"Error inesperado: {str(e)}"
-            with self.results_lock:
-                record['error'] = error_msg
+            return await loop.run_in_executor(None, self._record_download_error, record, e)
+
+        # El JSONL y las estadísticas escriben en disco: fuera del event loop
+        return await loop.run_in_executor(None, self._record_download_result, record, result,
+                                          time.monotonic() - start)
+
+    def _record_without_pdf(self, record):
+        with self.results_lock:
+            record['estado_descarga'] = 'sin_pdf'
+        self.results_writer.update(record)
+        return False, "No hay PDF disponible"
+
+    def _record_download_result(self, record, result, elapsed):
+        """Actualizar el registro con el resultado de PDFDownloader"""
+        with self.results_lock:
+            if result['success']:
+                record['nombre_archivo'] = result['filename']
+                record['estado_descarga'] = 'completado'
+                record['tamaño_archivo'] = result['size']
+                record['fecha_descarga'] = datetime.now().isoformat()
+            else:
+                record['error'] = result['error']
                 record['estado_descarga'] = 'error'
-            self.logger.error(f"Error descargando {record.get('numero_radicado', 'N/A')}: {error_msg}")
-            return False, error_msg
-
-    def save_results(self, results):
-        """Guardar resultados en JSON y CSV"""
-        # JSON completo
-        json_path = self.log_dir / f'tesauro_resultados_{self.timestamp}.json'
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-
-        # CSV
-        if results:
-            csv_path = self.log_dir / f'tesauro_resultados_{self.timestamp}.csv'
-            csv_fields = [
-                'titulo', 'tipo_contenido', 'numero_radicado', 'consecutivo',
-                'fecha_sentencia', 'numero_proceso', 'tramite', 'tema',
-                'normatividad', 'descriptores', 'fuentes_juridicas', 'partes',
-                'nombre_archivo', 'estado_descarga', 'error'
-            ]
-
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
-                writer.writeheader()
-                writer.writerows(results)
-
-        self.logger.info(f"Resultados guardados: {len(results)} documentos")
 
-    def generate_report(self, results, filters, start_time):
-        """Generar reporte final"""
+        self.download_stats.update_download(record, result['success'], elapsed, result['size'])
+        self.results_writer.update(record)
+        if result['success']:
+            return True, f"Descargado: {result['filename']}"
+        return False, result['error']
+
+    def _record_download_error(self, record, error):
+        error_msg = f"Error inesperado: {str(error)}"
+        with self.results_lock:
+            record['error'] = error_msg
+            record['estado_descarga'] = 'error'
+        self.download_stats.update_download(record, False)
+        self.results_writer.update(record)
+        self.logger.error(f"Error descargando {record.get('numero_radicado', 'N/A')}: {error_msg}")
+        return False, error_msg
+
+    def _save_watermark(self):
+        """Avanzar la marca de agua solo si la búsqueda recorrió todo el rango"""
+        if self.search_complete:
+            self.watermark.save()
+            self.logger.info(f"Marca de sincronización guardada: {self.watermark.new_mark}")
+        else:
+            self.logger.info("Búsqueda incompleta: la marca de sincronización no avanza")
+
+    def save_results(self):
+        """Escribir las versiones finales del CSV (y del JSON completo si se quiere) desde el JSONL"""
+        json_path = self.log_dir / f'tesauro_resultados_{self.timestamp}.json' if self.save_full_json else None
+        total = self.results_writer.finalize_from_log(json_path)
+        self.logger.info(f"Resultados guardados: {total} documentos")
+
+    def generate_report(self, filters, start_time, download_pdfs=True):
+        """Generar reporte final (con los conteos del escritor incremental, sin la lista de resultados)"""
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
 
-        total_docs = len(results)
-        total_descargados = sum(1 for r in results if r['estado_descarga'] == 'completado')
-        total_errores = sum(1 for r in results if r['estado_descarga'] == 'error')
-        total_sin_pdf = sum(1 for r in results if r['estado_descarga'] == 'sin_pdf')
+        with self.results_writer.lock:
+            total_docs = len(self.results_writer.states)
+            estados = dict(self.results_writer.counts)
+        total_descargados = estados.get('completado', 0)
+        total_errores = estados.get('error', 0)
+        total_sin_pdf = estados.get('sin_pdf', 0)
 
         # Estadísticas por tipo de contenido
-        tipos_contenido = {}
-        for r in results:
-            tipo = r.get('tipo_contenido', 'Sin tipo')
-            tipos_contenido[tipo] = tipos_contenido.get(tipo, 0) + 1
+        tipos_contenido = dict(self.content_types)
 
         report = {
             'fecha_ejecucion': start_time.isoformat(),
@@ -387,9 +711,26 @@ class TesauroScraper:
                 'tasa_exito': f"{(total_descargados / total_docs * 100):.2f}%" if total_docs > 0 else "0%"
             },
             'por_tipo_contenido': tipos_contenido,
+            'paginacion_busqueda': {
+                'modo': self.search_mode,
+                'cortes_paralelos': self.search_slices,
+                'completa': self.search_complete
+            },
+            'motor_descargas': self.download_engine,
+            'cola_descargas': self.download_queue_stats,
+            'conexiones_http': self.http.get_pool_stats(),
+            'limites_por_dominio': self.http.get_rate_stats(),
+            'deduplicacion': self.pdf_downloader.blob_store.get_stats(),
+            'firma_urls': self.pdf_downloader.get_signing_stats(),
+            'estadisticas_descarga': self.download_stats.get_summary(),
+            # Con descarga, volver a recorrer todo firmaría de nuevo cada URL
+            'sincronizacion': self.watermark.get_stats(per_document=1 if download_pdfs else 0)
+            if self.watermark else None,
             'archivos_generados': {
                 'json': str(self.log_dir / f'tesauro_resultados_{self.timestamp}.json'),
-                'csv': str(self.log_dir / f'tesauro_resultados_{self.timestamp}.csv'),
+                'jsonl': str(self.results_writer.jsonl_path),
+                'csv': str(self.results_writer.csv_path),
+                'progreso': str(self.results_writer.progress_path),
                 'carpeta_pdfs': str(self.pdf_dir)
             }
         }
@@ -408,6 +749,8 @@ class TesauroScraper:
         print(f"Errores de descarga: {total_errores}")
         print(f"Sin PDF disponible:  {total_sin_pdf}")
         print(f"Tasa de éxito:       {report['resumen']['tasa_exito']}")
+        print(f"Conexiones reusadas: {report['conexiones_http']['handshakes_saved']}")
+        print(f"MB ahorrados (dedup): {report['deduplicacion']['mb_ahorrados']}")
         print("\nPor tipo de contenido:")
         for tipo, count in sorted(tipos_contenido.items(), key=lambda x: x[1], reverse=True):
             print(f"  {tipo}: {count}")
@@ -415,8 +758,24 @@ class TesauroScraper:
 
         return report
 
-    def search_and_download(self, filters, download_pdfs=True, max_results=None, max_workers=3):
-        """Función principal para buscar y descargar"""
+    def search_and_download(self, filters, download_pdfs=True, max_results=None, max_workers=3, sync=False,
+                            download_engine='threads'):
+        """
+        Función principal para buscar y descargar
+
+        Las páginas de la búsqueda se procesan en flujo: la primera descarga
+        empieza con la primera página y en memoria solo hay las páginas en
+        cola y los registros pendientes de descarga. Devuelve el número de
+        documentos encontrados (los registros quedan en el JSONL/CSV/JSON).
+
+        Con `sync`, la búsqueda empieza en la marca de agua de estos filtros
+        (fecha_sentencia más reciente ya sincronizada) y omite los documentos
+        de esa fecha ya vistos; la marca avanza al terminar una búsqueda completa.
+
+        `download_engine='asyncio'` descarga con AsyncDownloadEngine (aiohttp):
+        `max_workers` pasa a ser el número de descargas simultáneas, sin un
+        hilo por descarga, útil con cientos de URLs firmadas de S3.
+        """
         start_time = datetime.now()
 
         self.logger.info("=" * 60)
@@ -426,40 +785,66 @@ class TesauroScraper:
         self.logger.info(f"Descargar PDFs: {download_pdfs}")
         self.logger.info(f"Máximo resultados: {max_results if max_results else 'Sin límite'}")
         self.logger.info(f"Workers paralelos: {max_workers}")
-
-        # Buscar documentos
-        results = self.search_documents(filters, max_results)
-
-        if not results:
-            self.logger.warning("No se encontraron documentos con los filtros especificados")
-            return results
-
-        # Descargar PDFs si está habilitado
+        self.logger.info(f"Motor de descargas: {download_engine}")
+        self.download_engine = download_engine
+
+        # Una conexión por worker de descarga y de firma más una por corte de búsqueda
+        self.http.ensure_pool_size(max_workers + SIGN_WORKERS + SEARCH_SLICES)
+
+        if sync:
+            self.watermark = Watermark('tesauro', {k: v for k, v in filters.items()
+                                                   if k not in ('fecha_desde', 'fecha_hasta')})
+            desde = self.watermark.narrow(iso_date(filters.get('fecha_desde')), iso_date(filters.get('fecha_hasta')))
+            if desde is None:
+                self.logger.info(f"Rango ya sincronizado hasta {self.watermark.mark}: nada que consultar")
+                self.generate_report(filters, start_time, download_pdfs)
+                return 0
+            if desde:
+                filters = dict(filters, fecha_desde=desde)
+                self.logger.info(f"Sincronización: buscando desde {desde}")
+
+        # Cada página se escribe y pasa a la cola de descargas en cuanto llega;
+        # la cola acotada frena la búsqueda si las descargas van más lentas
         if download_pdfs:
-            self.logger.info(f"Iniciando descarga de PDFs con {max_workers} workers...")
+            self.logger.info(f"Descarga de PDFs con {max_workers} workers a medida que llegan las páginas")
+            self.pdf_downloader.start_prefetch()
 
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {}
+        if download_pdfs and download_engine == 'asyncio':
+            self.async_engine = AsyncDownloadEngine(max_concurrency=max_workers, per_host_limit=max_workers)
+            executor, worker = self.async_engine, self.download_pdf_worker_async
+        else:
+            executor = BoundedExecutor(max_workers, thread_name_prefix='tesauro-descarga')
+            worker = self.download_pdf_worker
 
-                for record in results:
-                    if record.get('ruta_pdf'):
-                        future = executor.submit(self.download_pdf_worker, record)
-                        futures[future] = record['numero_radicado']
-
-                # Esperar a que terminen
-                completed = 0
-                for future in as_completed(futures):
-                    completed += 1
-                    if completed % 10 == 0:
-                        self.logger.info(f"Progreso: {completed}/{len(futures)} descargas")
+        try:
+            with executor:
+                for page in self.iter_search_pages(filters, max_results):
+                    self.content_types.update(r.get('tipo_contenido', 'Sin tipo') for r in page)
+                    if not download_pdfs:
+                        continue
+
+                    with_pdf = [r for r in page if r.get('ruta_pdf')]
+                    # Firmar URLs por delante de los workers de descarga
+                    self.pdf_downloader.prefetch(r['ruta_pdf'] for r in with_pdf)
+                    for record in with_pdf:
+                        executor.submit(worker, record)
+            self.download_queue_stats = executor.get_stats()
+        finally:
+            self.pdf_downloader.stop_prefetch()
+
+        if not self.content_types:
+            self.logger.warning("No se encontraron documentos con los filtros especificados")
 
         # Guardar resultados
-        self.save_results(results)
+        self.save_results()
+        if self.watermark:
+            self._save_watermark()
 
         # Generar reporte
-        self.generate_report(results, filters, start_time)
+        report = self.generate_report(filters, start_time, download_pdfs)
+        self.download_stats.close()
 
-        return results
+        return report['resumen']['total_documentos']
 
 
 # Ejemplo de uso
@@ -473,7 +858,7 @@ if __name__ == "__main__":
         'fecha_hasta': '2025-07-24'
     }
 
-    results = scraper.search_and_download(
+    total = scraper.search_and_download(
         filters=filters,
         download_pdfs=True,  # Ahora funciona correctamente
         max_results=10,
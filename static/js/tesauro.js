@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', () => {
   // Inicializar componentes
   initializeDatePickers();
   initializeEventListeners();
+  loadTypeCounts();
 
   /**
    * Configurar selectores de fecha
@@ -55,6 +56,28 @@ document.addEventListener('DOMContentLoaded', () => {
     });
   }
 
+  /**
+   * Completar los conteos por tipo si la página se sirvió sin ellos
+   */
+  async function loadTypeCounts() {
+    const select = document.getElementById('tipo-contenido');
+    if (!select || select.dataset.conteosPendientes !== 'true') return;
+
+    try {
+      const response = await fetch('/tesauro/filter_options');
+      const data = await response.json();
+      const conteos = data.conteos_formulario || {};
+
+      Array.from(select.options).forEach(option => {
+        if (option.value && option.value in conteos) {
+          option.textContent = `${option.value} (${conteos[option.value]})`;
+        }
+      });
+    } catch (error) {
+      console.error('Error cargando conteos:', error);
+    }
+  }
+
   /**
    * Toggle opciones avanzadas
    */
@@ -433,6 +456,7 @@ document.addEventListener('DOMContentLoaded', () => {
       html += `
               <li><i class="fas fa-download"></i> Descargar PDFs: ${data.parametros.download_pdfs ? 'Sí' : 'No'}</li>
               <li><i class="fas fa-users"></i> Workers: ${data.parametros.max_workers}</li>
+              <li><i class="fas fa-cogs"></i> Motor: ${data.parametros.download_engine || 'threads'}</li>
             </ul>
           </div>
         </div>